@@ -45,6 +45,7 @@ class BaseExtension(inkex.Effect):
 
         inkex.Effect.__init__(self)
         self.custom_effect = custom_effect
+        self.queued_documents = []
 
         self._msg = self.msg  # The old msg function provided by inkex (only accepts strings)
         def msg(*args, sep=' '):
@@ -59,6 +60,14 @@ class BaseExtension(inkex.Effect):
 
 
 
+    def queue_document(self, path, actions_list, output_file):
+        """Queue actions to run on another document.
+
+        The queued documents are opened, processed and exported to their
+        output file by the same inkscape process as the current document,
+        right after it."""
+        self.queued_documents.append((path, actions_list, output_file))
+
     def z_sort(self, alist):
         """Return new list sorted in document order (depth-first traversal)."""
         return list(self.z_iter(alist))
@@ -140,10 +149,13 @@ class BaseExtension(inkex.Effect):
         """Main entry point to process current document. Not to be called externally."""
 
         actions_list = self.custom_effect(self)
+        tempfile = None
 
-        if actions_list is None or actions_list == []:
+        if (actions_list is None or actions_list == []) and self.queued_documents == []:
             self.msg("No actions received. Perhaps you are calling inkex object methods?")
-        elif isinstance(actions_list, list):
+        elif isinstance(actions_list, list) or self.queued_documents != []:
+            if actions_list is None:
+                actions_list = []
             tempfile = self.options.input_file + "-BaseExtension.svg"
 
             # prepare
@@ -158,6 +170,13 @@ class BaseExtension(inkex.Effect):
             actions_list.append("export-type:svg")
             actions_list.append("export-filename:{}".format(tempfile))
             actions_list.append("export-do") 
+            for path, document_actions, output_file in self.queued_documents:
+                actions_list.append("file-open:{}".format(path))
+                actions_list.extend(document_actions)
+                actions_list.append("export-type:svg")
+                actions_list.append("export-filename:{}".format(output_file))
+                actions_list.append("export-do")
+                actions_list.append("file-close")
             extra_param = "--batch-process"
 
             actions = ";".join(actions_list)
@@ -172,10 +191,11 @@ class BaseExtension(inkex.Effect):
 
 
         # Clean up tempfile
-        try:
-            os.remove(tempfile)
-        except Exception:  # pylint: disable=broad-except
-            pass
+        if tempfile is not None:
+            try:
+                os.remove(tempfile)
+            except Exception:  # pylint: disable=broad-except
+                pass
 
     def call(self, child, ext_options):
         """Used to call an extension from another extension"""
@@ -2,8 +2,11 @@
 import os
 import sys
 import re
+import json
+import shutil
 import subprocess
 
+import inkex
 from BaseExtension import BaseExtension
 
 # For linting purposes
@@ -17,6 +20,69 @@ or imported for use by another extension. This workaround is done via the 'optio
 the 'custom_effect' function"""
 
 
+def inkscape_binary():
+    """Returns the path of the inkscape binary used by inkex"""
+    command = os.environ.get('INKSCAPE_COMMAND', 'inkscape')
+    return shutil.which(command) or command
+
+
+def catalogue_path():
+    """Returns the path of the on-disk cache of the verbs and actions"""
+    cache_dir = (os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA') or
+                 os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_dir, 'batch_task', 'catalogue.json')
+
+
+def query_catalogue(binary):
+    """Asks inkscape for the names of its verbs and actions"""
+    names = []
+    for option, pattern in (('--verb-list', r'(.+?):'), ('--action-list', r'(.+?) *:')):
+        try:
+            proc = subprocess.run([binary, option], capture_output=True)
+        except OSError:
+            continue
+        for line in proc.stdout.decode(errors='replace').splitlines():
+            match = re.match(pattern, line)
+            if match:
+                names.append(match.group(1))
+    return names
+
+
+def load_catalogue():
+    """Returns the names of the verbs and actions known by inkscape.
+
+    The names are cached on disk, keyed by the path, size and modification
+    time of the inkscape binary, so inkscape only gets queried again once
+    it has been updated."""
+    binary = inkscape_binary()
+    try:
+        stat = os.stat(binary)
+        key = [os.path.realpath(binary), stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        key = None
+
+    path = catalogue_path()
+    if key is not None:
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+            if cached.get('key') == key:
+                return set(cached['names'])
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    names = query_catalogue(binary)
+    if key is not None and names:
+        try:
+            version = subprocess.run([binary, '--version'], capture_output=True).stdout.decode(errors='replace').strip()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump({'key': key, 'version': version, 'names': names}, f)
+        except OSError:
+            pass
+    return set(names)
+
+
 def custom_effect(self: BaseExtension):
     """Note: The init of the BaseExtension class will set its 'custom_effect' attr
     to this function. Hence, the self arg is of type BaseExtension."""
@@ -24,15 +90,8 @@ def custom_effect(self: BaseExtension):
 
     selected = self.svg.selected
     root = self.document.getroot()
-    actions_list = []
-
-    proc = subprocess.run("inkscape --verb-list | grep -oP '^.+?(?=:)'",
-                            shell=True, capture_output=True)
-    valid_actions_and_verbs = proc.stdout.decode().splitlines()
 
-    proc = subprocess.run("inkscape --action-list | grep -oP '^.+?(?= *:)'",
-                            shell=True, capture_output=True)
-    valid_actions_and_verbs += proc.stdout.decode().splitlines()
+    valid_actions_and_verbs = load_catalogue()
 
 
     self.options.dry_run = self.options.dry_run == 'true'
@@ -43,7 +102,7 @@ def custom_effect(self: BaseExtension):
         if action not in valid_actions_and_verbs:
             raise ValueError(action)
 
-    def select_do_individually(objs, actions):
+    def select_do_individually(objs, actions, actions_list):
         for obj in objs:
             actions_list.append("EditDeselect")
             actions_list.append("select-by-id:" + obj.get_id())
@@ -53,7 +112,7 @@ def custom_effect(self: BaseExtension):
                 verify_action(action)
                 actions_list.append(action)
 
-    def select_do_on_all(objs, actions):
+    def select_do_on_all(objs, actions, actions_list):
         for obj in objs:
             actions_list.append("select-by-id:" + obj.get_id())
 
@@ -62,7 +121,36 @@ def custom_effect(self: BaseExtension):
         for action in actions:
             verify_action(action)
             actions_list.append(action)
+
+    def jobs_actions(root, selected, jobs, existing_ids=False):
+        """Actions of all the jobs on one document, the objects matched by each XPath and the XPaths without match.
+
+        With existing_ids, objects without an id are left out, since an id generated
+        by get_id() would not exist in the file inkscape opens."""
+        actions_list = []
+        matched = []
+        missing = []
+        for xpath, job_effects in jobs:
+            if self.options.target == 'root' or selected is None:
+                objects = self.find(root, '/svg:svg' + xpath)
+            elif self.options.target == 'selected':
+                objects = self.find(selected, xpath)
+            if existing_ids:
+                objects = [obj for obj in objects if obj.get('id') is not None]
+            if objects == []:
+                missing.append(xpath)
+                continue
+            matched.append((xpath, objects))
+            if len(jobs) > 1:
+                actions_list.append("EditDeselect")
+            if self.options.mode == 'all':
+                select_do_on_all(objects, job_effects, actions_list)
+            elif self.options.mode == 'indiv':
+                select_do_individually(objects, job_effects, actions_list)
+        return actions_list, matched, missing
+
     effects = []
+    jobs = []
     try:
         if self.options.tab_effect is None:
             if self.options.effects is not None:
@@ -82,27 +170,50 @@ def custom_effect(self: BaseExtension):
                 raise ValueError
             for line in self.options.effects.split('\\n'):
                 effects += [e.strip() for e in line.split(';') if e != '']
+        elif self.options.tab_effect == 'Queue':
+            # one job per line: XPath => effect; effect; ...
+            if self.options.queue is None:
+                raise ValueError
+            for line in self.options.queue.split('\\n'):
+                if '=>' in line:
+                    xpath, line_effects = line.split('=>', 1)
+                    jobs.append((xpath.strip(), [e.strip() for e in line_effects.split(';') if e.strip() != '']))
+            if jobs == []:
+                raise ValueError
     except ValueError:
         self.msg("No effects inputted! Quitting...")
         sys.exit(0)
 
 
-    if self.options.target == 'root':
-        objects = self.find(root, '/svg:svg' + self.options.xpath)
-    elif self.options.target == 'selected':
-        objects = self.find(selected, self.options.xpath)
-    if objects == []:
-        self.msg(f"No objects satisfies XPath: '{self.options.xpath}'.")
-        self.msg("Root:", self.show(root))
-        self.msg("Selected:", self.show(selected))
-        sys.exit(0)
+    if jobs == []:
+        jobs = [(self.options.xpath, effects)]
+
+    # other documents processed in the same inkscape run as the current one
+    documents = []
+    if self.options.documents:
+        documents = [d.strip() for d in self.options.documents.split('\\n') if d.strip() != '']
 
 
     try:
-        if self.options.mode == 'all':
-            select_do_on_all(objects, effects)
-        elif self.options.mode == 'indiv':
-            select_do_individually(objects, effects)
+        actions_list, matched, missing = jobs_actions(root, selected, jobs)
+
+        for document in documents:
+            document_actions, _, document_missing = jobs_actions(inkex.load_svg(document).getroot(), None, jobs, existing_ids=True)
+            if document_actions == []:
+                self.msg(f"Skipped '{document}', no objects with an id satisfies any XPath.")
+                continue
+            for xpath in document_missing:
+                self.msg(f"Skipped in '{document}', no objects with an id satisfies XPath: '{xpath}'.")
+            output_file = os.path.splitext(document)[0] + self.options.output_suffix + '.svg'
+            self.queue_document(document, document_actions, output_file)
+
+        if actions_list == [] and self.queued_documents == []:
+            self.msg(f"No objects satisfies XPath: '{missing[0]}'.")
+            self.msg("Root:", self.show(root))
+            self.msg("Selected:", self.show(selected))
+            sys.exit(0)
+        for xpath in missing:
+            self.msg(f"Skipped, no objects satisfies XPath: '{xpath}'.")
     except ValueError as e:
         self.msg(f"'{e.args[0]}' is not a valid action or verb in inkscape.")
         sys.exit(1)
@@ -112,9 +223,14 @@ def custom_effect(self: BaseExtension):
         self.msg("Root:", self.show(self.find(root, '/*')))
         self.msg("Selected:", self.show(selected))
         self.msg()
-        self.msg("XPath:", self.show(objects))
+        for xpath, objects in matched:
+            self.msg(f"XPath '{xpath}':", self.show(objects))
         self.msg()
         self.msg("Actions:", actions_list)
+        for document, document_actions, output_file in self.queued_documents:
+            self.msg()
+            self.msg(f"Document: {document} -> {output_file}")
+            self.msg("Actions:", document_actions)
         sys.exit(0)
     return actions_list
 
@@ -130,6 +246,9 @@ def args_adder(arg_parser: ArgumentParser):
     arg_parser.add_argument("--tab_effect", default=None)
     for arg in (*(x + str(y) for x in ('effect_preset', 'effect_simple') for y in range(1, 4)), 'effects'):
         arg_parser.add_argument(f"--{arg}", default=None, help="Inkscape verb for path op")
+    arg_parser.add_argument("--queue", default=None, help="Jobs, one per line: XPath => effects")
+    arg_parser.add_argument("--documents", default=None, help="Other documents to process, one per line")
+    arg_parser.add_argument("--output_suffix", default='_batch', help="Suffix of the processed documents")
     arg_parser.add_argument("--dry_run", default='false')
     arg_parser.add_argument("--null_notebook", default='false')
     
@@ -36,6 +36,44 @@ from inkex.paths import CubicSuperPath, Path
 from optparse import SUPPRESS_HELP
 debug = False
 
+class SegmentEndIndex():
+  """ Grid of segment end points with a cell size of the connect distance.
+      Any end within that distance of a point lies in the 3x3 neighbourhood
+      of the point's cell. Segments are removed once they are chained.
+  """
+  def __init__(self, cell_size):
+    self.cell_size = cell_size
+    self.cells = {}
+    self.keys = {}
+
+  def cell(self, pt):
+    return (int(math.floor(pt[0] / self.cell_size)), int(math.floor(pt[1] / self.cell_size)))
+
+  def insert(self, idx, end1, end2):
+    keys = set((self.cell(end1), self.cell(end2)))
+    for key in keys:
+      self.cells.setdefault(key, set()).add(idx)
+    self.keys[idx] = keys
+
+  def remove(self, idx):
+    for key in self.keys.pop(idx, ()):
+      bucket = self.cells[key]
+      bucket.discard(idx)
+      if not bucket:
+        del self.cells[key]
+
+  def candidates(self, *points):
+    """ indices of all segments with an end in the neighbourhood of one of the points """
+    found = set()
+    for pt in points:
+      cx, cy = self.cell(pt)
+      for x in (cx - 1, cx, cx + 1):
+        for y in (cy - 1, cy, cy + 1):
+          bucket = self.cells.get((x, y))
+          if bucket:
+            found.update(bucket)
+    return found
+
 class ChainPaths(inkex.EffectExtension):
 
   def __init__(self):
@@ -48,6 +86,8 @@ class ChainPaths(inkex.EffectExtension):
     self.snap_ends = True
     self.close_loops = True
     self.segments_done = {}
+    self.segments_index = None
+    self.segments_pos = {}
     self.min_missed_distance_sq = None
     self.chained_count = 0
 
@@ -84,6 +124,8 @@ class ChainPaths(inkex.EffectExtension):
     if not id in self.segments_done:
       self.segments_done[id] = {}
     self.segments_done[id][n] = True
+    if self.segments_index is not None and (id, n) in self.segments_pos:
+      self.segments_index.remove(self.segments_pos[(id, n)])
     if debug: inkex.utils.debug("done "+str(id)+" "+str(n)+" "+msg)
 
   def is_segment_done(self, id, n):
@@ -173,6 +215,11 @@ class ChainPaths(inkex.EffectExtension):
     for s in segments:
       if debug: inkex.utils.debug(str(s['id'])+", "+str(s['n'])+", "+str(s['end1'])+", "+str(s['end2']))
 
+    self.segments_index = SegmentEndIndex(math.sqrt(self.eps_sq))
+    for idx, s in enumerate(segments):
+      self.segments_pos[(s['id'], s['n'])] = idx
+      self.segments_index.insert(idx, s['end1'], s['end2'])
+
     # chain the segments
     obsoleted = 0
     remaining = 0
@@ -185,13 +232,15 @@ class ChainPaths(inkex.EffectExtension):
       for chain in path_d:
         cur_idx += 1
         if not self.is_segment_done(id, cur_idx):
-          # quadratic algorithm: we check both ends of the current segment.
+          # We check both ends of the current segment.
           # If one of them is near another known end from the segments list, we
           # chain this segment to the current segment and remove it from the
           # list,
           # end1-end1 or end2-end2: The new segment is reversed.
           # end1-end2: The new segment is prepended to the current segment.
           # end2-end1: The new segment is appended to the current segment.
+          # Candidates are looked up in the end point grid. Among all near segments
+          # the one listed first is taken, so the result does not depend on the grid.
           self.set_segment_done(id, cur_idx, "output")        # do not cross with ourselves.
           end1 = [chain[ 0][1][0], chain[ 0][1][1]]
           end2 = [chain[-1][1][0], chain[-1][1][1]]
@@ -201,12 +250,16 @@ class ChainPaths(inkex.EffectExtension):
             chain.pop()
             end2 = [chain[-1][1][0], chain[-1][1][1]]
 
-          segments_idx = 0
-          while segments_idx < len(segments):
-            seg = segments[segments_idx]
-            if self.is_segment_done(seg['id'], seg['n']):
-              segments_idx += 1
-              continue
+          while True:
+            seg = None
+            for segments_idx in sorted(self.segments_index.candidates(end1, end2)):
+              s = segments[segments_idx]
+              if (self.near_ends(end1, s['end1']) or self.near_ends(end2, s['end2']) or
+                  self.near_ends(end1, s['end2']) or self.near_ends(end2, s['end1'])):
+                seg = s
+                break
+            if seg is None:
+              break
 
             if (self.near_ends(end1, seg['end1']) or
                 self.near_ends(end2, seg['end2'])):
@@ -219,18 +272,12 @@ class ChainPaths(inkex.EffectExtension):
               self.set_segment_done(seg['id'], seg['n'], 'prepended to ' + str(id) + ' ' + str(cur_idx))
               chain = self.link_segments(seg['seg'], chain)
               end1 = [chain[0][1][0], chain[0][1][1]]
-              segments_idx = 0          # this chain changed. re-visit all candidate
               continue
 
-            if self.near_ends(end2, seg['end1']):
-              # append seg to chain		  
-              self.set_segment_done(seg['id'], seg['n'], 'appended to ' + str(id) + ' ' + str(cur_idx))
-              chain = self.link_segments(chain, seg['seg'])
-              end2 = [chain[-1][1][0], chain[-1][1][1]]
-              segments_idx = 0          # this chain changed. re-visit all candidate
-              continue
-
-            segments_idx += 1
+            # append seg to chain
+            self.set_segment_done(seg['id'], seg['n'], 'appended to ' + str(id) + ' ' + str(cur_idx))
+            chain = self.link_segments(chain, seg['seg'])
+            end2 = [chain[-1][1][0], chain[-1][1][1]]
 
           # Now all joinable segments are joined.
           # Finally, we can check, if the resulting path is a closed path:
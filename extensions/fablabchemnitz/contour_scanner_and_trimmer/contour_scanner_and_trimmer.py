@@ -61,6 +61,8 @@ License: GNU GPL v3
 
 import sys
 import os
+import math
+import time
 import copy
 from lxml import etree
 import poly_point_isect
@@ -417,8 +419,89 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                     return (False, new_set)
         
         return (True, working_set)
- 
-    
+
+
+    def sweep_set(self, working_set, vertical=False):
+        '''
+            Merge a working set of lines with similar slope (or same x coordinate for vertical lines) in one pass.
+            The lines are grouped by their perpendicular offset (within 'collinear_filter_epsilon' of the first line
+            of the group) and each group is sorted by the projection on the line direction, so overlapping intervals
+            can be joined by a single sweep.
+        '''
+        if len(working_set) < 2:
+            return working_set
+
+        eps = self.options.collinear_filter_epsilon
+        keyed = []
+        for s in working_set:
+            if vertical:
+                # vertical lines are already binned by x, so we only need to order their points top-to-bottom
+                if s['p0'][1] > s['p1'][1]:
+                    s = dict(s, p0=s['p1'], p1=s['p0'])
+                offset = 0.0
+            else:
+                offset = (s['p0'][1] - s['slope'] * s['p0'][0]) / math.sqrt(1.0 + s['slope'] * s['slope'])
+            keyed.append((offset, s))
+        keyed.sort(key=lambda k: k[0])
+
+        # group lines whose offset is within eps of the first line of the group, so a group cannot drift
+        groups = []
+        first_offset = None
+        for offset, s in keyed:
+            if first_offset is None or offset - first_offset > eps:
+                groups.append([])
+                first_offset = offset
+            groups[-1].append(s)
+
+        def position(p, slope):
+            # distance along the unit direction of the line, so eps is a real gap on steep lines too
+            if vertical:
+                return p[1]
+            return (p[0] + slope * p[1]) / math.sqrt(1.0 + slope * slope)
+
+        output = []
+        for group in groups:
+            slope = 0.0 if vertical else group[0]['slope']
+            group.sort(key=lambda s: position(s['p0'], slope))
+            current = group[0]
+            end = position(current['p1'], slope)
+            for s in group[1:]:
+                if position(s['p0'], slope) <= end + eps: # overlapping, touching or duplicate, extend the current line
+                    if position(s['p1'], slope) > end:
+                        current = dict(current, p1=s['p1'])
+                        current['slope'] = self.slope(current['p0'], current['p1'])
+                        end = position(current['p1'], slope)
+                else: # gap between lines, keep the current one
+                    output.append(current)
+                    current = s
+                    end = position(current['p1'], slope)
+            output.append(current)
+        return output
+
+
+    def merge_working_set(self, working_set, vertical=False):
+        '''
+            Merge all overlapping lines of a working set, using the mode selected by 'collinear_filter_mode'
+        '''
+        if self.options.collinear_filter_mode == "sweep":
+            start = time.perf_counter()
+            output = self.sweep_set(working_set, vertical)
+            if self.options.show_debug is True and len(working_set) > 0:
+                if vertical is True:
+                    bucket = "x = {:0.6f}".format(working_set[0]['p0'][0])
+                else:
+                    bucket = "slope = {:0.6f}".format(working_set[0]['slope'])
+                self.msg("Scanning: bucket {} ({} lines -> {} lines) merged in {:0.3f} ms".format(
+                    bucket, len(working_set), len(output), (time.perf_counter() - start) * 1000.0))
+            return output
+
+        process_set = self.process_set_y if vertical is True else self.process_set_x
+        while True:
+            (done, working_set) = process_set(working_set)
+            if done:
+                return working_set
+
+
     def filter_collinear(self, lineArray):
         ''' Another sweep line algorithm to scan collinear lines
             Loop through a set of lines and find + fiter all overlapping segments / duplicate segments
@@ -496,11 +579,8 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                     working_set_x.append(input) #we put all lines to working set which have similar slopes
                     if input['id'] != '': input_ids.append(input['id'])
                 else: # slope discontinuity, process accumulated set
-                    while True:
-                        (done, working_set_x) = self.process_set_x(working_set_x)
-                        if done:
-                            output_set_x.extend(working_set_x)
-                            break
+                    working_set_x = self.merge_working_set(working_set_x)
+                    output_set_x.extend(working_set_x)
     
                     if input: # begin new working set
                         working_set_x = [input]
@@ -534,11 +614,8 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                     working_set_y.append(vertical) #we put all lines to working set which have same x coordinate
                     if vertical['id'] != '': vertical_ids.append(vertical['id'])
                 else: # x coord discontinuity, process accumulated set
-                    while True:
-                        (done, working_set_y) = self.process_set_y(working_set_y)
-                        if done:
-                            output_set_y.extend(working_set_y)
-                            break
+                    working_set_y = self.merge_working_set(working_set_y, vertical=True)
+                    output_set_y.extend(working_set_y)
                     if vertical: # begin new working set
                         working_set_y = [vertical]
                         current_x = vertical['p0'][0]
@@ -603,20 +680,32 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         return output_set, dropped_ids
 
 
+    def trim_line_key(self, path):
+        '''
+            Direction independent hash key of a trim line: the node coordinates, read in
+            whichever direction sorts first. Rounded to 'decimals' if 'trim_duplicates_decimals' is enabled
+        '''
+        points = tuple((p.x, p.y) for p in path.end_points)
+        if self.options.trim_duplicates_decimals is True:
+            decimals = self.options.decimals
+            points = tuple((round(x, decimals), round(y, decimals)) for x, y in points)
+        return min(points, points[::-1])
+
+
     def remove_trim_duplicates(self, allTrimGroups):
         ''' 
             find duplicate lines in a given array [] of groups
             note: this function is similar to filter_collinear but we keep it because we have a 'reverse_trim_removal_order' option.
             We can use this option in some special situations where we work without the function 'filter_collinear()'.
         '''
-        totalTrimPaths = []
+        totalTrimPaths = set()
         if self.options.reverse_trim_removal_order is True:
             allTrimGroups = allTrimGroups[::-1]
         for trimGroup in allTrimGroups:
             for element in trimGroup:
-                path = element.path.transform(element.composed_transform())
-                if path not in totalTrimPaths:
-                    totalTrimPaths.append(path)
+                key = self.trim_line_key(element.path.transform(element.composed_transform()))
+                if key not in totalTrimPaths:
+                    totalTrimPaths.add(key)
                 else:
                     if self.options.show_debug is True:
                         self.msg("Deleting path {}".format(element.get('id')))
@@ -736,6 +825,7 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         pars.add_argument("--decimals", type=int, default=3, help="Accuracy for sub split lines / lines trimmed by shapely")
         pars.add_argument("--snap_tolerance", type=float, default=0.1, help="Snap tolerance for intersection points")
         pars.add_argument("--collinear_filter_epsilon", type=float, default=0.01, help="Epsilon for collinear line filter")
+        pars.add_argument("--collinear_filter_mode", default="sweep", help="Merge collinear lines by a single sorted sweep per (slope, offset) group or by the iterative pairwise scan")
         #Settings - General Style
         pars.add_argument("--strokewidth", type=float, default=1.0, help="Stroke width (px)")   
         pars.add_argument("--dotsize_intersections", type=int, default=30, help="Dot size (px) for self-intersecting and global intersection points")
@@ -783,6 +873,7 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         pars.add_argument("--combine_nonintersects", type=inkex.Boolean, default=True, help="Combine non-intersected lines")
         pars.add_argument("--remove_trim_duplicates", type=inkex.Boolean, default=True, help="Remove duplicate trim lines")
         pars.add_argument("--reverse_trim_removal_order", type=inkex.Boolean, default=False, help="Reverses the order of removal. Relevant for keeping certain styles of elements")
+        pars.add_argument("--trim_duplicates_decimals", type=inkex.Boolean, default=False, help="Compare trim lines rounded to 'decimals' when removing duplicates")
         pars.add_argument("--remove_subsplit_after_trimming", type=inkex.Boolean, default=True, help="Remove sub split lines after trimming")
         #Trimming - Bentley-Ottmann sweep line settings
         pars.add_argument("--bent_ott_use_ignore_segment_endings", type=inkex.Boolean, default=True, help="Whether to ignore intersections of line segments when both their end points form the intersection point")
@@ -1213,6 +1304,7 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
         if so.draw_trimmed is True:     
             try:
                 allSubSplitLineStrings = []
+                allSubSplitLineKeys = set() #to look up duplicates without scanning allSubSplitLineStrings
                 for subSplitLine in subSplitLineArray:
                     csp = Path(subSplitLine.path.transform(subSplitLine.composed_transform())).to_arrays() #will be buggy if draw subsplit lines is deactivated
                     lineString = [(csp[0][1][0], csp[0][1][1]), (csp[1][1][0], csp[1][1][1])]                    
@@ -1223,7 +1315,9 @@ class ContourScannerAndTrimmer(inkex.EffectExtension):
                     #line.transform = -self.svg.get_current_layer().transform
                     
                     if so.remove_trim_duplicates is True:
-                        if lineString not in allSubSplitLineStrings:
+                        lineKey = tuple(lineString)
+                        if lineKey not in allSubSplitLineKeys:
+                            allSubSplitLineKeys.add(lineKey)
                             allSubSplitLineStrings.append(lineString)
                         else:
                             if so.show_debug is True:
@@ -23,5 +23,6 @@ from .circle import Circle
 from .part import Part
 from .neopixel import NeoPixel
 from .fingerjoint import FingerJoint
+from .maxrects import MaxRects
 
-__all__ = ["Point", "Line", "Rectangle", "Trace", "Circle", "Part", "NeoPixel", "FingerJoint"]
+__all__ = ["Point", "Line", "Rectangle", "Trace", "Circle", "Part", "NeoPixel", "FingerJoint", "MaxRects"]
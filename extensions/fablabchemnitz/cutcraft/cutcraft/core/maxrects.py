@@ -0,0 +1,114 @@
+# Copyright (C) 2018 Michael Matthews
+#
+#   This file is part of CutCraft.
+#
+#   CutCraft is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   CutCraft is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with CutCraft.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+class MaxRects(object):
+    """ MaxRects packer for a single sheet.
+
+    The free space of the sheet is kept as the list of the maximal free
+    rectangles, possibly overlapping, stored as rows of x, y, width, height.
+    Each rectangle is placed with the best short side fit rule: in the free
+    rectangle leaving the smallest leftover along its shorter side.
+    """
+    def __init__(self, width, height, spacing=0.0, rotate=False):
+        # Each rectangle is grown by the spacing on its right and bottom sides, so
+        # the sheet is grown by the same amount to let the last ones touch its edges.
+        self.width = width
+        self.height = height
+        self.spacing = spacing
+        self.rotate = rotate
+        self.free = np.array([[0.0, 0.0, width + spacing, height + spacing]])
+        self.used = 0.0
+        return
+
+    def fit(self, width, height):
+        """ Find the position of a rectangle as (x, y, rotated), or None if it does not fit. """
+        best = None
+        orientations = [(width, height, False)]
+        if self.rotate and width != height:
+            orientations.append((height, width, True))
+        for w, h, rotated in orientations:
+            w += self.spacing
+            h += self.spacing
+            dw = self.free[:, 2] - w
+            dh = self.free[:, 3] - h
+            fits = np.nonzero((dw >= -1e-9) & (dh >= -1e-9))[0]
+            if len(fits) == 0:
+                continue
+            short = np.minimum(dw[fits], dh[fits])
+            long = np.maximum(dw[fits], dh[fits])
+            i = np.lexsort((long, short))[0]
+            score = (short[i], long[i])
+            if best is None or score < best[0]:
+                x, y = self.free[fits[i], :2]
+                best = (score, (float(x), float(y), rotated))
+        return None if best is None else best[1]
+
+    def insert(self, width, height):
+        """ Place a rectangle and return its position as (x, y, rotated), or None if it does not fit. """
+        position = self.fit(width, height)
+        if position is None:
+            return None
+        x, y, rotated = position
+        if rotated:
+            width, height = height, width
+        self.split(x, y, width + self.spacing, height + self.spacing)
+        self.used += width * height
+        return position
+
+    def split(self, x, y, width, height):
+        """ Remove a placed rectangle from the free rectangles. """
+        fx, fy, fw, fh = self.free.T
+        right = x + width
+        bottom = y + height
+        hit = (fx < right) & (fx + fw > x) & (fy < bottom) & (fy + fh > y)
+        if not hit.any():
+            return
+
+        # Each free rectangle hit gives up to four new ones around the placed rectangle.
+        fx, fy, fw, fh = self.free[hit].T
+        sides = [
+            (fx, fy, x - fx, fh),
+            (np.full_like(fx, right), fy, fx + fw - right, fh),
+            (fx, fy, fw, y - fy),
+            (fx, np.full_like(fy, bottom), fw, fy + fh - bottom),
+        ]
+        new = np.concatenate([np.stack(side, axis=1) for side in sides])
+        new = new[(new[:, 2] > 1e-9) & (new[:, 3] > 1e-9)]
+
+        old = self.free[~hit]
+        # Drop the new rectangles contained in another one, keeping one copy of duplicates.
+        inside_old = contains(old, new).any(axis=0)
+        inside_new = contains(new, new)
+        np.fill_diagonal(inside_new, False)
+        duplicate = inside_new & inside_new.T
+        inside_new &= ~np.tril(duplicate)
+        new = new[~(inside_old | inside_new.any(axis=0))]
+        # The old rectangles never contain each other, but can be inside a new one.
+        old = old[~contains(new, old).any(axis=0)]
+        self.free = np.concatenate((old, new))
+
+    def utilization(self):
+        """ Fraction of the sheet covered by the placed rectangles. """
+        return self.used / (self.width * self.height)
+
+def contains(outer, inner):
+    """ Matrix telling if each outer rectangle contains each inner rectangle. """
+    ox, oy, ow, oh = [v[:, None] for v in outer.T]
+    ix, iy, iw, ih = [v[None, :] for v in inner.T]
+    return (ix >= ox) & (iy >= oy) & (ix + iw <= ox + ow) & (iy + ih <= oy + oh)
@@ -38,6 +38,12 @@ class Part(object):
             trace.applykerf(kerf)
         return
 
+    def rotate90(self):
+        """ Rotate the part by 90 degrees around the origin. """
+        for trace in self.traces:
+            trace.rotate90()
+        return
+
     def svg(self):
         # Generate SVG string for this part.
         return " ".join([trace.svg() for trace in self.traces])
@@ -67,6 +67,10 @@ class Trace(object):
         self.x = [x + pt.x for x in self.x]
         self.y = [y + pt.y for y in self.y]
 
+    def rotate90(self):
+        """ Rotate a trace by 90 degrees around the origin. """
+        self.x, self.y = [-y for y in self.y], self.x
+
     def clear(self):
         self.x = []
         self.y = []
@@ -2,62 +2,9 @@
 
 import gettext
 import inkex
-from math import floor
-from cutcraft.core import Point, Rectangle
+from cutcraft.core import MaxRects, Point
 from lxml import etree
 
-#TODOS
-'''
-since InkScape 1.0 / Python 3 adjustments are required to fix "TypeError: '<' not supported between instances of 'Pier' and 'Pier'". A __lt__ method has to be implemented
-"for this reasion items = sorted([(p[0].area(),p[0]) for p in shape.parts], reverse=True)" was commented out
-'''
-
-class CutCraftNode(object):
-    def __init__(self, rect):
-        self.children = []
-        self.rectangle = rect
-        self.part = None
-
-    def insert(self, part, shape):
-        if len(self.children)>0:
-            node = self.children[0].insert(part, shape)
-            if node is not None:
-                return node
-            else:
-                return self.children[1].insert(part, shape)
-
-        if self.part is not None:
-            return None
-
-        pwidth, pheight = part.bbox().expanded().size()
-        nwidth, nheight = self.rectangle.expanded().size()
-
-        if pwidth>nwidth or pheight>nheight:
-            # Too small.
-            return None
-        if pwidth==nwidth and pheight==nheight:
-            # This node fits.
-            self.part = part
-            return self
-
-        nleft, ntop = self.rectangle.expanded().topleft.tup()
-        nright, nbottom = self.rectangle.expanded().bottomright.tup()
-
-        if nwidth - pwidth > nheight - pheight:
-            r1 = Rectangle(Point(nleft, ntop),
-                           Point(nleft+pwidth, nbottom))
-            r2 = Rectangle(Point(nleft+pwidth+1.0, ntop),
-                           Point(nright, nbottom))
-        else:
-            r1 = Rectangle(Point(nleft, ntop),
-                           Point(nright, ntop+pheight))
-            r2 = Rectangle(Point(nleft, ntop+pheight+1.0),
-                           Point(nright, nbottom))
-
-        self.children = [CutCraftNode(r1), CutCraftNode(r2)]
-
-        return self.children[0].insert(part, shape)
-
 class CutCraftShape(inkex.EffectExtension):
 
     def add_arguments(self, pars):
@@ -66,12 +13,17 @@ class CutCraftShape(inkex.EffectExtension):
         pars.add_argument("--thickness", type=float, default=20.0, help="Material Thickness")
         pars.add_argument("--kerf", type=float, default=20.0, help="Laser Cutter Kerf")
         pars.add_argument("--linethickness", default="1px", help="Line Thickness")
+        pars.add_argument("--sort", default="area", help="Packing order: area, side or none")
+        pars.add_argument("--rotate", type=inkex.Boolean, default=True, help="Allow 90 degree rotation of the parts")
+        pars.add_argument("--spacing", type=float, default=1.0, help="Spacing between parts, added to the kerf")
+        pars.add_argument("--report", type=inkex.Boolean, default=False, help="Report the sheet utilization")
 
     def effect(self):
         self.unit = self.options.unit
         self.thickness = self.svg.unittouu( str(self.options.thickness) + self.unit)
         self.kerf = self.svg.unittouu( str(self.options.kerf) + self.unit)
         self.linethickness = self.svg.unittouu(self.options.linethickness)
+        self.spacing = self.svg.unittouu( str(self.options.spacing) + self.unit)
 
         svg = self.document.getroot()
         self.docwidth = self.svg.unittouu(svg.get('width'))
@@ -90,30 +42,57 @@ class CutCraftShape(inkex.EffectExtension):
         inkex.errormsg( gettext.gettext(str(string)) )
 
     def pack(self, shape):
-        # Pack the individual parts onto the current canvas.
+        # Pack the individual parts onto as many canvas sized sheets as required.
         line_style = { 'stroke': '#000000',
                        'stroke-width': str(self.linethickness),
                        'fill': 'none' }
 
-        #items = sorted([(p[0].area(),p[0]) for p in shape.parts], reverse=True)
-        items = [(p[0].area(),p[0]) for p in shape.parts]
-        #for p in shape.parts:
-        #    inkex.utils.debug(p[0])
-		
-        rootnode = CutCraftNode(Rectangle(Point(0.0, 0.0), Point(floor(self.docwidth), floor(self.docheight))))
-
-        for i, (_, part) in enumerate(items):
-            node = rootnode.insert(part, self)
-            if node is None:
-                self._error("ERROR: Cannot fit parts onto canvas.\n" +
-                            "Try a larger canvas and then manually arrange if required.")
-                exit()
-
-            bbox = part.bbox().expanded()
-            part += -bbox.topleft
-            part += node.rectangle.topleft
+        items = [(part,) + part.size() for part, _ in shape.parts]
+        if self.options.sort == "area":
+            items.sort(key=lambda item: item[1]*item[2], reverse=True)
+        elif self.options.sort == "side":
+            items.sort(key=lambda item: (max(item[1:]), min(item[1:])), reverse=True)
+
+        # Cuts closer than the kerf would merge, so keep at least a kerf between parts.
+        gap = self.kerf + self.spacing
+        sheets = []
+        for i, (part, width, height) in enumerate(items):
+            for sheet, group in sheets:
+                position = sheet.insert(width, height)
+                if position is not None:
+                    break
+            else:
+                sheet = MaxRects(self.docwidth, self.docheight, gap, self.options.rotate)
+                position = sheet.insert(width, height)
+                if position is None:
+                    self._error("ERROR: Cannot fit parts onto canvas.\n" +
+                                "Try a larger canvas and then manually arrange if required.")
+                    exit()
+                group = self.sheet_group(len(sheets))
+                sheets.append((sheet, group))
+
+            x, y, rotated = position
+            if rotated:
+                part.rotate90()
+            part += -part.bbox().topleft
+            part += Point(x, y)
 
             line_attribs = { 'style' : str(inkex.Style(line_style)),
                             inkex.addNS('label','inkscape') : 'Test ' + str(i),
                             'd' : part.svg() }
-            _ = etree.SubElement(self.parent, inkex.addNS('path','svg'), line_attribs)
\ No newline at end of file
+            _ = etree.SubElement(group, inkex.addNS('path','svg'), line_attribs)
+
+        for i, (sheet, group) in enumerate(sheets):
+            group.set(inkex.addNS('label','inkscape'),
+                      'Sheet {} ({:.1f}%)'.format(i+1, 100.0*sheet.utilization()))
+        if self.options.report:
+            self._debug("{} parts on {} sheet{}".format(len(items), len(sheets), "s" if len(sheets)>1 else "") +
+                        "".join(["\nSheet {}: {:.1f}% used".format(i+1, 100.0*sheet.utilization())
+                                 for i, (sheet, _) in enumerate(sheets)]))
+
+    def sheet_group(self, index):
+        # Group holding the parts of a sheet, the extra sheets are laid out to the right of the canvas.
+        group = etree.SubElement(self.parent, inkex.addNS('g', 'svg'))
+        if index>0:
+            group.set('transform', 'translate({},0)'.format(index*self.docwidth*1.05))
+        return group
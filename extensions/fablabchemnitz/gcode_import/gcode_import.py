@@ -13,6 +13,8 @@ the Free Software Foundation; either version 2 of the License, or
 (at your option) any later version.
 """
 import re
+import os
+import time
 import inkex
 import sys
 import argparse
@@ -24,10 +26,13 @@ class ImportGCode:
     """ Import a GCode file and process it into an SVG. """
     current_id = 0
     geometry_error = False
+    comments = re.compile(r'\([^\)]*\)')
+    commands = re.compile('([MSGXYZIJKR])([-.0-9]+)')
     
     def __init__(self,gcode_filename,v_carve=False,laser_mode=False,
                  ignore_z=True,label_z=True,
-                 tool_diameter=1.0,v_angle=90.0,v_top=0.0,v_step=1.0):
+                 tool_diameter=1.0,v_angle=90.0,v_top=0.0,v_step=1.0,
+                 report=False):
         """ Load a GCode file and process it into an SVG. """
         self.unit = 1.0
         self.ignore_z = ignore_z or v_carve
@@ -40,8 +45,12 @@ class ImportGCode:
         self.laser_mode = laser_mode
         self.spindle = False
         self.speed = 0
+        start = time.perf_counter()
         with open(gcode_filename) as file:
             self.loadGCode(file)
+        if report:
+            self.reportThroughput(os.path.getsize(gcode_filename),
+                                  time.perf_counter() - start)
         self.createSVG()
 
     def getIJ(self,x1,y1,x2,y2,r):
@@ -212,13 +221,13 @@ class ImportGCode:
         """
         vs = v_segments
         # Move to the starting point.
-        path = 'M {} {} '.format(vs[0][1][0][0],vs[0][1][0][1])
+        path = ['M {} {} '.format(vs[0][1][0][0],vs[0][1][0][1])]
         # Initial arc, if it's not a point.
         if vs[0][0][0][2] > 0:
-            path += ('A {} {} 0 {} {} {} {} '
+            path.append(('A {} {} 0 {} {} {} {} '
                     ).format(vs[0][0][0][2],vs[0][0][0][2],
                                  1 if (vs[0][0][0][2] > vs[0][0][1][2]) else 0,
-                                 0,vs[0][1][1][0],vs[0][1][1][1])
+                                 0,vs[0][1][1][0],vs[0][1][1][1]))
         # Step through all the segments on the way to the other end.
         for v in range(len(vs)-1):
             # Check whether an intersection exists between the two
@@ -228,25 +237,25 @@ class ImportGCode:
                                                      vs[v+1][1][1],
                                                      vs[v+1][1][2])
             if included: #line segments
-                path += 'L {} {} '.format(x,y)
+                path.append('L {} {} '.format(x,y))
             else:
-                path += ('L {} {} A {} {} 0 {} {} {} {} '
+                path.append(('L {} {} A {} {} 0 {} {} {} {} '
                         ).format(vs[v][1][2][0],vs[v][1][2][1],
                                      vs[v][0][1][2],vs[v][0][1][2],
                                      self.isLargeAngle(vs[v][0][1],
                                                        vs[v][1][2],
                                                        vs[v+1][1][1]),
-                                     0,vs[v+1][1][1][0],vs[v+1][1][1][1])
+                                     0,vs[v+1][1][1][0],vs[v+1][1][1][1]))
         # Connecting line.
-        path += 'L {} {} '.format(vs[len(vs)-1][1][2][0],
-                                  vs[len(vs)-1][1][2][1])
+        path.append('L {} {} '.format(vs[len(vs)-1][1][2][0],
+                                      vs[len(vs)-1][1][2][1]))
         # Switchback arc, if it's not a point.
         if vs[len(vs)-1][0][1][2] > 0:
-            path += ('A {} {} 0 {} {} {} {} '
+            path.append(('A {} {} 0 {} {} {} {} '
                     ).format(vs[len(vs)-1][0][1][2],vs[len(vs)-1][0][1][2],
                              1 if (vs[len(vs)-1][0][1][2] >
                                    vs[len(vs)-2][0][0][2]) else 0,
-                             0,vs[len(vs)-1][1][3][0],vs[len(vs)-1][1][3][1])
+                             0,vs[len(vs)-1][1][3][0],vs[len(vs)-1][1][3][1]))
         # Step through all the segments on the way back home.
         for v in range(len(vs)-1,0,-1):
             # Check whether an intersection exists between the two
@@ -256,18 +265,18 @@ class ImportGCode:
                                                      vs[v-1][1][3],
                                                      vs[v-1][1][0])
             if included: #line segments
-                path += 'L {} {} '.format(x,y)
+                path.append('L {} {} '.format(x,y))
             else:
-                path += ('L {} {} A {} {} 0 {} {} {} {} '
+                path.append(('L {} {} A {} {} 0 {} {} {} {} '
                         ).format(vs[v][1][0][0],vs[v][1][0][1],
                                  vs[v-1][0][1][2],vs[v-1][0][1][2],
                                  self.isLargeAngle(vs[v-1][0][1],
                                                    vs[v][1][0],
                                                    vs[v-1][1][3]),
-                                 0,vs[v-1][1][3][0],vs[v-1][1][3][1])
+                                 0,vs[v-1][1][3][0],vs[v-1][1][3][1]))
         # And finally, close the curve.
-        path += 'Z'
-        return path
+        path.append('Z')
+        return ''.join(path)
             
     def getVsegment(self,x1,y1,z1,x2,y2,z2):
         """ Compute the required data to define a V-carve segment. """
@@ -284,9 +293,6 @@ class ImportGCode:
         plus values necessary for curve computations.  It also returns the
         resulting path data, unless otherwise indicated, e.g. for V-carves.
         """
-        comments = re.compile('\([^\)]*\)')
-        commands = re.compile('([MSGXYZIJKR])([-.0-9]+)')
-        
         lastX = X
         lastY = Y
         lastZ = Z
@@ -294,7 +300,7 @@ class ImportGCode:
         J = 0.0
         K = 0.0
         R = None
-        results = commands.findall(comments.sub('',line))
+        results = self.commands.findall(self.comments.sub('',line))
         for (code,val) in results:
             v = float(val)
             i = int(v)
@@ -405,21 +411,19 @@ class ImportGCode:
         if (path.find('A') == -1) and (path.find('L') == -1):
             return #empty path
         if self.ignore_z:
-            if path not in self.paths:
-                self.paths.add(path)
+            self.paths.add(path)
         else:
-            try:
-                if path not in self.paths_by_z[Z]:
-                    self.paths_by_z[Z].add(path)
-            except KeyError:
-                self.paths_by_z[Z] = set([path])
+            # Only the deepest instance of a path is kept.
+            deepest = self.deepest_z.get(path)
+            if (deepest is None) or (Z < deepest):
+                self.deepest_z[path] = Z
         
     def loadGCode(self,gcode_file):
         """ Load a G-code file, handling the contents. """
         if self.ignore_z:
             self.paths = set([])
         else:
-            self.paths_by_z = {}
+            self.deepest_z = {}
         self.absolute = True
         self.absoluteIJK = False
         self.unit=1.0
@@ -437,10 +441,12 @@ class ImportGCode:
         self.maxY = 0.0
         self.maxZ = 0.0
         
-        path = ''
-        line = gcode_file.readline()
+        # Path data is collected in fragments and joined when saved.
+        path = []
         v_segments = []
-        while line:
+        self.line_count = 0
+        for line in gcode_file:
+            self.line_count += 1
             command,X,Y,Z,I,J,K,R,path_data = self.parseLine(command, 
                                                              X, Y, Z, line,
                                                              self.v_carve)
@@ -455,8 +461,8 @@ class ImportGCode:
             if self.v_carve:
                 if (lastX != X) or (lastY != Y):
                     if command == 'G1':
-                        v_segments += [self.getVsegment(lastX, lastY, lastZ,
-                                                        X, Y, Z)]
+                        v_segments.append(self.getVsegment(lastX, lastY, lastZ,
+                                                           X, Y, Z))
                     elif (command == 'G2') or (command == 'G3'):
                         # We don't attempt to handle the plethora of curves
                         # that can result from V-carving arcs.  Instead, we
@@ -468,8 +474,8 @@ class ImportGCode:
                         iY = lastY
                         iZ = lastZ
                         for p in points:
-                            v_segments += [self.getVsegment(iX, iY, iZ,
-                                                            p[0], p[1], p[2])]
+                            v_segments.append(self.getVsegment(iX, iY, iZ,
+                                                               p[0], p[1], p[2]))
                             iX = p[0]
                             iY = p[1]
                             iZ = p[2]
@@ -483,35 +489,40 @@ class ImportGCode:
                     (not self.ignore_z and (Z != lastZ)) or 
                     (self.laser_mode and ((not self.spindle) or 
                                           (self.speed == 0)))):
-                    if (path != ''):
-                        self.savePath(path,lastZ)
-                        path = ''
+                    if path:
+                        self.savePath(''.join(path),lastZ)
+                        path = []
                 if (((command == 'G1') or 
                      (command == 'G2') or 
-                     (command == 'G3')) and (path == '')):
-                    path = 'M {} {} {}'.format(lastX,lastY,path_data)
-                else:
-                    path += path_data
+                     (command == 'G3')) and not path):
+                    path = ['M {} {} {}'.format(lastX,lastY,path_data)]
+                elif path_data:
+                    path.append(path_data)
             lastX = X
             lastY = Y
             lastZ = Z
-            line = gcode_file.readline()
         # Always remember to save the tail end of your work.
         if self.v_carve:
             if len(v_segments):
                 self.savePath(self.makeVcarve(v_segments),'VCarve')
         else:
-            if (path != ''):
-                self.savePath(path,lastZ)
-            
+            if path:
+                self.savePath(''.join(path),lastZ)
+
     def filterPaths(self):
         """ Filter out duplicate paths, leaving only the deepest instance. """
         if self.ignore_z:
             return
-        z_depths = sorted(self.paths_by_z,None,None,True)
-        for i in range(0,len(z_depths)):
-            for j in range(i+1, len(z_depths)):
-                self.paths_by_z[z_depths[i]] -= self.paths_by_z[z_depths[j]]
+        self.paths_by_z = {}
+        for path, Z in self.deepest_z.items():
+            self.paths_by_z.setdefault(Z, []).append(path)
+
+    def reportThroughput(self,size,seconds):
+        """ Report how fast the G-code file was parsed. """
+        megabytes = size / 1048576.0
+        inkex.errormsg('Parsed {} lines ({:.2f} MB) in {:.2f} s ({:.2f} MB/s)'
+                       .format(self.line_count, megabytes, seconds,
+                               megabytes / seconds if seconds > 0 else 0.0))
     
     def next_id(self):
         """ Return an incrementing value. """
@@ -623,6 +634,7 @@ if __name__ == '__main__':
     parser.add_argument('-d', '--tool_diameter', help='Tool diameter / path width.', default=None)
     parser.add_argument('-u', '--units',  help='Dialog units.', default='mm')
     parser.add_argument('-z', '--z_axis', help='Z-axis: ignore,group,label', default=False)
+    parser.add_argument('-r', '--report', help='Report parse throughput: true, false', default='false')
     parser.add_argument('--tab')
     parser.add_argument('--inputhelp')
     parser.add_argument('inputfile')
@@ -665,6 +677,7 @@ if __name__ == '__main__':
     # General args.
     ignore_z = (args.z_axis == 'ignore')
     label_z = (args.z_axis == 'label')
+    report = (args.report == 'true')
      
-    gc = ImportGCode(args.inputfile, v_carve, laser_mode, ignore_z, label_z, diameter, v_angle, v_top, v_step)
+    gc = ImportGCode(args.inputfile, v_carve, laser_mode, ignore_z, label_z, diameter, v_angle, v_top, v_step, report)
     gc.doc.write(sys.stdout.buffer)
\ No newline at end of file
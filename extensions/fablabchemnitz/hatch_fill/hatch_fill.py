@@ -98,6 +98,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 import math
+import numpy
 from lxml import etree
 import inkex
 from inkex import Transform
@@ -124,10 +125,6 @@ RADIAN_TOLERANCE_FOR_COLINEAR = 0.1
 RADIAN_TOLERANCE_FOR_ALTERNATING_DIRECTION = 0.1
 # Pragmatic adjustment again, as with colinearity tolerance
 
-RECURSION_LIMIT = 500
-# Pragmatic - if too high, risk runtime python error;
-# if too low, miss some chances for reducing pen lifts
-
 EXTREME_POS = 1.0e70  # Extremely large positive number
 EXTREME_NEG = -1.0e70  # Extremely large negative number
 
@@ -256,7 +253,160 @@ def intersect(p1, p2, p3, p4):
     return sa
 
 
-def interstices(self, p1, p2, paths, hatches, b_hold_back_hatches, f_hold_back_steps):
+class HatchEdgeTable:
+    """
+    All polygon edges of the paths to hatch, flattened into arrays once
+    per makeHatchGrid run and shared by every hatch line of every grid.
+
+    For each grid (the plain one and the rotated cross hatch grid) the
+    edges are bucketed by the hatch lines they span: an edge can only
+    meet a hatch line if the line's offset along the grid normal lies
+    between the offsets of the edge's end points.  interstices() then
+    intersects a hatch line with its bucket only, all edges of the
+    bucket in one vectorized pass using the arithmetic of intersect().
+    """
+
+    def __init__(self, paths):
+        self.nodes = []
+        p3, p4, owner = [], [], []
+        for path in paths:
+            for subpath in paths[path]:
+                for i in range(len(subpath) - 1):
+                    p3.append(subpath[i][:2])
+                    p4.append(subpath[i + 1][:2])
+                    owner.append(len(self.nodes))
+            self.nodes.append(path)
+        self.p3 = numpy.array(p3, dtype=float).reshape(-1, 2)
+        self.p4 = numpy.array(p4, dtype=float).reshape(-1, 2)
+        self.owner = numpy.array(owner, dtype=int)
+
+    def bucketHatchLines(self, offsets, ca, sa, cx, cy, margin):
+        """
+        Return one array of candidate edge indices per hatch line.  The
+        hatch lines are given by their (ascending) offsets along the grid
+        normal (ca, sa) through the center (cx, cy).  margin widens the
+        extent of each edge to allow for rounding.
+        """
+        n_lines = len(offsets)
+        if n_lines == 0:
+            return []
+        offsets = numpy.asarray(offsets, dtype=float)
+        u3 = (self.p3[:, 0] - cx) * ca + (self.p3[:, 1] - cy) * sa
+        u4 = (self.p4[:, 0] - cx) * ca + (self.p4[:, 1] - cy) * sa
+        lo = numpy.searchsorted(offsets, numpy.minimum(u3, u4) - margin, "left")
+        hi = numpy.searchsorted(offsets, numpy.maximum(u3, u4) + margin, "right")
+        counts = hi - lo
+        edges = numpy.repeat(numpy.arange(len(counts)), counts)
+        lines = numpy.repeat(lo, counts) + numpy.arange(int(counts.sum())) - numpy.repeat(
+            numpy.cumsum(counts) - counts, counts
+        )
+        order = numpy.argsort(lines, kind="stable")
+        bounds = numpy.searchsorted(lines[order], numpy.arange(n_lines + 1))
+        edges = edges[order]
+        return [edges[bounds[i]:bounds[i + 1]] for i in range(n_lines)]
+
+    def intersections(self, p1, p2, candidates):
+        """
+        Yield (s, node, p3, p4) for every candidate edge p3 -> p4 which
+        intersects the hatch line p1 -> p2, same as intersect() would
+        """
+        if len(candidates) == 0:
+            return
+        p3 = self.p3[candidates]
+        p4 = self.p4[candidates]
+        d21x = p2[0] - p1[0]
+        d21y = p2[1] - p1[1]
+        d43x = p4[:, 0] - p3[:, 0]
+        d43y = p4[:, 1] - p3[:, 1]
+        d = d21x * d43y - d21y * d43x
+        nb = (p1[1] - p3[:, 1]) * d21x - (p1[0] - p3[:, 0]) * d21y
+        na = (p1[1] - p3[:, 1]) * d43x - (p1[0] - p3[:, 0]) * d43y
+        valid = d != 0
+        d = numpy.where(valid, d, 1.0)
+        sb = nb / d
+        sa = na / d
+        valid &= (sb >= 0) & (sb <= 1) & (sa >= 0) & (sa <= 1)
+        for k in numpy.flatnonzero(valid):
+            yield (
+                float(sa[k]),
+                self.nodes[self.owner[candidates[k]]],
+                p3[k].tolist(),
+                p4[k].tolist(),
+            )
+
+
+def pathEdgeIntersections(p1, p2, paths):
+    """
+    Yield (s, node, p3, p4) for every polygon edge p3 -> p4 of the paths
+    which intersects the hatch line p1 -> p2
+    """
+    for path in paths:
+        for subpath in paths[path]:
+            p3 = subpath[0]
+            for p4 in subpath[1:]:
+                s = intersect(p1, p2, p3, p4)
+                if 0.0 <= s <= 1.0:
+                    yield (s, path, p3, p4)
+                p3 = p4
+
+
+class SegmentEndGrid:
+    """
+    Both ends of the hatch segments not yet drawn, bucketed in a grid
+    with cells as large as the neighborhood searched when joining
+    segments.  Any end within the neighborhood of a point lies in one
+    of the 3 x 3 cells around the point's cell.
+    """
+
+    def __init__(self, abs_line_segments, segment_indices, f_radius_squared):
+        self.abs_line_segments = abs_line_segments
+        self.cell_size = math.sqrt(f_radius_squared) if f_radius_squared > 0 else 0.0
+        self.cells = {}
+        if self.cell_size > 0:
+            for n_segment in segment_indices:
+                for n_end in range(2):
+                    self.cells.setdefault(
+                        self.cell(abs_line_segments[n_segment][n_end]), set()
+                    ).add((n_segment, n_end))
+
+    def cell(self, pt):
+        return (
+            int(math.floor(pt[0] / self.cell_size)),
+            int(math.floor(pt[1] / self.cell_size)),
+        )
+
+    def remove(self, n_segment):
+        # Call once the segment has been drawn
+        if self.cell_size > 0:
+            for n_end in range(2):
+                key = self.cell(self.abs_line_segments[n_segment][n_end])
+                bucket = self.cells.get(key)
+                if bucket is not None:
+                    bucket.discard((n_segment, n_end))
+                    if not bucket:
+                        del self.cells[key]
+
+    def near(self, pt):
+        """
+        (segment index, end index) of all undrawn segment ends around pt,
+        in the order of the segment list
+        """
+        if self.cell_size <= 0:
+            return []
+        cx, cy = self.cell(pt)
+        found = []
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                bucket = self.cells.get((x, y))
+                if bucket:
+                    found.extend(bucket)
+        found.sort()
+        return found
+
+
+def interstices(
+    self, p1, p2, paths, hatches, b_hold_back_hatches, f_hold_back_steps, edge_table=None, candidates=None
+):
     """
     For the line L defined by the points p1 & p2, determine the segments
     of L which lie within the polygons described by the paths stored in
@@ -291,147 +441,148 @@ def interstices(self, p1, p2, paths, hatches, b_hold_back_hatches, f_hold_back_s
 
     where (x1, y1) and (x2, y2) are the (x,y) coordinates of the line
     segment's starting and ending points.
+
+    If an edge_table is given, only the polygon edges listed in
+    candidates are intersected with the line L.
     """
 
+    if edge_table is not None:
+        edge_intersections = edge_table.intersections(p1, p2, candidates)
+    else:
+        edge_intersections = pathEdgeIntersections(p1, p2, paths)
+
     d_and_a = []
     # p1 & p2 is the hatch line
     # p3 & p4 is the polygon edge to check
-    for path in paths:
-        for subpath in paths[path]:
-            p3 = subpath[0]
-            for p4 in subpath[1:]:
-                s = intersect(p1, p2, p3, p4)
-                if 0.0 <= s <= 1.0:
-                    # Save this intersection point along the hatch line
-                    if b_hold_back_hatches:
-                        # We will need to know how the hatch meets the polygon segment, so that we can
-                        # calculate the end of a shorter line that stops short
-                        # of the polygon segment.
-                        # We compute the angle now while we have the information required,
-                        # but do _not_ apply it now, as we need the real,original, intersects
-                        # for the odd/even inside/outside operations yet to come.
-                        # Note that though the intersect() routine _could_ compute the join angle,
-                        # we do it here because we go thru here much less often than we go thru intersect().
-                        angle_hatch_radians = math.atan2(
-                            -(p2[1] - p1[1]), (p2[0] - p1[0])
-                        )  # from p1 toward p2, cartesian coordinates
-                        angle_segment_radians = math.atan2(
-                            -(p4[1] - p3[1]), (p4[0] - p3[0])
-                        )  # from p3 toward p4, cartesian coordinates
-                        angle_difference_radians = (
-                            angle_hatch_radians - angle_segment_radians
-                        )
-                        # coerce to range -pi to +pi
-                        if angle_difference_radians > math.pi:
-                            angle_difference_radians -= 2 * math.pi
-                        elif angle_difference_radians < -math.pi:
-                            angle_difference_radians += 2 * math.pi
-                        f_sin_of_join_angle = math.sin(angle_difference_radians)
-                        f_abs_sin_of_join_angle = abs(f_sin_of_join_angle)
-                        if (
-                            f_abs_sin_of_join_angle != 0.0
-                        ):  # Worrying about case of intersecting a segment parallel to the hatch
-                            prelim_length_to_be_removed = (
-                                f_hold_back_steps / f_abs_sin_of_join_angle
-                            )
-                            b_unconditionally_excise_hatch = False
-                        else:
-                            b_unconditionally_excise_hatch = True
-
-                        if not b_unconditionally_excise_hatch:
-                            # The relevant end of the segment is the end from which the hatch approaches at an acute angle.
-                            intersection = [0, 0]
-                            intersection[0] = p1[0] + s * (
-                                p2[0] - p1[0]
-                            )  # compute intersection point of hatch with segment
-                            intersection[1] = p1[1] + s * (
-                                p2[1] - p1[1]
-                            )  # intersecting hatch line starts at p1, vectored toward p2,
-                            # but terminates at intersection
-                            # Note that atan2 returns answer in range -pi to pi
-                            # Which end is the approach end of the hatch to the segment?
-                            # The dot product tells the answer:
-                            #    if dot product is positive, p2 is at the p4 end,
-                            #    else p2 is at the p3 end
-                            # We really don't need to take the time to actually take
-                            #     the cosine of the angle, we are just interested in
-                            #    the quadrant within which the angle lies.
-                            # I'm sure there is an elegant way to do this, but I'll settle for results just now.
-                            # If the angle is in quadrants I or IV then p4 is the relevant end, otherwise p3 is
-                            # nb: Y increases down, rather than up
-                            # nb: difference angle has been forced to the range -pi to +pi
-                            if abs(angle_difference_radians) < math.pi / 2:
-                                # It's near the p3 the relevant end from which the hatch departs
-                                dist_intersection_to_relevant_end = math.hypot(
-                                    p3[0] - intersection[0], p3[1] - intersection[1]
-                                )
-                                dist_intersection_to_irrelevant_end = math.hypot(
-                                    p4[0] - intersection[0], p4[1] - intersection[1]
-                                )
-                            else:
-                                # It's near the p4 end from which the hatch departs
-                                dist_intersection_to_relevant_end = math.hypot(
-                                    p4[0] - intersection[0], p4[1] - intersection[1]
-                                )
-                                dist_intersection_to_irrelevant_end = math.hypot(
-                                    p3[0] - intersection[0], p3[1] - intersection[1]
-                                )
-
-                            # Now, the problem defined in issue 22 is that we may not need to remove the
-                            # entire preliminary length we've calculated.  This problem occurs because
-                            # we have so far been considering the polygon segment as a line of infinite extent.
-                            # Thus, we may be holding back at a point where no holdback is required, when
-                            # calculated holdback is well beyond the position of the segment end.
-
-                            # To make matters worse, we do not currently know whether we're
-                            # starting a hatch or terminating a hatch, because the duplicates have
-                            # yet to be removed.  All we can do then, is calculate the required
-                            # line shortening for both possibilities - and then choose the correct
-                            # one after duplicate-removal, when actually finalizing the hatches.
-
-                            # Let's see if either end, or perhaps both ends, has a case of excessive holdback
-
-                            # First, default assumption is that neither end has excessive holdback
-                            length_remove_starting_hatch = prelim_length_to_be_removed
-                            length_remove_ending_hatch = prelim_length_to_be_removed
-
-                            # Now check each of the two ends
-                            if prelim_length_to_be_removed > (
-                                dist_intersection_to_relevant_end + f_hold_back_steps
-                            ):
-                                # Yes, would be excessive holdback approaching from this direction
-                                length_remove_starting_hatch = (
-                                    dist_intersection_to_relevant_end
-                                    + f_hold_back_steps
-                                )
-                            if prelim_length_to_be_removed > (
-                                dist_intersection_to_irrelevant_end + f_hold_back_steps
-                            ):
-                                # Yes, would be excessive holdback approaching from other direction
-                                length_remove_ending_hatch = (
-                                    dist_intersection_to_irrelevant_end
-                                    + f_hold_back_steps
-                                )
-
-                            d_and_a.append(
-                                (
-                                    s,
-                                    path,
-                                    length_remove_starting_hatch,
-                                    length_remove_ending_hatch,
-                                )
-                            )
-                        else:
-                            d_and_a.append(
-                                (s, path, 123456.0, 123456.0)
-                            )  # Mark for complete hatch excision, hatch is parallel to segment
-                            # Just a random number guaranteed large enough to be longer than any hatch length
-                    else:
-                        d_and_a.append(
-                            (s, path, 0, 0)
-                        )  # zero length to be removed from hatch
+    for s, path, p3, p4 in edge_intersections:
+        # Save this intersection point along the hatch line
+        if b_hold_back_hatches:
+            # We will need to know how the hatch meets the polygon segment, so that we can
+            # calculate the end of a shorter line that stops short
+            # of the polygon segment.
+            # We compute the angle now while we have the information required,
+            # but do _not_ apply it now, as we need the real,original, intersects
+            # for the odd/even inside/outside operations yet to come.
+            # Note that though the intersect() routine _could_ compute the join angle,
+            # we do it here because we go thru here much less often than we go thru intersect().
+            angle_hatch_radians = math.atan2(
+                -(p2[1] - p1[1]), (p2[0] - p1[0])
+            )  # from p1 toward p2, cartesian coordinates
+            angle_segment_radians = math.atan2(
+                -(p4[1] - p3[1]), (p4[0] - p3[0])
+            )  # from p3 toward p4, cartesian coordinates
+            angle_difference_radians = (
+                angle_hatch_radians - angle_segment_radians
+            )
+            # coerce to range -pi to +pi
+            if angle_difference_radians > math.pi:
+                angle_difference_radians -= 2 * math.pi
+            elif angle_difference_radians < -math.pi:
+                angle_difference_radians += 2 * math.pi
+            f_sin_of_join_angle = math.sin(angle_difference_radians)
+            f_abs_sin_of_join_angle = abs(f_sin_of_join_angle)
+            if (
+                f_abs_sin_of_join_angle != 0.0
+            ):  # Worrying about case of intersecting a segment parallel to the hatch
+                prelim_length_to_be_removed = (
+                    f_hold_back_steps / f_abs_sin_of_join_angle
+                )
+                b_unconditionally_excise_hatch = False
+            else:
+                b_unconditionally_excise_hatch = True
+
+            if not b_unconditionally_excise_hatch:
+                # The relevant end of the segment is the end from which the hatch approaches at an acute angle.
+                intersection = [0, 0]
+                intersection[0] = p1[0] + s * (
+                    p2[0] - p1[0]
+                )  # compute intersection point of hatch with segment
+                intersection[1] = p1[1] + s * (
+                    p2[1] - p1[1]
+                )  # intersecting hatch line starts at p1, vectored toward p2,
+                # but terminates at intersection
+                # Note that atan2 returns answer in range -pi to pi
+                # Which end is the approach end of the hatch to the segment?
+                # The dot product tells the answer:
+                #    if dot product is positive, p2 is at the p4 end,
+                #    else p2 is at the p3 end
+                # We really don't need to take the time to actually take
+                #     the cosine of the angle, we are just interested in
+                #    the quadrant within which the angle lies.
+                # I'm sure there is an elegant way to do this, but I'll settle for results just now.
+                # If the angle is in quadrants I or IV then p4 is the relevant end, otherwise p3 is
+                # nb: Y increases down, rather than up
+                # nb: difference angle has been forced to the range -pi to +pi
+                if abs(angle_difference_radians) < math.pi / 2:
+                    # It's near the p3 the relevant end from which the hatch departs
+                    dist_intersection_to_relevant_end = math.hypot(
+                        p3[0] - intersection[0], p3[1] - intersection[1]
+                    )
+                    dist_intersection_to_irrelevant_end = math.hypot(
+                        p4[0] - intersection[0], p4[1] - intersection[1]
+                    )
+                else:
+                    # It's near the p4 end from which the hatch departs
+                    dist_intersection_to_relevant_end = math.hypot(
+                        p4[0] - intersection[0], p4[1] - intersection[1]
+                    )
+                    dist_intersection_to_irrelevant_end = math.hypot(
+                        p3[0] - intersection[0], p3[1] - intersection[1]
+                    )
 
-                p3 = p4
+                # Now, the problem defined in issue 22 is that we may not need to remove the
+                # entire preliminary length we've calculated.  This problem occurs because
+                # we have so far been considering the polygon segment as a line of infinite extent.
+                # Thus, we may be holding back at a point where no holdback is required, when
+                # calculated holdback is well beyond the position of the segment end.
+
+                # To make matters worse, we do not currently know whether we're
+                # starting a hatch or terminating a hatch, because the duplicates have
+                # yet to be removed.  All we can do then, is calculate the required
+                # line shortening for both possibilities - and then choose the correct
+                # one after duplicate-removal, when actually finalizing the hatches.
+
+                # Let's see if either end, or perhaps both ends, has a case of excessive holdback
+
+                # First, default assumption is that neither end has excessive holdback
+                length_remove_starting_hatch = prelim_length_to_be_removed
+                length_remove_ending_hatch = prelim_length_to_be_removed
+
+                # Now check each of the two ends
+                if prelim_length_to_be_removed > (
+                    dist_intersection_to_relevant_end + f_hold_back_steps
+                ):
+                    # Yes, would be excessive holdback approaching from this direction
+                    length_remove_starting_hatch = (
+                        dist_intersection_to_relevant_end
+                        + f_hold_back_steps
+                    )
+                if prelim_length_to_be_removed > (
+                    dist_intersection_to_irrelevant_end + f_hold_back_steps
+                ):
+                    # Yes, would be excessive holdback approaching from other direction
+                    length_remove_ending_hatch = (
+                        dist_intersection_to_irrelevant_end
+                        + f_hold_back_steps
+                    )
+
+                d_and_a.append(
+                    (
+                        s,
+                        path,
+                        length_remove_starting_hatch,
+                        length_remove_ending_hatch,
+                    )
+                )
+            else:
+                d_and_a.append(
+                    (s, path, 123456.0, 123456.0)
+                )  # Mark for complete hatch excision, hatch is parallel to segment
+                # Just a random number guaranteed large enough to be longer than any hatch length
+        else:
+            d_and_a.append(
+                (s, path, 0, 0)
+            )  # zero length to be removed from hatch
 
     # Return now if there were no intersections
     if len(d_and_a) == 0:
@@ -638,6 +789,8 @@ class HatchFill(inkex.Effect):
         self.xmax, self.ymax = (0.0, 0.0)
         self.paths = {}
         self.grid = []
+        self.gridCandidates = []
+        self.edgeTable = None
         self.hatches = {}
         self.transforms = {}
 
@@ -815,6 +968,7 @@ class HatchFill(inkex.Effect):
             self.xmax, self.ymax = (0.0, 0.0)
             self.paths = {}
             self.grid = []
+            self.gridCandidates = []
 
             # Ignore invisible nodes
             v = node.get("visibility", parent_visibility)
@@ -880,7 +1034,7 @@ class HatchFill(inkex.Effect):
                                 False,
                             )
                         # Now loop over our hatch lines looking for intersections
-                        for h in self.grid:
+                        for n_line, h in enumerate(self.grid):
                             interstices(
                                 self,
                                 (h[0], h[1]),
@@ -889,6 +1043,8 @@ class HatchFill(inkex.Effect):
                                 self.hatches,
                                 self.options.holdBackHatchFromEdges,
                                 self.options.holdBackSteps,
+                                self.edgeTable,
+                                self.gridCandidates[n_line],
                             )
 
             elif node.tag in [inkex.addNS("rect", "svg"), "rect"]:
@@ -934,7 +1090,7 @@ class HatchFill(inkex.Effect):
                             False,
                         )
                         # Now loop over our hatch lines looking for intersections
-                    for h in self.grid:
+                    for n_line, h in enumerate(self.grid):
                         interstices(
                             self,
                             (h[0], h[1]),
@@ -943,6 +1099,8 @@ class HatchFill(inkex.Effect):
                             self.hatches,
                             self.options.holdBackHatchFromEdges,
                             self.options.holdBackSteps,
+                            self.edgeTable,
+                            self.gridCandidates[n_line],
                         )
 
             elif node.tag in [inkex.addNS("line", "svg"), "line"]:
@@ -980,7 +1138,7 @@ class HatchFill(inkex.Effect):
                             False,
                         )
                         # Now loop over our hatch lines looking for intersections
-                    for h in self.grid:
+                    for n_line, h in enumerate(self.grid):
                         interstices(
                             self,
                             (h[0], h[1]),
@@ -989,6 +1147,8 @@ class HatchFill(inkex.Effect):
                             self.hatches,
                             self.options.holdBackHatchFromEdges,
                             self.options.holdBackSteps,
+                            self.edgeTable,
+                            self.gridCandidates[n_line],
                         )
 
             elif node.tag in [inkex.addNS("polyline", "svg"), "polyline"]:
@@ -1037,7 +1197,7 @@ class HatchFill(inkex.Effect):
                                 False,
                             )
                             # Now loop over our hatch lines looking for intersections
-                        for h in self.grid:
+                        for n_line, h in enumerate(self.grid):
                             interstices(
                                 self,
                                 (h[0], h[1]),
@@ -1046,6 +1206,8 @@ class HatchFill(inkex.Effect):
                                 self.hatches,
                                 self.options.holdBackHatchFromEdges,
                                 self.options.holdBackSteps,
+                                self.edgeTable,
+                                self.gridCandidates[n_line],
                             )
 
             elif node.tag in [inkex.addNS("polygon", "svg"), "polygon"]:
@@ -1085,7 +1247,7 @@ class HatchFill(inkex.Effect):
                             False,
                         )
                         # Now loop over our hatch lines looking for intersections
-                    for h in self.grid:
+                    for n_line, h in enumerate(self.grid):
                         interstices(
                             self,
                             (h[0], h[1]),
@@ -1094,6 +1256,8 @@ class HatchFill(inkex.Effect):
                             self.hatches,
                             self.options.holdBackHatchFromEdges,
                             self.options.holdBackSteps,
+                            self.edgeTable,
+                            self.gridCandidates[n_line],
                         )
 
             elif node.tag in [
@@ -1154,7 +1318,7 @@ class HatchFill(inkex.Effect):
                             False,
                         )
                     # Now loop over our hatch lines looking for intersections
-                    for h in self.grid:
+                    for n_line, h in enumerate(self.grid):
                         interstices(
                             self,
                             (h[0], h[1]),
@@ -1163,6 +1327,8 @@ class HatchFill(inkex.Effect):
                             self.hatches,
                             self.options.holdBackHatchFromEdges,
                             self.options.holdBackSteps,
+                            self.edgeTable,
+                            self.gridCandidates[n_line],
                         )
 
             elif node.tag in [inkex.addNS("pattern", "svg"), "pattern"]:
@@ -1269,6 +1435,8 @@ class HatchFill(inkex.Effect):
         if init:
             self.getBoundingBox()
             self.grid = []
+            self.gridCandidates = []
+            self.edgeTable = HatchEdgeTable(self.paths)
 
         # Determine the width and height of the bounding box containing
         # all the polygons to be hatched
@@ -1306,6 +1474,7 @@ class HatchFill(inkex.Effect):
             # Since the spacing may be fractional (e.g., 6.5), we
             # don't try to use range() or other integer iterator
             spacing = float(abs(spacing))
+            offsets = []
             i = -r
             while i <= r:
                 # Line starts at (i, -r) and goes to (i, +r)
@@ -1313,6 +1482,7 @@ class HatchFill(inkex.Effect):
                 y1 = cy + (i * sa) - (r * ca)  # i * sa + (-r) * ca
                 x2 = cx + (i * ca) - (r * sa)  # i * ca - (+r) * sa
                 y2 = cy + (i * sa) + (r * ca)  # i * sa + (+r) * ca
+                offset = i
                 i += spacing
                 # Remove any potential hatch lines which are entirely
                 # outside of the bounding box
@@ -1325,6 +1495,14 @@ class HatchFill(inkex.Effect):
                 ):
                     continue
                 self.grid.append((x1, y1, x2, y2))
+                offsets.append(offset)
+
+            # Bucket the polygon edges by the hatch lines of this grid they may cross
+            self.gridCandidates.extend(
+                self.edgeTable.bucketHatchLines(
+                    offsets, ca, sa, cx, cy, 1.0e-6 * (r + spacing)
+                )
+            )
 
         return ret_value
 
@@ -1444,6 +1622,7 @@ class HatchFill(inkex.Effect):
                 self.joinFillsWithNode(key, stroke_width, path[:-1])
 
             else:
+                n_first_segment = n_abs_line_segment_total
                 for segment in self.hatches[key]:
                     if (
                         len(segment) < 2
@@ -1493,10 +1672,15 @@ class HatchFill(inkex.Effect):
                     transformed_hatch_spacing
                 )
                 # Just fixed and simple for now - may make function of neighborhood later
+                segment_ends = SegmentEndGrid(
+                    abs_line_segments,
+                    range(n_first_segment, n_abs_line_segment_total),
+                    f_proposed_neighborhood_radius_squared,
+                )
 
                 for ref_count in range(
-                    n_abs_line_segment_total
-                ):  # This is the entire range of segments,
+                    n_first_segment, n_abs_line_segment_total
+                ):  # This is the entire range of segments of this element,
                     # Sets global ref_count to segment which has an end closest to current pen position.
                     # Doesn't need to select which end is closest, as that will happen below, with n_ref_end_index.
                     # When we have gone thru this whole range, we will be completely done.
@@ -1510,7 +1694,7 @@ class HatchFill(inkex.Effect):
                         # The below solution is inelegant, but has the virtue of being relatively simple to implement.
                         # Pre-qualify this segment on the issue of whether it has any connecting segments.
                         # If it does not, then just add the path for this one segment, and go on to the next.
-                        # If it does have connecting segments, we need to go through the recursive logic.
+                        # If it does have connecting segments, we need to go through the joining logic.
                         # Lazily, again, select the desired direction of line ahead of time.
 
                         b_found_segment_to_add = False  # default assumption
@@ -1519,104 +1703,19 @@ class HatchFill(inkex.Effect):
                             123456  # just a random large number
                         )
                         for n_ref_end_index in range(2):
-                            pt_reference = abs_line_segments[ref_count][n_ref_end_index]
-                            pt_reference_other_end = abs_line_segments[ref_count][
-                                not n_ref_end_index
-                            ]
-                            f_reference_direction_radians = math.atan2(
-                                pt_reference_other_end[1] - pt_reference[1],
-                                pt_reference_other_end[0] - pt_reference[0],
-                            )  # from other end to this end
-                            # The following is just a simple copy from the routine in recursivelyAppendNearbySegments procedure
                             # Look through all possibilities to choose the closest that fulfills all requirements e.g. direction and colinearity
-                            for innerCount in range(
-                                n_abs_line_segment_total
-                            ):  # investigate all segments
-                                if not abs_line_segments[innerCount][2]:
-                                    # This segment currently undrawn, so it is a candidate for a path extension
-                                    # Need to check both ends of each and every proposed segment so we can find the most appropriate one
-                                    # Define pt2 in the reference as the end which we want to extend
-                                    for nNewSegmentInitialEndIndex in range(2):
-                                        # First try initial end of test segment (aka pt1) vs final end (aka pt2) of reference segment
-                                        if (
-                                            innerCount != ref_count
-                                        ):  # don't investigate self ends
-                                            delta_x = (
-                                                abs_line_segments[innerCount][
-                                                    nNewSegmentInitialEndIndex
-                                                ][0]
-                                                - pt_reference[0]
-                                            )  # proposed initial pt1 X minus existing final pt1 X
-                                            delta_y = (
-                                                abs_line_segments[innerCount][
-                                                    nNewSegmentInitialEndIndex
-                                                ][1]
-                                                - pt_reference[1]
-                                            )  # proposed initial pt1 Y minus existing final pt1 Y
-                                            if (
-                                                (delta_x * delta_x + delta_y * delta_y)
-                                                < f_proposed_neighborhood_radius_squared
-                                            ):
-                                                f_this_distance_squared = (
-                                                    delta_x * delta_x
-                                                    + delta_y * delta_y
-                                                )
-                                                pt_new_segment_this_end = abs_line_segments[
-                                                    innerCount
-                                                ][
-                                                    nNewSegmentInitialEndIndex
-                                                ]
-                                                pt_new_segment_other_end = abs_line_segments[
-                                                    innerCount
-                                                ][
-                                                    not nNewSegmentInitialEndIndex
-                                                ]
-                                                f_new_segment_direction_radians = math.atan2(
-                                                    pt_new_segment_this_end[1]
-                                                    - pt_new_segment_other_end[1],
-                                                    pt_new_segment_this_end[0]
-                                                    - pt_new_segment_other_end[0],
-                                                )  # from other end to this end
-                                                # If this end would cause an alternating direction,
-                                                # then exclude it
-                                                if not self.WouldBeAnAlternatingDirection(
-                                                    f_reference_direction_radians,
-                                                    f_new_segment_direction_radians,
-                                                ):
-                                                    pass
-                                                elif (
-                                                    f_this_distance_squared
-                                                    < f_closest_distance_squared
-                                                ):
-                                                    # One other thing could rule out choosing this segment end:
-                                                    # Want to screen and remove two segments that, while close enough,
-                                                    # should be disqualified because they are colinear.  The reason for this is that
-                                                    # if they are colinear, they arose from the same global grid line, which means
-                                                    # that the gap between them arises from intersections with the boundary.
-                                                    # The idea here is that, all things being more-or-less equal,
-                                                    # we would like to give preference to connecting to a segment
-                                                    # which is the reverse of our current direction.  This makes for better
-                                                    # bezier curve join.
-                                                    # The criterion for being colinear is that the reference segment angle is effectively
-                                                    # the same as the line connecting the reference segment to the end of the new segment.
-                                                    f_joiner_direction_radians = math.atan2(
-                                                        pt_new_segment_this_end[1]
-                                                        - pt_reference[1],
-                                                        pt_new_segment_this_end[0]
-                                                        - pt_reference[0],
-                                                    )
-                                                    if not self.AreCoLinear(
-                                                        f_reference_direction_radians,
-                                                        f_joiner_direction_radians,
-                                                    ):
-                                                        # not colinear
-                                                        f_closest_distance_squared = (
-                                                            f_this_distance_squared
-                                                        )
-                                                        b_found_segment_to_add = True
-                                                        n_ref_end_index_at_closest = (
-                                                            n_ref_end_index
-                                                        )
+                            closest = self.findClosestSegmentEnd(
+                                abs_line_segments,
+                                segment_ends,
+                                ref_count,
+                                n_ref_end_index,
+                                f_proposed_neighborhood_radius_squared,
+                                f_closest_distance_squared,
+                            )
+                            if closest is not None:
+                                f_closest_distance_squared = closest[0]
+                                b_found_segment_to_add = True
+                                n_ref_end_index_at_closest = n_ref_end_index
 
                         # At last we've looked at all the candidate segment ends, as related to all the reference ends
                         if not b_found_segment_to_add:
@@ -1653,6 +1752,7 @@ class HatchFill(inkex.Effect):
                             ] = True  # True flags that this line segment has been
                             # added to the path to be drawn, so should
                             # no longer be a candidate for any kind of move.
+                            segment_ends.remove(ref_count)
                             n_pen_lifts += 1
                         else:
                             # Found segment to add, and we must get to it in absolute terms
@@ -1720,6 +1820,7 @@ class HatchFill(inkex.Effect):
                             ] = True  # True flags that this line segment has been
                             # added to the path to be drawn, so should
                             # no longer be a candidate for any kind of move.
+                            segment_ends.remove(ref_count)
                             n_pen_lifts += 1
                             # Now comes the speedup logic:
                             # We've just drawn a segment starting at an absolute, not relative, position.
@@ -1727,44 +1828,41 @@ class HatchFill(inkex.Effect):
                             # Look for an as-yet-not-drawn segment which has a beginning or ending
                             # point "near" the end point of this absolute draw, and leave the pen down
                             # while moving to and then drawing this found line.
-                            # Do this recursively, marking each segment True to show that
+                            # Do this repeatedly, marking each segment True to show that
                             # it has been "drawn" already.
                             # pt2 is the reference point, ie. the point from which the next segment will start
-                            path = self.recursivelyAppendNearbySegments(
+                            path = self.appendNearbySegments(
                                 transformed_hatch_spacing,
-                                0,
                                 ref_count,
                                 n_ref_end_index_at_closest,
-                                n_abs_line_segment_total,
                                 abs_line_segments,
+                                segment_ends,
                                 path,
                                 relative_held_line_pos,
                             )
 
                 self.joinFillsWithNode(key, stroke_width, path[:-1])
 
-    def recursivelyAppendNearbySegments(
+    def findClosestSegmentEnd(
         self,
-        transformed_hatch_spacing,
-        n_recursion_count,
+        abs_line_segments,
+        segment_ends,
         n_ref_segment_count,
         n_ref_end_index,
-        n_abs_line_segment_total,
-        abs_line_segments,
-        cumulative_path,
-        relative_held_line_pos,
+        f_proposed_neighborhood_radius_squared,
+        f_closest_distance_squared,
     ):
-
-        global pt_last_position_abs
-        f_proposed_neighborhood_radius_squared = self.ProposeNeighborhoodRadiusSquared(
-            transformed_hatch_spacing
-        )
-
-        # Look through all possibilities to choose the closest
-        b_found_segment_to_add = False  # default assumption
-        n_new_segment_end1_index_at_closest = 0
-        n_outer_count_at_closest = -1
-        f_closest_distance_squared = 123456789.0  # just a random large number
+        """
+        Find the undrawn segment end closest to the end n_ref_end_index of
+        segment n_ref_segment_count which may be joined to it: it lies
+        within the neighborhood and closer than f_closest_distance_squared,
+        the new segment runs opposite to the reference segment and is not
+        colinear with it.  Only the ends found in segment_ends around the
+        reference end are examined.
+        Returns (distance squared, segment index, end index, delta x,
+        delta y) or None.
+        """
+        closest = None
 
         pt_reference = abs_line_segments[n_ref_segment_count][n_ref_end_index]
         pt_reference_other_end = abs_line_segments[n_ref_segment_count][
@@ -1776,102 +1874,127 @@ class HatchFill(inkex.Effect):
             f_reference_delta_y, f_reference_delta_x
         )  # from other end to this end
 
-        for outerCount in range(n_abs_line_segment_total):  # investigate all segments
-            if not abs_line_segments[outerCount][2]:
-                # This segment currently undrawn, so it is a candidate for a path extension
-
-                # Need to check both ends of each and every proposed segment until we find one in the neighborhood
-                # Defines pt2 in the reference as the end which we want to extend
-
-                for n_new_segment_end1_index in range(2):
-                    # First try initial end of test segment (aka pt1) vs final end (aka pt2) of reference segment
-                    if outerCount != n_ref_segment_count:  # don't investigate self ends
-                        delta_x = (
-                            abs_line_segments[outerCount][n_new_segment_end1_index][0]
-                            - pt_reference[0]
-                        )  # proposed initial pt1 X minus existing final pt1 X
-                        delta_y = (
-                            abs_line_segments[outerCount][n_new_segment_end1_index][1]
-                            - pt_reference[1]
-                        )  # proposed initial pt1 Y minus existing final pt1 Y
-                        if (
-                            delta_x * delta_x + delta_y * delta_y
-                        ) < f_proposed_neighborhood_radius_squared:
-                            f_this_distance_squared = (
-                                delta_x * delta_x + delta_y * delta_y
-                            )
-                            pt_new_segment_this_end = abs_line_segments[outerCount][
-                                n_new_segment_end1_index
-                            ]
-                            pt_new_segment_other_end = abs_line_segments[outerCount][
-                                not n_new_segment_end1_index
-                            ]
-                            f_new_segment_Dx = (
-                                pt_new_segment_this_end[0] - pt_new_segment_other_end[0]
-                            )
-                            f_new_segment_Dy = (
-                                pt_new_segment_this_end[1] - pt_new_segment_other_end[1]
-                            )
-                            f_new_segment_direction_radians = math.atan2(
-                                f_new_segment_Dy, f_new_segment_Dx
-                            )  # from other end to this end
-                            if not self.WouldBeAnAlternatingDirection(
-                                f_reference_direction_radians,
-                                f_new_segment_direction_radians,
-                            ):
-                                # If this end would cause an alternating direction,
-                                # then exclude it regardless of how close it is
-                                pass
-
-                            elif f_this_distance_squared < f_closest_distance_squared:
-                                # One other thing could rule out choosing this segment end:
-                                # Want to screen and remove two segments that, while close enough,
-                                # should be disqualified because they are colinear.  The reason for this is that
-                                # if they are colinear, they arose from the same global grid line, which means
-                                # that the gap between them arises from intersections with the boundary.
-                                # The idea here is that, all things being more-or-less equal,
-                                # we would like to give preference to connecting to a segment
-                                # which is the reverse of our current direction.  This makes for better
-                                # bezier curve join.
-                                # The criterion for being colinear is that the reference segment angle is effectively
-                                # the same as the line connecting the reference segment to the end of the new segment.
-
-                                f_joiner_direction_radians = math.atan2(
-                                    pt_new_segment_this_end[1] - pt_reference[1],
-                                    pt_new_segment_this_end[0] - pt_reference[0],
-                                )
-                                if not self.AreCoLinear(
-                                    f_reference_direction_radians,
-                                    f_joiner_direction_radians,
-                                ):
-                                    # not colinear
-                                    f_closest_distance_squared = f_this_distance_squared
-                                    b_found_segment_to_add = True
-                                    n_new_segment_end1_index_at_closest = (
-                                        n_new_segment_end1_index
-                                    )
-                                    n_outer_count_at_closest = outerCount
-                                    delta_x_at_closest = delta_x
-                                    delta_y_at_closest = delta_y
-
-        # At last we've looked at all the candidate segment ends
-        n_recursion_count += 1
-        if not b_found_segment_to_add or n_recursion_count >= RECURSION_LIMIT:
-            cumulative_path += "{0:f},{1:f} ".format(
-                relative_held_line_pos[0], relative_held_line_pos[1]
-            )  # close out this segment
-            pt_last_position_abs[0] += relative_held_line_pos[0]
-            pt_last_position_abs[1] += relative_held_line_pos[1]
-            return cumulative_path  # No undrawn segments were suitable for appending,
-            # or there were so many that we worry about python recursion limit
-        else:
-            n_new_segment_end1_index = n_new_segment_end1_index_at_closest
+        for outerCount, n_new_segment_end1_index in segment_ends.near(pt_reference):
+            if outerCount == n_ref_segment_count:  # don't investigate self ends
+                continue
+            # This segment currently undrawn, so it is a candidate for a path extension
+            # First try initial end of test segment (aka pt1) vs final end (aka pt2) of reference segment
+            delta_x = (
+                abs_line_segments[outerCount][n_new_segment_end1_index][0]
+                - pt_reference[0]
+            )  # proposed initial pt1 X minus existing final pt1 X
+            delta_y = (
+                abs_line_segments[outerCount][n_new_segment_end1_index][1]
+                - pt_reference[1]
+            )  # proposed initial pt1 Y minus existing final pt1 Y
+            if (
+                delta_x * delta_x + delta_y * delta_y
+            ) < f_proposed_neighborhood_radius_squared:
+                f_this_distance_squared = (
+                    delta_x * delta_x + delta_y * delta_y
+                )
+                pt_new_segment_this_end = abs_line_segments[outerCount][
+                    n_new_segment_end1_index
+                ]
+                pt_new_segment_other_end = abs_line_segments[outerCount][
+                    not n_new_segment_end1_index
+                ]
+                f_new_segment_Dx = (
+                    pt_new_segment_this_end[0] - pt_new_segment_other_end[0]
+                )
+                f_new_segment_Dy = (
+                    pt_new_segment_this_end[1] - pt_new_segment_other_end[1]
+                )
+                f_new_segment_direction_radians = math.atan2(
+                    f_new_segment_Dy, f_new_segment_Dx
+                )  # from other end to this end
+                if not self.WouldBeAnAlternatingDirection(
+                    f_reference_direction_radians,
+                    f_new_segment_direction_radians,
+                ):
+                    # If this end would cause an alternating direction,
+                    # then exclude it regardless of how close it is
+                    pass
+
+                elif f_this_distance_squared < f_closest_distance_squared:
+                    # One other thing could rule out choosing this segment end:
+                    # Want to screen and remove two segments that, while close enough,
+                    # should be disqualified because they are colinear.  The reason for this is that
+                    # if they are colinear, they arose from the same global grid line, which means
+                    # that the gap between them arises from intersections with the boundary.
+                    # The idea here is that, all things being more-or-less equal,
+                    # we would like to give preference to connecting to a segment
+                    # which is the reverse of our current direction.  This makes for better
+                    # bezier curve join.
+                    # The criterion for being colinear is that the reference segment angle is effectively
+                    # the same as the line connecting the reference segment to the end of the new segment.
+
+                    f_joiner_direction_radians = math.atan2(
+                        pt_new_segment_this_end[1] - pt_reference[1],
+                        pt_new_segment_this_end[0] - pt_reference[0],
+                    )
+                    if not self.AreCoLinear(
+                        f_reference_direction_radians,
+                        f_joiner_direction_radians,
+                    ):
+                        # not colinear
+                        f_closest_distance_squared = f_this_distance_squared
+                        closest = (
+                            f_closest_distance_squared,
+                            outerCount,
+                            n_new_segment_end1_index,
+                            delta_x,
+                            delta_y,
+                        )
+
+        return closest
+
+    def appendNearbySegments(
+        self,
+        transformed_hatch_spacing,
+        n_ref_segment_count,
+        n_ref_end_index,
+        abs_line_segments,
+        segment_ends,
+        cumulative_path,
+        relative_held_line_pos,
+    ):
+
+        global pt_last_position_abs
+        f_proposed_neighborhood_radius_squared = self.ProposeNeighborhoodRadiusSquared(
+            transformed_hatch_spacing
+        )
+
+        while True:
+            # Look through all possibilities to choose the closest
+            closest = self.findClosestSegmentEnd(
+                abs_line_segments,
+                segment_ends,
+                n_ref_segment_count,
+                n_ref_end_index,
+                f_proposed_neighborhood_radius_squared,
+                123456789.0,  # just a random large number
+            )
+
+            # At last we've looked at all the candidate segment ends
+            if closest is None:
+                cumulative_path += "{0:f},{1:f} ".format(
+                    relative_held_line_pos[0], relative_held_line_pos[1]
+                )  # close out this segment
+                pt_last_position_abs[0] += relative_held_line_pos[0]
+                pt_last_position_abs[1] += relative_held_line_pos[1]
+                return cumulative_path  # No undrawn segments were suitable for appending
+
+            (
+                f_closest_distance_squared,
+                count,  # count is the index of the segment to be appended.
+                n_new_segment_end1_index,
+                delta_x,  # delta from final end of incoming segment to initial end of outgoing segment
+                delta_y,
+            ) = closest
             n_new_segment_end2_index = not n_new_segment_end1_index
             # n_new_segment_end1_index is 0 for connecting to pt1,
             # and is 1 for connecting to pt2
-            count = n_outer_count_at_closest  # count is the index of the segment to be appended.
-            delta_x = delta_x_at_closest  # delta from final end of incoming segment to initial end of outgoing segment
-            delta_y = delta_y_at_closest
 
             # First, move pen to initial end (may be either its pt1 or its pt2) of new segment
 
@@ -2007,18 +2130,11 @@ class HatchFill(inkex.Effect):
 
             # Mark this segment as drawn
             abs_line_segments[count][2] = True
+            segment_ends.remove(count)
 
-            cumulative_path = self.recursivelyAppendNearbySegments(
-                transformed_hatch_spacing,
-                n_recursion_count,
-                count,
-                n_new_segment_end2_index,
-                n_abs_line_segment_total,
-                abs_line_segments,
-                cumulative_path,
-                relative_held_line_pos,
-            )
-            return cumulative_path
+            # And continue from its other end
+            n_ref_segment_count = count
+            n_ref_end_index = n_new_segment_end2_index
 
     def ProposeNeighborhoodRadiusSquared(self, transformed_hatch_spacing):
         return (
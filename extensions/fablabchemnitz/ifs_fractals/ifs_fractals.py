@@ -21,6 +21,7 @@
 Perform fixed-depth IFS repeated duplicate-and-transform.
 """
 
+import numpy as np
 import inkex
 
 class IFSFractals(inkex.EffectExtension):
@@ -30,6 +31,7 @@ class IFSFractals(inkex.EffectExtension):
     def add_arguments(self, pars):
         pars.add_argument("--tab")
         pars.add_argument("--iter", type=int, default=3, help="number of iterations")
+        pars.add_argument("--mode", default="copy", help="output: copy, clone or flatten")
         for i in range(self.NXFORM):
             pars.add_argument("--xform%d"%i, type=inkex.Boolean, default=False, help="enable transformation %d"%i)
             for p in self.XFORM_PARAMS:
@@ -54,6 +56,17 @@ class IFSFractals(inkex.EffectExtension):
         grp = inkex.Group('IFS')
         layer = self.svg.get_current_layer().add(grp)
 
+        if self.options.mode == "clone":
+            self.clone(grp, nodes, xforms)
+        elif self.options.mode == "flatten":
+            self.flatten(grp, nodes, xforms)
+        else:
+            self.duplicate(grp, nodes, xforms)
+
+        return True
+
+    def duplicate(self, grp, nodes, xforms):
+        """Copy every node of the previous iteration once per transform"""
         for i in range(self.options.iter):
             n = []
             for node in nodes:
@@ -66,7 +79,69 @@ class IFSFractals(inkex.EffectExtension):
             grp.add(g)
             nodes = n
 
-        return True
+    def clone(self, grp, nodes, xforms):
+        """Reference the previous iteration once per transform, so each iteration only adds one use per transform"""
+        nodes = list(nodes)
+        for i in range(self.options.iter):
+            g = inkex.Group('IFS iter %d'%i)
+            grp.add(g)
+            for node in nodes:
+                for x in xforms:
+                    u = inkex.Use()
+                    u.href = node
+                    u.transform = x
+                    g.add(u)
+            nodes = [g]
+
+    def flatten(self, grp, nodes, xforms):
+        """Compose the transforms of all the iterations and write the transformed shapes as one path"""
+        # matrices of all the compositions of 1 to iter transforms, in iteration order
+        step = np.array([list(x.matrix) + [[0.0, 0.0, 1.0]] for x in xforms])
+        level = np.eye(3)[None]
+        matrices = []
+        for i in range(self.options.iter):
+            level = np.matmul(step[None], level[:, None]).reshape(-1, 3, 3)
+            matrices.append(level)
+        if not matrices:
+            return
+        matrices = np.concatenate(matrices)
+
+        # points of all the shapes, relative to the parent of their selected node like the copies
+        template = ""
+        points = []
+        style = None
+        for node in nodes:
+            parent = -node.getparent().composed_transform()
+            for elem in node.descendants():
+                if not isinstance(elem, inkex.ShapeElement) or isinstance(elem, inkex.Group):
+                    continue
+                try:
+                    csp = elem.path.transform(parent * elem.composed_transform()).to_superpath()
+                except (AttributeError, NotImplementedError, TypeError):
+                    continue
+                if style is None:
+                    style = elem.composed_style()
+                for sub in csp:
+                    if not sub:
+                        continue
+                    # M start, then C ctrl_out ctrl_in end for each segment
+                    points.append(sub[0][1])
+                    for prev, cur in zip(sub[:-1], sub[1:]):
+                        points += [prev[2], cur[0], cur[1]]
+                    template += "M {:.8g},{:.8g} " + "C {:.8g},{:.8g} {:.8g},{:.8g} {:.8g},{:.8g} " * (len(sub) - 1)
+                    if len(sub) > 1 and sub[0][1] == sub[-1][1]:
+                        template += "Z "
+        if not points:
+            inkex.errormsg(_('There is no path to flatten'))
+            return
+
+        points = np.array(points, dtype=float)
+        coords = np.einsum('kij,pj->kpi', matrices[:, :2, :2], points) + matrices[:, None, :2, 2]
+        path = inkex.PathElement()
+        path.label = 'IFS flattened'
+        path.set('d', "".join(template.format(*row) for row in coords.reshape(len(matrices), -1).tolist()))
+        path.style = style
+        grp.add(path)
 
 if __name__ == '__main__':
     IFSFractals().run()
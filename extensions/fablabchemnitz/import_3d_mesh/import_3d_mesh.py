@@ -50,7 +50,7 @@ Many settings for appearance, lighting, rotation, etc are available.
 """
 
 import os
-from math import acos, cos, floor, pi, sin, sqrt
+from math import cos, pi, sin, sqrt
 import numpy
 import tempfile
 import openmesh as om
@@ -75,22 +75,12 @@ def draw_line(x1, y1, x2, y2, width, name, parent):
     elem.set('inkscape:label', name)
     elem.path = [Move(x1, y1), Line(x2, y2)]
 
-def draw_poly(pts, face, st, name, parent):
-    """Draw polygone"""
-    style = {'stroke': '#000000', 'stroke-width': str(st.th), 'stroke-linejoin': st.linejoin,
-             'stroke-opacity': st.s_opac, 'fill': st.fill, 'fill-opacity': st.fill_opacity}
-    path = inkex.Path()
-    for facet in face:
-        if not path:  # for first point
-            path.append(Move(pts[facet - 1][0], -pts[facet - 1][1]))
-        else:
-            path.append(Line(pts[facet - 1][0], -pts[facet - 1][1]))
-    path.close()
-
+def draw_poly(path, style, name, parent):
+    """Draw polygone from its path data"""
     poly = parent.add(inkex.PathElement())
     poly.label = name
-    poly.style = style
-    poly.path = path
+    poly.set('style', style)
+    poly.set('d', path)
 
 
 def draw_edges(edge_list, pts, st, parent):
@@ -101,22 +91,27 @@ def draw_edges(edge_list, pts, st, parent):
         draw_line(pt_1[0], -pt_1[1], pt_2[0], -pt_2[1], st.th, name, parent)
 
 
-def draw_faces(faces_data, pts, obj, shading, fill_col, st, parent):
-    for face in faces_data:  # for every polygon that has been sorted
-        if shading:
-            st.fill = get_darkened_colour(fill_col, face[1] / pi)  # darken proportionally to angle to lighting vector
-        else:
-            st.fill = get_darkened_colour(fill_col, 1)  # do not darken colour
-
-        face_no = face[3]  # the number of the face to draw
-        draw_poly(pts, obj.fce[face_no], st, 'Face:' + str(face_no), parent)
-
-
-def get_darkened_colour(rgb, factor):
-    """return a hex triplet of colour, reduced in lightness 0.0-1.0"""
-    return '#' + "%02X" % floor(factor * rgb[0]) \
-           + "%02X" % floor(factor * rgb[1]) \
-           + "%02X" % floor(factor * rgb[2])  # make the colour string
+def draw_faces(face_ids, angles, pts, obj, shading, fill_col, st, parent):
+    """Draw the faces in the given order, all colours and path data are computed at once"""
+    if shading:
+        factors = angles / pi  # darken proportionally to angle to lighting vector
+    else:
+        factors = numpy.ones(len(face_ids))  # do not darken colour
+    # hex triplets of the colour, reduced in lightness 0.0-1.0
+    rgb = numpy.floor(numpy.nan_to_num(factors)[:, None] * numpy.array(fill_col[:3], float)).astype(int)
+    fills = ['#%02X%02X%02X' % tuple(colour) for colour in rgb.tolist()]
+
+    faces, lengths = obj.get_face_array()
+    coords = numpy.stack((pts[faces[face_ids], 0], -pts[faces[face_ids], 1]), axis=-1).tolist()
+    styles = {}
+    for face_no, fill, length, points in zip(face_ids.tolist(), fills, lengths[face_ids].tolist(), coords):
+        if fill not in styles:
+            st.fill = fill
+            styles[fill] = str(inkex.Style({
+                'stroke': '#000000', 'stroke-width': str(st.th), 'stroke-linejoin': st.linejoin,
+                'stroke-opacity': st.s_opac, 'fill': st.fill, 'fill-opacity': st.fill_opacity}))
+        path = 'M ' + ' L '.join('{} {}'.format(x, y) for x, y in points[:length]) + ' Z'
+        draw_poly(path, styles[fill], 'Face:' + str(face_no), parent)
 
 
 def make_rotation_log(options):
@@ -133,21 +128,20 @@ def normalise(vector):
     length = sqrt(numpy.dot(vector, vector))
     return numpy.array(vector) / length
 
-def get_normal(pts, face):
-    """normal vector for the plane passing though the first three elements of face of pts"""
-    return numpy.cross(
-        (numpy.array(pts[face[0] - 1]) - numpy.array(pts[face[1] - 1])),
-        (numpy.array(pts[face[0] - 1]) - numpy.array(pts[face[2] - 1])),
-    ).flatten()
+def get_normals(pts, faces):
+    """normal vectors for the planes passing though the first three vertices of each face (rows of indices into pts)"""
+    return numpy.cross(pts[faces[:, 0]] - pts[faces[:, 1]], pts[faces[:, 0]] - pts[faces[:, 2]])
 
-def get_unit_normal(pts, face, cw_wound):
+def get_unit_normals(pts, faces, cw_wound):
     """
-    Returns the unit normal for the plane passing through the
-    first three points of face, taking account of winding
+    Returns the unit normals for the planes passing through the
+    first three points of each face, taking account of winding
     """
     # if it is clockwise wound, reverse the vector direction
     winding = -1 if cw_wound else 1
-    return winding * normalise(get_normal(pts, face))
+    normals = get_normals(pts, faces)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return winding * normals / numpy.linalg.norm(normals, axis=1)[:, None]
 
 def rotate(matrix, rads, axis):
     """choose the correct rotation matrix to use"""
@@ -185,6 +179,7 @@ class WavefrontObj(object):
         self.vtx = []
         self.edg = []
         self.fce = []
+        self._face_array = None
         self._parse_file(filename)
 
     def _parse_file(self, filename):
@@ -233,10 +228,21 @@ class WavefrontObj(object):
 
     def get_transformed_pts(self, trans_mat):
         """translate vertex points according to the matrix"""
-        transformed_pts = []
-        for vtx in self.vtx:
-            transformed_pts.append((numpy.matmul(trans_mat, numpy.array(vtx).T)).T.tolist())
-        return transformed_pts
+        return numpy.matmul(numpy.array(self.vtx, float).reshape(-1, 3), trans_mat.T)
+
+    def get_face_array(self):
+        """
+        Returns the faces as an array of 0-based vertex indices, padded
+        with the last vertex of each face, and the number of vertices of each face
+        """
+        if self._face_array is None:
+            lengths = numpy.array([len(face) for face in self.fce])
+            faces = numpy.empty((len(self.fce), lengths.max()), int)
+            for i, face in enumerate(self.fce):
+                faces[i, :len(face)] = face
+                faces[i, len(face):] = face[-1]
+            self._face_array = (faces - 1, lengths)
+        return self._face_array
 
     def get_edge_list(self):
         """make an edge vertex list from an existing face vertex list"""
@@ -353,41 +359,44 @@ class Import3DMesh(inkex.GenerateExtension):
         lighting = normalise((so.lv_x, -so.lv_y, so.lv_z))
         # we have a face list
         if obj.fce:
-            z_list = []
-
-            for i, face in enumerate(obj.fce):
-                # get the normal vector to the face
-                norm = get_unit_normal(transformed_pts, face, so.cw_wound)
-                # get the angle between the normal and the lighting vector
-                angle = acos(numpy.dot(norm, lighting))
-                z_sort_param = so.z_sort(transformed_pts, face)
-
-                # include all polygons or just the front-facing ones as needed
-                if so.back or norm[2] > 0:
-                    # record the maximum z-value of the face and angle to
-                    # light, along with the face ID and normal
-                    z_list.append((z_sort_param, angle, norm, i))
-
-            z_list.sort(key=lambda x: x[0])  # sort by ascending sort parameter of the face
-            draw_faces(z_list, transformed_pts, obj, so.shade, self.options.fill_color, st, poly)
+            faces, lengths = obj.get_face_array()
+            # get the normal vectors to the faces
+            norms = get_unit_normals(transformed_pts, faces, so.cw_wound)
+            # get the angles between the normals and the lighting vector
+            angles = numpy.arccos(numpy.clip(numpy.matmul(norms, lighting), -1.0, 1.0))
+            z_sort_params = so.z_sort(transformed_pts[:, 2][faces], lengths)
+
+            # include all polygons or just the front-facing ones as needed
+            if so.back:
+                face_ids = numpy.arange(len(faces))
+            else:
+                face_ids = numpy.nonzero(norms[:, 2] > 0)[0]
+
+            # sort by ascending sort parameter of the face
+            face_ids = face_ids[numpy.argsort(z_sort_params[face_ids], kind='stable')]
+            draw_faces(face_ids, angles[face_ids], transformed_pts, obj, so.shade, self.options.fill_color, st, poly)
 
         else:  # we cannot generate a list of faces from the edges without a lot of computation
             raise inkex.AbortExtension("Face data not found.")
 
+    # The z_sort methods get the z_values of the points of all the faces,
+    # padded with the last point of each face, and the number of points of each face
+
     @staticmethod
-    def z_sort_max(pts, face):
-        """returns the largest z_value of any point in the face"""
-        return max([pts[facet - 1][2] for facet in face])
+    def z_sort_max(z_values, lengths):
+        """returns the largest z_value of any point in each face"""
+        return z_values.max(axis=1)
 
     @staticmethod
-    def z_sort_min(pts, face):
-        """returns the smallest z_value of any point in the face"""
-        return min([pts[facet - 1][2] for facet in face])
+    def z_sort_min(z_values, lengths):
+        """returns the smallest z_value of any point in each face"""
+        return z_values.min(axis=1)
 
     @staticmethod
-    def z_sort_cent(pts, face):
-        """returns the centroid z_value of any point in the face"""
-        return sum([pts[facet - 1][2] for facet in face]) / len(face)
+    def z_sort_cent(z_values, lengths):
+        """returns the centroid z_value of the points in each face"""
+        padding = (z_values.shape[1] - lengths) * z_values[:, -1]
+        return (z_values.sum(axis=1) - padding) / lengths
 
 if __name__ == '__main__':
     Import3DMesh().run()
@@ -9,6 +9,60 @@ import sys
 from math import log
 import datetime
 
+class ElementRecord(object):
+    '''
+    Analysis data of a single element, shared by all checks. The composed transform is
+    filled in while walking the document, everything else is calculated on first use only.
+    '''
+
+    def __init__(self, element, parent_transform, depth):
+        self.element = element
+        self.parent_transform = parent_transform
+        self.depth = depth
+        if isinstance(element, inkex.ShapeElement):
+            self.transform = parent_transform @ element.transform
+        else:
+            self.transform = None
+        self._style = None
+        self._path = None
+        self._length = None
+        self._bbox = None
+        self._bbox_done = False
+
+    @property
+    def style(self):
+        if self._style is None:
+            self._style = self.element.style
+        return self._style
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = self.element.path
+        return self._path
+
+    @property
+    def nodes(self):
+        return len(self.path)
+
+    @property
+    def length(self):
+        if self._length is None:
+            slengths, self._length = csplength(self.path.transform(self.transform).to_superpath())
+        return self._length
+
+    @property
+    def bbox(self):
+        ''' bounding box in document coordinates or None if it cannot be calculated (e.g. for svg:use) '''
+        if self._bbox_done is False:
+            self._bbox_done = True
+            try:
+                self._bbox = self.element.bounding_box(self.parent_transform)
+            except Exception:
+                self._bbox = None
+        return self._bbox
+
+
 class LaserCheck(inkex.EffectExtension):
     
     '''
@@ -101,26 +155,37 @@ class LaserCheck(inkex.EffectExtension):
         machineHeight = self.svg.unittouu(so.machine_size.split('x')[1] + "mm")
         selected = [] #total list of elements to parse
 
-        
-        def parseChildren(element):
-            if element not in selected:
-                selected.append(element)
-            children = element.getchildren()
-            if children is not None:
-                for child in children:
-                    if child not in selected:
-                        selected.append(child)
-                    parseChildren(child) #go deeper and deeper
+        '''
+        Walk the document once (depth first, in document order) and create a record for each element.
+        The composed transforms are built top-down, so we do not need to call composed_transform() per element.
+        '''
+        root = self.document.getroot()
+        records = {}
+        documentElements = []
+        maxNestDepth = 0
+        stack = [(child, inkex.Transform(), 1) for child in reversed(root)]
+        while stack:
+            element, parentTransform, depth = stack.pop()
+            maxNestDepth = max(maxNestDepth, depth)
+            if not isinstance(element.tag, str): #comments, processing instructions
+                continue
+            record = ElementRecord(element, parentTransform, depth)
+            records[element] = record
+            documentElements.append(element)
+            childTransform = record.transform if record.transform is not None else inkex.Transform()
+            for child in reversed(element):
+                stack.append((child, childTransform, depth + 1))
         
         #check if we have selected elements or if we should parse the whole document instead
         if len(self.svg.selected) == 0:
-            for element in self.document.getroot().iter(tag=etree.Element):
-                if element != self.document.getroot():
-
-                    selected.append(element)
+            selected = documentElements
         else:
+            seen = set()
             for element in self.svg.selected.values():
-                parseChildren(element)
+                for child in element.iter(tag=etree.Element): #the element itself and all its descendants
+                    if child not in seen:
+                        seen.add(child)
+                        selected.append(child)
                 
         namedView = self.document.getroot().find(inkex.addNS('namedview', 'sodipodi'))
         doc_units = namedView.get(inkex.addNS('document-units', 'inkscape'))        
@@ -184,12 +249,9 @@ class LaserCheck(inkex.EffectExtension):
         if so.checks == "check_all" or so.bbox is True:  
             inkex.utils.debug("\n---------- Borders around all elements - minimum offset {} mm from each side".format(so.bbox_offset))
             bbox = inkex.BoundingBox()
-            for element in self.document.getroot().iter(tag=etree.Element):
-                if element != self.document.getroot() and isinstance(element, inkex.ShapeElement) and element.tag != inkex.addNS('use','svg') and element.get('inkscape:groupmode') != 'layer': #bbox fails for svg:use elements and layers
-                    transform = inkex.Transform()
-                    parent = element.getparent()
-                    if parent is not None and isinstance(parent, inkex.ShapeElement):
-                        transform = parent.composed_transform()
+            for element in documentElements:
+                if isinstance(element, inkex.ShapeElement) and element.tag != inkex.addNS('use','svg') and element.get('inkscape:groupmode') != 'layer': #bbox fails for svg:use elements and layers
+                    record = records[element]
                     try:
                         if isinstance (element, inkex.Rectangle) or \
                            isinstance (element, inkex.Circle) or \
@@ -198,10 +260,12 @@ class LaserCheck(inkex.EffectExtension):
                         elif isinstance (element, inkex.TextElement) or \
                              isinstance (element, inkex.Tspan):
                             continue
-                        else:  
-                            bbox += element.bounding_box(transform)
+                        elif record.bbox is not None:
+                            bbox += record.bbox
+                        else:
+                            raise ValueError("bounding box could not be calculated")
                     except Exception:
-                        transform = element.composed_transform()
+                        transform = record.transform
                         x1, y1 = transform.apply_to_point([0, 0])
                         x2, y2 = transform.apply_to_point([1, 1])
                         bbox += inkex.BoundingBox((x1, x2), (y1, y2))
@@ -260,15 +324,7 @@ class LaserCheck(inkex.EffectExtension):
         '''
         if so.checks == "check_all" or so.groups_and_layers is True:
             inkex.utils.debug("\n---------- Groups and layers")
-            global md
-            md = 0
-            def maxDepth(element, level): 
-                global md
-                if (level == md):
-                    md += 1
-                for child in element:
-                    maxDepth(child, level + 1) 
-            maxDepth(self.document.getroot(), -1)
+            md = maxNestDepth #depth was counted while walking the document
             if so.show_issues_only is False:        
                inkex.utils.debug("Maximum group depth={}".format(md - 1))
             if md - 1 > so.nest_depth_max:
@@ -317,13 +373,13 @@ class LaserCheck(inkex.EffectExtension):
 
             for element in selected:
                 if element.tag == inkex.addNS('g','svg'):
-                    if element.style is not None and element.style != "": #style may also be just empty (weird, but was validated on 21.12.2021)
+                    if records[element].style is not None and records[element].style != "": #style may also be just empty (weird, but was validated on 21.12.2021)
                         groupStyles.append(element)
                 if element.tag == inkex.addNS('style', 'svg'):
                     svgStyleElements.append(element)
             for element in shapes:
                 if element.tag != inkex.addNS('g','svg'):
-                    if element.style is not None:
+                    if records[element].style is not None:
                         styleInNonGroupLayerShapes.append(element)
                     for dedicatedStyleItem in dedicatedStyleDict:
                         if element.attrib.has_key(str(dedicatedStyleItem)):
@@ -434,16 +490,18 @@ class LaserCheck(inkex.EffectExtension):
                 if element.tag == inkex.addNS('filter','svg'):
                     filter_elements.append(element)                    
             filter_styles = []
+            filter_styles_seen = set()
             if so.show_issues_only is False:
                 inkex.utils.debug("{} filters (as svg:filter) in total".format(len(filter_elements)))
             for filter_element in filter_elements:
                 inkex.utils.debug("id={}".format(filter_element.get('id')))
                 
             for element in selected:
-                filter_style = [element, element.style.get('filter')]
+                filter_style = [element, records[element].style.get('filter')]
                 if filter_style[1] is None or filter_style[1]  == "none":
                     filter_style[1] = "none"
-                if filter_style[1] != "none" and filter_style not in filter_styles:
+                if filter_style[1] != "none" and (element, filter_style[1]) not in filter_styles_seen:
+                    filter_styles_seen.add((element, filter_style[1]))
                     filter_styles.append(filter_style)
             if so.show_issues_only is False:
                 inkex.utils.debug("{} filters (in styles) in total".format(len(filter_styles)))
@@ -459,7 +517,7 @@ class LaserCheck(inkex.EffectExtension):
             inkex.utils.debug("\n---------- Stroke colors ({} are allowed)".format(so.stroke_colors_max))
             strokeColors = []
             for element in shapes:
-                strokeColor = element.style.get('stroke')
+                strokeColor = records[element].style.get('stroke')
                 if  strokeColor not in strokeColors: #we also add None (default value is #000000 then) and "none" values. 
                     strokeColors.append(strokeColor)
             if so.show_issues_only is False:
@@ -477,7 +535,7 @@ class LaserCheck(inkex.EffectExtension):
             inkex.utils.debug("\n---------- Stroke widths ({} are allowed)".format(so.stroke_widths_max))
             strokeWidths = []
             for element in shapes:  
-                strokeWidth = element.style.get('stroke-width')
+                strokeWidth = records[element].style.get('stroke-width')
                 if strokeWidth not in strokeWidths: #we also add None and "none" values. Default width for None value seems to be 1px
                     strokeWidths.append(strokeWidth)
             if so.show_issues_only is False:
@@ -504,7 +562,7 @@ class LaserCheck(inkex.EffectExtension):
             inkex.utils.debug("\n---------- Cosmetic dashes - should be converted to paths")
             strokeDasharrays = []
             for element in shapes:  
-                strokeDasharray = element.style.get('stroke-dasharray')
+                strokeDasharray = records[element].style.get('stroke-dasharray')
                 if strokeDasharray is not None and strokeDasharray != 'none' and strokeDasharray not in strokeDasharrays:
                     strokeDasharrays.append(strokeDasharray)
             if so.show_issues_only is False:
@@ -531,7 +589,7 @@ class LaserCheck(inkex.EffectExtension):
                         strokeVis = 0
                     else:
                         strokeVis = 1
-                    stroke = element.style.get('stroke')
+                    stroke = records[element].style.get('stroke')
                     if stroke is not None:
                         if stroke == "none":
                             strokeVis = 0
@@ -548,7 +606,7 @@ class LaserCheck(inkex.EffectExtension):
                         widthVis = 0
                     else:
                         widthVis = 1
-                    stroke_width = element.style.get('stroke-width')
+                    stroke_width = records[element].style.get('stroke-width')
                     if stroke_width is not None:
                         if stroke_width == "none":
                             widthVis = 0
@@ -565,7 +623,7 @@ class LaserCheck(inkex.EffectExtension):
                         strokeOpacityVis = 0
                     else:
                         strokeOpacityVis = 1
-                    stroke_opacity = element.style.get('stroke-opacity')
+                    stroke_opacity = records[element].style.get('stroke-opacity')
                     if stroke_opacity is not None:
                         if stroke_opacity == "none": #none means visible!
                             strokeOpacityVis = 1
@@ -586,7 +644,7 @@ class LaserCheck(inkex.EffectExtension):
                         fillVis = 0
                     else:
                         fillVis = 1
-                    fill = element.style.get('fill')
+                    fill = records[element].style.get('fill')
                     if fill is not None:
                         if fill == "none": #none means invisible! (opposite of stroke behaviour)
                             fillVis = 0
@@ -603,7 +661,7 @@ class LaserCheck(inkex.EffectExtension):
                         fillOpacityVis = 0
                     else:
                         fillOpacityVis = 1
-                    fill_opacity = element.style.get('fill-opacity')
+                    fill_opacity = records[element].style.get('fill-opacity')
                     if fill_opacity is not None:
                         if fill_opacity == "none":
                             fillOpacityVis = 0
@@ -613,7 +671,7 @@ class LaserCheck(inkex.EffectExtension):
                             fillOpacityVis = 1
 
 
-                    display = element.style.get('display')
+                    display = records[element].style.get('display')
                     if display == "none":
                         displayVis = 0
                     else:
@@ -654,7 +712,7 @@ class LaserCheck(inkex.EffectExtension):
                             if len(slopes) < 2:
                                 pathVis = 0
                               
-                    if element.style is not None: #f if the style attribute is not set at all, the element will be visible with default black color fill and w/o stroke
+                    if records[element].style is not None: #f if the style attribute is not set at all, the element will be visible with default black color fill and w/o stroke
                         if (strokeVis == 0 or widthVis == 0 or strokeOpacityVis == 0):
                             strokeInvis = True
                         else:
@@ -665,15 +723,10 @@ class LaserCheck(inkex.EffectExtension):
                             fillInvis = False
                         flags = "id={},strokeVis={},widthVis={},strokeOpacityVis={}=>strokeInvisble:{}|fillVis={},fillOpacityVis={}=>fillInvisble:{}|displayVis={},displayAttrVis=, {}|pathVis={}"\
                         .format(element.get('id'), strokeVis, widthVis, strokeOpacityVis, strokeInvis, fillVis, fillOpacityVis, fillInvis, displayVis, displayAttrVis, pathVis)
-                        if strokeInvis is True and fillInvis is True:
-                            if element not in invisibles:
-                                invisibles.append(flags)
-                        if displayVis == 0 or displayAttrVis == 0:
-                            if element not in invisibles:
-                                invisibles.append(flags)
-                        if pathVis == 0:
-                            if element not in invisibles:
-                                invisibles.append(flags) 
+                        if (strokeInvis is True and fillInvis is True) or \
+                           (displayVis == 0 or displayAttrVis == 0) or \
+                           pathVis == 0:
+                            invisibles.append(flags) #each element is visited once, so it is listed once
             if so.show_issues_only is False:
                 inkex.utils.debug("{} invisible shapes in total".format(len(invisibles)))
             for invisible in invisibles:
@@ -688,7 +741,7 @@ class LaserCheck(inkex.EffectExtension):
             inkex.utils.debug("\n---------- Objects with stroke transparencies < 1.0 - should be set to 1.0")
             transparencies = []
             for element in shapes:
-                stroke_opacity = element.style.get('stroke-opacity')
+                stroke_opacity = records[element].style.get('stroke-opacity')
                 if stroke_opacity is not stroke_opacity and stroke_opacity not in transparencies:
                     if stroke_opacity != "none":
                         if float(stroke_opacity) < 1.0:
@@ -746,11 +799,12 @@ class LaserCheck(inkex.EffectExtension):
             shortPaths = []
             totalLength = 0
             totalDropLength = 0
+            shortPathsMin = self.svg.unittouu(str(so.short_paths_min) + "mm")
             for element in shapes:
                 if isinstance(element, inkex.PathElement):
-                    slengths, stotal = csplength(element.path.transform(element.composed_transform()).to_superpath())
+                    stotal = records[element].length
                     totalLength += stotal
-                    if stotal < self.svg.unittouu(str(so.short_paths_min) + "mm"):
+                    if stotal < shortPathsMin:
                         shortPaths.append([element, stotal])
                         totalDropLength += stotal
             if so.show_issues_only is False:
@@ -778,7 +832,7 @@ class LaserCheck(inkex.EffectExtension):
             
             for element in shapes:
                 if isinstance(element, inkex.PathElement):
-                    slengths, stotal = csplength(element.path.transform(element.composed_transform()).to_superpath())
+                    stotal = records[element].length
                     if "-travelLine" in element.get('id'): #we use that id scheme together with the extension "Draw Directions / Travel Moves"
                         totalTravelLength += stotal
                         travelPathCount += 1
@@ -869,11 +923,12 @@ class LaserCheck(inkex.EffectExtension):
         if so.checks == "check_all" or so.nodes_per_path is True:  
             inkex.utils.debug("\n---------- Heavy node-loaded paths (allowed: {} node(s) per {} mm) - should be simplified".format(so.nodes_per_path_max, round(so.nodes_per_path_interval, 3)))
             heavyPaths = []
+            maxNodeDensity = so.nodes_per_path_max / self.svg.unittouu(str(so.nodes_per_path_interval) + "mm")
             for element in shapes:
                 if isinstance(element, inkex.PathElement):
-                    slengths, stotal = csplength(element.path.transform(element.composed_transform()).to_superpath())
-                    nodes = len(element.path)
-                    if nodes /  stotal > so.nodes_per_path_max / self.svg.unittouu(str(so.nodes_per_path_interval) + "mm"):
+                    stotal = records[element].length
+                    nodes = records[element].nodes
+                    if nodes /  stotal > maxNodeDensity:
                         heavyPaths.append([element, nodes, stotal])
             if so.show_issues_only is False:
                 inkex.utils.debug("{} Heavy node-loaded paths in total".format(len(heavyPaths)))
@@ -892,16 +947,18 @@ class LaserCheck(inkex.EffectExtension):
         if so.checks == "check_all" or so.elements_outside_canvas is True:  
             inkex.utils.debug("\n---------- Elements outside canvas or touching the border")
             elementsOutside = []
+            precision = 3
+            #pagew = round(self.svg.unittouu(self.svg.get('width')), precision)
+            #pageh = round(self.svg.unittouu(self.svg.get('height')), precision)   
+            vxMin, vyMin, vxMax, vyMax = self.svg.get_viewbox()
+            pagew = round(vxMax - vxMin, precision)
+            pageh = round(vyMax - vyMin, precision)  
             for element in shapes:
                 if element.tag != inkex.addNS('g', 'svg'):
-                    ebbox = element.bounding_box(element.composed_transform())
-                    precision = 3
+                    ebbox = records[element].bbox
+                    if ebbox is None:
+                        continue
                     #inkex.utils.debug("{} | bbox: left = {:0.3f} right = {:0.3f} top = {:0.3f} bottom = {:0.3f}".format(element.get('id'), ebbox.left, ebbox.right, ebbox.top, ebbox.bottom))
-                    #pagew = round(self.svg.unittouu(self.svg.get('width')), precision)
-                    #pageh = round(self.svg.unittouu(self.svg.get('height')), precision)   
-                    vxMin, vyMin, vxMax, vyMax = self.svg.get_viewbox()
-                    pagew = round(vxMax - vxMin, precision)
-                    pageh = round(vyMax - vyMin, precision)  
                     
                     if round(ebbox.right,  precision) == 0 or \
                        round(ebbox.left,   precision) == pagew or \
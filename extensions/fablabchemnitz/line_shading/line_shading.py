@@ -13,12 +13,16 @@ SOFTWARE.
 '''
 #Version control: last edited by 01.03.2018 8:20
 import os
+import base64
 import tempfile
 import shutil
 import subprocess
 import math
 import inkex
 import sys
+import urllib.request as urllib
+from io import BytesIO
+import numpy
 import png
 from lxml import etree
 from inkex.paths import Path
@@ -42,6 +46,50 @@ def square(x):
         y = -1.0        
     return y
 
+def wave_phases(d_phase, period):
+    #Phases of the waves of all the lines, one line per row of phase steps.
+    #Returns the phase at each column before and after wrapping it into
+    #[0, period[, and the phase reached after the last column of each line.
+    #The phase is wrapped column by column like a running fmod, so the
+    #events at the boundaries fall on the same columns as a sequential loop
+    h, w = d_phase.shape
+    phase = numpy.zeros((h, w))
+    reduced = numpy.zeros((h, w))
+    current = numpy.zeros(h)
+    for x in range(w):
+        phase[:, x] = current
+        current = numpy.fmod(current, period)
+        reduced[:, x] = current
+        current = current + d_phase[:, x]
+    return phase, reduced, current.tolist()
+
+def latest(values, mask):
+    #For each column, the value at the last column (included) where mask is set, 0.0 if none
+    h, w = values.shape
+    index = numpy.maximum.accumulate(numpy.where(mask, numpy.arange(w), -1), axis=1)
+    found = numpy.take_along_axis(values, numpy.maximum(index, 0), axis=1)
+    return numpy.where(index >= 0, found, 0.0)
+
+def running_sums(values):
+    #Sums of the values of each row before each column, with the total in the last column
+    sums = numpy.zeros((values.shape[0], values.shape[1] + 1))
+    sums[:, 1:] = numpy.cumsum(values, axis=1)
+    return sums
+
+def event_sums(event, sums):
+    #Rows and columns of the events, in reading order, with the number of
+    #steps and the sum of the values since the previous event of the line
+    rows, cols = numpy.nonzero(event)
+    previous = numpy.zeros(len(cols), dtype=int)
+    same_line = rows[1:] == rows[:-1]
+    previous[1:][same_line] = cols[:-1][same_line]
+    return rows, cols, cols - previous, sums[rows, cols] - sums[rows, previous]
+
+def last_events(event):
+    #Column of the last event of each line, 0 if there is none
+    h, w = event.shape
+    return numpy.max(numpy.where(event, numpy.arange(w), 0), axis=1).tolist()
+
 class LineShading(inkex.EffectExtension):
     
     def add_arguments(self, pars):
@@ -56,23 +104,47 @@ class LineShading(inkex.EffectExtension):
         pars.add_argument("--line_width", type=float,    help="Line width")
         pars.add_argument("--units", help="Units for line thickness")                        
         pars.add_argument("--remove", type=inkex.Boolean, help="If True, source image is removed")                                    
+        pars.add_argument("--source", default="export", help="Render the image with Inkscape (export) or decode the bitmap directly (bitmap)")
         pars.add_argument("--active-tab", help="The selected UI-tab when OK was pressed")
 
-    def drawfunction(self, image_w, image_h, file):        
+    def read_png(self, file):
+        #Returns the RGB values of the PNG file as an array of shape (h, w, 3)
         reader = png.Reader(file)
-        w, h, pixels, metadata = reader.read_flat()                    
-        matrice = [[1.0 for i in range(w)]for j in range(h)] 
+        w, h, pixels, metadata = reader.read_flat()
         if metadata['alpha']: 
             n = 4 
         else: 
             n = 3
-        #RGB convert to grayscale 0.21R + 0.72G + 0.07B        
-        for y in range(h):        
-            for x in range(w):
-                 pixel_pos = (x + y * w)*n
-                 p = 1.0 - (pixels[pixel_pos]*0.21 + pixels[(pixel_pos+1)]*0.72 + pixels[(pixel_pos+2)]*0.07)/255.0
-                 matrice[y][x] = math.pow(p, 1.0/self.options.gamma)
-        
+        return numpy.asarray(pixels, dtype=float).reshape(h, w, n)[:, :, :3]
+
+    def decode_image(self, node):
+        #Returns the RGB values of the embedded or linked bitmap, composited on white
+        #and resized like the PNG export, as an array of shape (h, w, 3)
+        from PIL import Image
+        href = node.get('xlink:href')
+        if href.startswith('data:'):
+            image = Image.open(BytesIO(base64.b64decode(href.split(',', 1)[1])))
+        else:
+            path = self.absolute_href(urllib.url2pathname(urllib.urlparse(href).path))
+            if not os.path.isfile(path):
+                path = node.get('sodipodi:absref', path)
+            image = Image.open(path)
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image).convert('RGB')
+        w_png, h_png = self.export_size(node)
+        image = image.resize((int(w_png), int(h_png)), Image.LANCZOS)
+        return numpy.asarray(image, dtype=float)
+
+    def intensity(self, rgb):
+        #RGB convert to grayscale 0.21R + 0.72G + 0.07B, inverted and gamma corrected
+        p = 1.0 - (rgb[:, :, 0]*0.21 + rgb[:, :, 1]*0.72 + rgb[:, :, 2]*0.07)/255.0
+        return numpy.power(p, 1.0/self.options.gamma)
+
+    def drawfunction(self, image_w, image_h, matrice):
+        #The phases, events and mean amplitudes of all the lines are computed
+        #with arrays, only the points of the path are emitted line by line
+        h, w = matrice.shape
         points = []
         step_y = image_h/h
         step_x = image_w/(w-1)
@@ -80,182 +152,139 @@ class LineShading(inkex.EffectExtension):
         max_amplitude = self.options.max_amplitude*step_y/2
         min_period = self.options.min_period*step_y
         max_period = self.options.max_period*step_y
-        min_frequency = 1.0/max_period     
-        max_frequency = 1.0/min_period        
+        periods = min_period + (max_period - min_period)*(1-matrice)
+        amplitudes = min_amplitude + (max_amplitude - min_amplitude)*matrice
+        center_y = ((numpy.arange(h)+0.5)*step_y).tolist()
+        columns = numpy.arange(w)
                         
         #Sinusoidal wave (optimized)            
         if self.options.waveform == 'sin':
+            pi = math.pi
+            d_phase = 2.0*pi/periods*step_x
+            phase, reduced, last_phase = wave_phases(d_phase, 2.0*pi)
+            #calculate y: an event closes a half wave
+            wrapped = phase > 2.0*pi
+            event = (wrapped | ((phase < pi) & (pi < (phase + d_phase)))) & (columns > 0)
+            #calculate x: the peaks of the wave
+            quarter = (reduced < 0.5*pi) & (0.5*pi < (reduced + d_phase))
+            three_quarters = ~quarter & (reduced < 1.5*pi) & (1.5*pi < (reduced + d_phase))
+            coord_x = numpy.where(quarter, (columns - (reduced - 0.5*pi)/d_phase)*step_x,
+                                  (columns - (reduced - 1.5*pi)/d_phase)*step_x)
+            #the x coordinate of an event is the last peak before its column
+            coords = latest(coord_x, quarter | three_quarters)
+            sums = running_sums(amplitudes)
+            rows, cols, n_step, amplitude = event_sums(event, sums)
+            x3 = coords[rows, cols-1]
+            y3 = numpy.where(wrapped[rows, cols], -amplitude, amplitude)/n_step + numpy.take(center_y, rows)
+            #each curve starts at the end of the previous one of the line
+            first = numpy.ones(len(rows), dtype=bool)
+            first[1:] = rows[1:] != rows[:-1]
+            x0 = numpy.where(first, 0.0, numpy.roll(x3, 1))
+            y0 = numpy.where(first, numpy.take(center_y, rows), numpy.roll(y3, 1))
+            x2 = x3 - (x3-x0)*numpy.where(wrapped[rows, cols], 0.32, 0.34)
+            x1 = x0 + (x3-x0)*numpy.where(wrapped[rows, cols], 0.34, 0.32)
+            curves = numpy.stack((x1, y0, x2, y3, x3, y3), axis=1).tolist()
+            line_end = numpy.searchsorted(rows, numpy.arange(h), side='right').tolist()
+            line_start = [0] + line_end[:-1]
+            last_event = last_events(event)
+
             for y in range(h):
-                pi = math.pi
-                phase = 0.0
-                coord_x = 0.0
-                amplitude = 0.0
-                n_step = 0
-                x0 = 0.0
-                y0 = math.sin(phase)*(min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x]) + (y+0.5)*step_y
-                points.append(['M',[x0, y0]])
-                for x in range(w):
-                    period = min_period + (max_period - min_period)*(1-matrice[y][x])
-                    #period = 1.0/(min_frequency + (max_frequency - min_frequency)*(matrice[y][x]))
-                    d_phase = 2.0*pi/period*step_x                        
-                    #calculate y
-                    if phase > 2.0*pi:
-                        if n_step > 0:
-                            x3 = coord_x
-                            y3 = -amplitude/n_step + (y+0.5)*step_y
-                            x2 = x3 - (x3-x0)*0.32
-                            y2 = y3
-                            x1 = x0 + (x3-x0)*0.34
-                            y1 = y0
-                            x0 = x3
-                            y0 = y3
-                            points.append(['C',[x1, y1, x2, y2, x3, y3]])
-                            n_step = 0
-                            amplitude = 0
-                    elif phase < pi < (phase + d_phase):
-                        if n_step > 0:
-                            x3 = coord_x
-                            y3 = amplitude/n_step + (y+0.5)*step_y
-                            x2 = x3 - (x3-x0)*0.34
-                            y2 = y3
-                            x1 = x0 + (x3-x0)*0.32
-                            y1 = y0
-                            x0 = x3
-                            y0 = y3
-                            points.append(['C',[x1, y1, x2, y2, x3, y3]])
-                            n_step = 0
-                            amplitude = 0
-                    phase = math.fmod(phase, 2.0*pi)                        
-                    #calculate x
-                    if phase < 0.5*pi < (phase + d_phase):
-                        coord_x = (x - (phase - 0.5*pi)/d_phase)*step_x
-                    elif phase < 1.5*pi < (phase + d_phase):
-                        coord_x = (x - (phase - 1.5*pi)/d_phase)*step_x                             
-                    phase += d_phase
-                    amplitude += (min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x])
-                    n_step += 1                 
-                #add last point                    
+                y_center = center_y[y]
+                points.append(['M',[0.0, y_center]])
+                points.extend(['C', curve] for curve in curves[line_start[y]:line_end[y]])
+                #add last point
+                x0, y0 = points[-1][1][-2:]
+                n_step = w - last_event[y]
                 if n_step > 0:
-                    phase = math.fmod(phase, 2.0*pi)
+                    amplitude = float(sums[y, -1] - sums[y, last_event[y]])
+                    phase = math.fmod(last_phase[y], 2.0*pi)
+                    coord = float(coords[y, -1])
                     if (0 < phase < 0.5*pi) or (pi < phase < 1.5*pi):
                         x3 = (w-1)*step_x
-                        y3 = amplitude*math.sin(phase)/n_step + (y+0.5)*step_y
-                        x2 = x3
-                        y2 = y3
+                        y3 = amplitude*math.sin(phase)/n_step + y_center
                         x1 = x0 + (x3-x0)*0.33
-                        y1 = y0
-                        points.append(['C',[x1, y1, x2, y2, x3, y3]])
+                        points.append(['C',[x1, y0, x3, y3, x3, y3]])
                     else:
-                        if coord_x > (w-1)*step_x:
-                            coord_x = (w-1)*step_x
-                        x3 = coord_x
-                        y3 = math.copysign( amplitude , math.sin(phase))/n_step + (y+0.5)*step_y
+                        if coord > (w-1)*step_x:
+                            coord = (w-1)*step_x
+                        x3 = coord
+                        y3 = math.copysign( amplitude , math.sin(phase))/n_step + y_center
                         x2 = x3 - (x3-x0)*0.32
-                        y2 = y3
                         x1 = x0 + (x3-x0)*0.34
-                        y1 = y0
-                        points.append(['C',[x1, y1, x2, y2, x3, y3]])
-                        if coord_x < (w-1)*step_x:
+                        points.append(['C',[x1, y0, x2, y3, x3, y3]])
+                        if coord < (w-1)*step_x:
                             x0 = x3
                             y0 = y3
                             x3 = (w-1)*step_x
-                            y3 = amplitude*math.sin(phase)/n_step + (y+0.5)*step_y
-                            x2 = x3
-                            y2 = y3
+                            y3 = amplitude*math.sin(phase)/n_step + y_center
                             x1 = x0 + (x3-x0)*0.33
-                            y1 = y0
-                            points.append(['C',[x1, y1, x2, y2, x3, y3]])
+                            points.append(['C',[x1, y0, x3, y3, x3, y3]])
                     
         #Sinusoidal wave (Brute-force)            
         elif self.options.waveform == 'sin_b': 
             pi2 = math.pi*2.0
-            for y in range(h):                    
-                phase = - pi2/4.0
-                for x in range(w):
-                    period = min_period + (max_period - min_period)*(1-matrice[y][x])
-                    amplitude = min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x]
-                    phase += pi2*step_x/period
-                    phase = math.fmod(phase, pi2)
-                    if x == 0:
-                        points.append(['M',[x*step_x, amplitude*math.sin(phase) + (y+0.5)*step_y]])
-                    else:
-                        points.append(['L',[x*step_x, amplitude*math.sin(phase) + (y+0.5)*step_y]])             
+            phase = numpy.fmod(-pi2/4.0 + numpy.cumsum(pi2*step_x/periods, axis=1), pi2)
+            coords_y = amplitudes*numpy.sin(phase) + numpy.array(center_y)[:, None]
+            coords_x = (columns*step_x).tolist()
+            for line in coords_y.tolist():
+                points.append(['M',[coords_x[0], line[0]]])
+                points.extend(['L',[coord, value]] for coord, value in zip(coords_x[1:], line[1:]))
                         
-        #Saw wave                        
-        elif self.options.waveform == 'saw':
-            for y in range(h):                    
-                phase = 0.0
-                coord_x = 0.0
-                amplitude = 0.0
-                n_step = 0.0
-                for x in range(w):
-                    period = min_period + (max_period - min_period)*(1-matrice[y][x])
-                    #period = 1.0/(min_frequency + (max_frequency - min_frequency)*(matrice[y][x]))
-                    d_phase = 4.0/period*step_x
-                    if phase > 4.0:
-                        coord_x = (x - (phase - 4.0)/d_phase)*step_x
-                    elif phase < 2.0 < (phase + d_phase):
-                        coord_x = (x - (phase - 2.0)/d_phase)*step_x     
-                    phase = math.fmod(phase, 4.0)
-                    if (phase < 1.0 < (phase + d_phase)) or (phase < 3.0 < (phase + d_phase)): 
-                        if n_step > 0:
-                            if coord_x == 0.0:
-                                points.append(['M',[coord_x, amplitude*square(phase - 1.0)/n_step + (y+0.5)*step_y]])
-                            else:
-                                points.append(['L',[coord_x, amplitude*square(phase - 1.0)/n_step + (y+0.5)*step_y]])
-                            n_step = 0
-                            amplitude = 0                                                    
-                    phase += d_phase
-                    n_step += 1.0
-                    amplitude += (min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x])
-                if n_step > 0:
-                    points.append(['L',[(w-1)*step_x, amplitude*saw(phase - 1.0)/n_step + (y+0.5)*step_y]])
-
-        #Square wave            
+        #Saw wave and square wave
         else:
-            for y in range(h):                    
-                phase = 0.0
-                coord_x = 0.0
-                amplitude = 0.0
-                n_step = 0
-                for x in range(w):
-                    period = min_period + (max_period - min_period)*(1-matrice[y][x])
-                    #period = 1.0/(min_frequency + (max_frequency - min_frequency)*(matrice[y][x]))
-                    d_phase = 4.0/period*step_x                     
-                    if phase > 4.0:
-                        coord_x = (x - (phase - 4.0)/d_phase)*step_x
-                    elif phase < 2.0 < (phase + d_phase):
-                        coord_x = (x - (phase - 2.0)/d_phase)*step_x                                
-                    phase = math.fmod(phase, 4.0)    
-                    if phase < 1.0 < (phase + d_phase): 
-                        if n_step > 0:
-                            if coord_x == 0.0:
-                                points.append(['M',[coord_x, amplitude/n_step + (y+0.5)*step_y]])
-                            else:
-                                points.append(['L',[coord_x, -amplitude/n_step + (y+0.5)*step_y]])
-                                points.append(['L',[coord_x, amplitude/n_step + (y+0.5)*step_y]])
-                            n_step = 0
-                            amplitude = 0         
-                    elif phase < 3.0 < (phase + d_phase): 
-                        if n_step > 0:
-                            if coord_x == 0.0:
-                                points.append(['M',[coord_x, -amplitude/n_step + (y+0.5)*step_y]])
-                            else:
-                                points.append(['L',[coord_x, amplitude/n_step + (y+0.5)*step_y]])
-                                points.append(['L',[coord_x, -amplitude/n_step + (y+0.5)*step_y]])
-                            n_step = 0
-                            amplitude = 0                                                            
-                    phase += d_phase
-                    n_step += 1
-                    amplitude += (min_amplitude + (max_amplitude - min_amplitude)*matrice[y][x])
+            square_wave = self.options.waveform != 'saw'
+            d_phase = 4.0/periods*step_x
+            phase, reduced, last_phase = wave_phases(d_phase, 4.0)
+            #the x coordinate of the events: where the wave crosses its middle
+            wrapped = phase > 4.0
+            half = ~wrapped & (phase < 2.0) & (2.0 < (phase + d_phase))
+            coord_x = numpy.where(wrapped, (columns - (phase - 4.0)/d_phase)*step_x,
+                                  (columns - (phase - 2.0)/d_phase)*step_x)
+            coords = latest(coord_x, wrapped | half)
+            rising = (reduced < 1.0) & (1.0 < (reduced + d_phase))
+            falling = (reduced < 3.0) & (3.0 < (reduced + d_phase))
+            if square_wave:
+                falling &= ~rising
+            event = (rising | falling) & (columns > 0)
+            sums = running_sums(amplitudes)
+            rows, cols, n_step, amplitude = event_sums(event, sums)
+            if square_wave:
+                signs = numpy.where(rising[rows, cols], 1.0, -1.0)
+            else:
+                #square(phase - 1.0)
+                shifted = numpy.fmod(reduced[rows, cols] - 1.0, 4.0)
+                signs = numpy.where((1.0 < shifted) & (shifted < 3.0), 1.0, -1.0)
+            events = zip(rows.tolist(), coords[rows, cols].tolist(), (amplitude/n_step).tolist(), signs.tolist())
+            line_events = {}
+            for y, coord, mean, sign in events:
+                line_events.setdefault(y, []).append((coord, mean, sign))
+            last_event = last_events(event)
+
+            for y in range(h):
+                y_center = center_y[y]
+                for coord, mean, sign in line_events.get(y, ()):
+                    if square_wave:
+                        if coord == 0.0:
+                            points.append(['M',[coord, sign*mean + y_center]])
+                        else:
+                            points.append(['L',[coord, -sign*mean + y_center]])
+                            points.append(['L',[coord, sign*mean + y_center]])
+                    else:
+                        points.append(['M' if coord == 0.0 else 'L',[coord, sign*mean + y_center]])
+                n_step = w - last_event[y]
                 if n_step > 0:
-                    if 3.0 > phase > 1.0:
-                        points.append(['L',[(w-1)*step_x, amplitude/n_step + (y+0.5)*step_y]])
+                    amplitude = float(sums[y, -1] - sums[y, last_event[y]])
+                    phase = last_phase[y]
+                    if square_wave:
+                        if 3.0 > phase > 1.0:
+                            points.append(['L',[(w-1)*step_x, amplitude/n_step + y_center]])
+                        else:
+                            points.append(['L',[(w-1)*step_x, -amplitude/n_step + y_center]])
                     else:
-                        points.append(['L',[(w-1)*step_x, -amplitude/n_step + (y+0.5)*step_y]])
+                        points.append(['L',[(w-1)*step_x, amplitude*saw(phase - 1.0)/n_step + y_center]])
         return points
     
-    def draw_path(self, node, file):         
+    def draw_path(self, node, matrice):         
         newpath = etree.Element(inkex.addNS('path','svg'))
         line_width = self.options.line_width
         units = self.options.units
@@ -267,23 +296,28 @@ class LineShading(inkex.EffectExtension):
         newpath.set('transform', t)
         image_w = float(node.get('width'))
         image_h = float(node.get('height'))                    
-        newpath.set('d', str(Path(self.drawfunction(image_w, image_h, file))))
+        newpath.set('d', str(Path(self.drawfunction(image_w, image_h, matrice))))
         newpath.set('title', 'Line_Shading')
         node.getparent().append(newpath)
         newpath.set('x', x)
          
-    def export_png(self, node, file):
+    def export_size(self, node):
+        #Returns the width and height in pixels of the raster to sample
         image_w = float(node.get('width'))
         image_h = float(node.get('height'))
         min_period = self.options.min_period 
         max_period = self.options.min_period                
         poinnt_per_min_period = 8.0                     
-        current_file = self.options.input_file
         h_png = str(self.options.num_lines)
         if min_period < max_period:
             w_png = str(round(poinnt_per_min_period*image_w*float(h_png)/min_period/image_h))
         else:
             w_png = str(round(poinnt_per_min_period*image_w*float(h_png)/max_period/image_h))
+        return w_png, h_png
+
+    def export_png(self, node, file):
+        current_file = self.options.input_file
+        w_png, h_png = self.export_size(node)
         id = node.get('id') 
         cmd = "inkscape " + current_file + " --export-type=\"png\" --export-filename=" + file + " --actions=\"export-width:"+w_png+";export-height:"+h_png+";export-background:rgb(255,255,255);export-background-opacity:255;export-id:"+id+"\""
         #inkex.errormsg(cmd)    
@@ -305,14 +339,17 @@ class LineShading(inkex.EffectExtension):
         for id, node in self.svg.selected.items():
            if node.tag == inkex.addNS('image','svg'):
                 image_selected_flag = True
-                tmp_dir = tempfile.mkdtemp()
-                png_temp_file = os.path.join(tmp_dir, "LineShading.png")
-                self.export_png(node, png_temp_file)
-                self.draw_path(node, png_temp_file)
-                shutil.rmtree(tmp_dir)
+                if self.options.source == 'bitmap':
+                    rgb = self.decode_image(node)
+                else:
+                    tmp_dir = tempfile.mkdtemp()
+                    png_temp_file = os.path.join(tmp_dir, "LineShading.png")
+                    self.export_png(node, png_temp_file)
+                    rgb = self.read_png(png_temp_file)
+                    shutil.rmtree(tmp_dir)
+                self.draw_path(node, self.intensity(rgb))
                 if self.options.remove:
                     node.delete()
-                return
         if not image_selected_flag:
             inkex.errormsg("Please select an image")
 
@@ -29,6 +29,7 @@ import networkx as nx
 
 MAX_CONSECUTIVE_OVERWRITE_EDGE = 3
 STOP_SHORTEST_PATH_IF_SMALLER_OR_EQUAL_TO = 1
+MATCHING_NEIGHBOURS = 8
 OVERWRITE_ALLOW = 0
 OVERWRITE_ALLOW_SOME = 1
 OVERWRITE_ALLOW_NONE = 2
@@ -169,6 +170,7 @@ class LongestContinuousPath(inkex.GenerateExtension):
         pars.add_argument("-l", "--enableLog", type=inkex.Boolean, default=False, help="Enable logging")
         pars.add_argument("-o", "--overwriteRule", type=int, default=1, help="Options to control edge overwrite rules")
         pars.add_argument("-k", "--keepSelected", type=inkex.Boolean, default=False, help="Keep selected elements")
+        pars.add_argument("-m", "--eulerizeMode", default="greedy", help="Pairing of odd nodes: greedy or matching")
 
     def parseSVG(self):
         vertices = []
@@ -224,35 +226,41 @@ class LongestContinuousPath(inkex.GenerateExtension):
         if self.options.enableLog:
             inkex.utils.debug(message)
 
+    # Merges all nodes closer than tolerance (transitively) into the node with the smallest index.
+    # Nodes are bucketed in a grid with cell size tolerance, so only nodes in neighbouring cells are compared.
     def mergeWithTolerance(self, G, tolerance):
-        mergeTo = {}
-        for ni in G.nodes():
-            for nj in G.nodes():
-                if nj <= ni:
-                    continue
-                # self.log("Test " + str(ni) + " with " + str(nj))
-                dist_ij = self.dist(G.nodes[ni], G.nodes[nj])
-                if (dist_ij < tolerance) and (nj not in mergeTo) and (ni not in mergeTo):
-                    # self.log("Merge " + str(nj) + " with " + str(ni) + " (dist=" + str(dist_ij) + ")")
-                    mergeTo[nj] = ni
-
-        for n in mergeTo:
-            newEdges = []
-            for neigh_n in G[n]:
-                newEdge = None
-                if neigh_n in mergeTo:
-                    newEdge = (mergeTo[n], mergeTo[neigh_n])
-                else:
-                    newEdge = (mergeTo[n], neigh_n)
+        if tolerance <= 0:
+            return
 
-                if newEdge[0] != newEdge[1]:  # Don't add self-loops
-                    newEdges.append(newEdge)
+        grid = {}
+        for n, data in G.nodes(data=True):
+            grid.setdefault((math.floor(data['x'] / tolerance), math.floor(data['y'] / tolerance)), []).append(n)
 
-            for e in newEdges:
-                G.add_edge(*e)
-                # self.log("Added edge: "+str(e[0]) + " " + str(e[1]))
-            G.remove_node(n)
-            # self.log("Removed node: " + str(n))
+        # Each node not merged yet takes the following nodes closer than the tolerance,
+        # so a cluster never grows further than the tolerance around its representative
+        mergeTo = {}
+        for ni in sorted(G.nodes()):
+            if ni in mergeTo:
+                continue
+            cx, cy = math.floor(G.nodes[ni]['x'] / tolerance), math.floor(G.nodes[ni]['y'] / tolerance)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for nj in grid.get((cx + dx, cy + dy), ()):
+                        if nj > ni and nj not in mergeTo and self.dist(G.nodes[ni], G.nodes[nj]) < tolerance:
+                            mergeTo[nj] = ni
+        merged = list(mergeTo)
+        if not merged:
+            return
+
+        # Rewrite all edges of merged nodes at once, the weight is the distance between the representatives
+        newEdges = []
+        for n1, n2 in G.edges(merged):
+            r1, r2 = mergeTo.get(n1, n1), mergeTo.get(n2, n2)
+            if r1 != r2:  # Don't add self-loops
+                newEdges.append((r1, r2, self.dist(G.nodes[r1], G.nodes[r2])))
+        G.remove_nodes_from(merged)
+        G.add_weighted_edges_from(newEdges)
+        self.log("Merged {:d} nodes".format(len(merged)))
 
     @staticmethod
     def rgbToHex(rgb):
@@ -427,6 +435,10 @@ class LongestContinuousPath(inkex.GenerateExtension):
             oddNodes.pop(0)
             oddNodes.remove(closestNode)
 
+        return self.duplicatePaths(G, pathsToDuplicate)
+
+    # Doesn't modify input graph
+    def duplicatePaths(self, G, pathsToDuplicate):
         numberOfDuplicatedEdges = 0
         lenghtOfDuplicatedEdges = 0.0
 
@@ -436,7 +448,7 @@ class LongestContinuousPath(inkex.GenerateExtension):
             # self.log("Path length: " + str(pathLength))
             lenghtOfDuplicatedEdges += pathLength
         # self.log("Number of duplicated edges: " + str(numberOfDuplicatedEdges))
-        # self.log("Length of duplicated edges: " + str(lenghtOfDuplicatedEdges))
+        self.duplicatedLength += lenghtOfDuplicatedEdges
 
         # Convert the graph to a MultiGraph to allow parallel edges
         G2 = nx.MultiGraph(G)
@@ -445,6 +457,49 @@ class LongestContinuousPath(inkex.GenerateExtension):
 
         return G2
 
+    # Eulerization by matching:
+    # 1. Find all vertices with odd valence.
+    # 2. Run one Dijkstra per odd node, bounded by a search radius. Distances are cached and
+    #    only recomputed for nodes whose radius has to grow.
+    # 3. Pair the odd nodes by a minimum weight matching on their nearest odd neighbours.
+    # 4. Odd nodes left unpaired are matched again with a doubled radius.
+    # 5. Duplicate the shortest paths between the pairs.
+    # Doesn't modify input graph
+    def makeEulerianGraphMatching(self, G):
+        oddNodes = [n for n in G.nodes if G.degree(n) % 2 != 0]
+        if len(oddNodes) == 0:
+            return G
+
+        # Start with the typical spacing of the odd nodes as radius, a path is never shorter than the straight distance
+        xs = [G.nodes[n]['x'] for n in oddNodes]
+        ys = [G.nodes[n]['y'] for n in oddNodes]
+        width, height = max(xs) - min(xs), max(ys) - min(ys)
+        spacing = math.sqrt(width * height / len(oddNodes)) if width * height > 0 else max(width, height) / len(oddNodes)
+        radius = 2 * max(spacing, 1e-6)
+
+        cache = {}  # odd node -> (radius, distances, paths)
+        pathsToDuplicate = []
+        unmatched = set(oddNodes)
+        while unmatched:
+            candidates = nx.Graph()
+            for n1 in unmatched:
+                if n1 not in cache or cache[n1][0] < radius:
+                    distances, paths = nx.single_source_dijkstra(G, n1, cutoff=radius, weight='weight')
+                    cache[n1] = (radius, distances, paths)
+                distances = cache[n1][1]
+                nearest = sorted((distances[n2], n2) for n2 in distances if n2 != n1 and n2 in unmatched)
+                for d, n2 in nearest[:MATCHING_NEIGHBOURS]:
+                    candidates.add_edge(n1, n2, weight=d)
+
+            for n1, n2 in nx.min_weight_matching(candidates):
+                pathsToDuplicate.append(cache[n1][2][n2] if n2 in cache[n1][2] else cache[n2][2][n1][::-1])
+                unmatched.discard(n1)
+                unmatched.discard(n2)
+            radius *= 2
+
+        self.log("Odd nodes: {:d}, cached shortest path searches: {:d}".format(len(oddNodes), len(cache)))
+        return self.duplicatePaths(G, pathsToDuplicate)
+
     # Doesn't modify input graph
     # faster than makeEulerianGraph but creates an extra node
     def makeEulerianGraphExtraNode(self, G):
@@ -588,11 +643,14 @@ class LongestContinuousPath(inkex.GenerateExtension):
 
         paths = []
         makeEulerianDuration = 0
+        self.duplicatedLength = 0.0
         for connectedGraph in connectedGraphs:
             timerStart = timeit.default_timer()
             if self.options.overwriteRule == OVERWRITE_ALLOW_NONE:
                 connectedGraph = self.makeEulerianGraphExtraNode(connectedGraph)
                 #connectedGraph = nx.eulerize(connectedGraph)
+            elif self.options.eulerizeMode == "matching":
+                connectedGraph = self.makeEulerianGraphMatching(connectedGraph)
             else:
                 connectedGraph = self.makeEulerianGraph(connectedGraph)
                 #connectedGraph = nx.eulerize(connectedGraph)
@@ -611,6 +669,7 @@ class LongestContinuousPath(inkex.GenerateExtension):
         self.log("Path number: " + str(len(paths)))
         self.log("Total path length: {:.2f}".format(sum(self.pathLength(G, x) for x in paths)))
         self.log("Number of duplicated edges: {:d}".format(finalEdgeCount-initialEdgeCount))
+        self.log("Length of duplicated edges: {:.2f}".format(self.duplicatedLength))
 
         group = self.pathsToSVG(G, paths)
         totalTimerStop = timeit.default_timer()
@@ -33,7 +33,7 @@ class Maze(inkex.EffectExtension):
 
     def effect(self):
         # basic style
-        style = { 'stroke': "black", "fill":"none", 'stroke-width': self.options.width }
+        style = str(inkex.Style({ 'stroke': "black", "fill":"none", 'stroke-width': self.options.width }))
         # my group of paths
         topgroup = etree.SubElement(self.svg.get_current_layer(), 'g' )
 
@@ -46,18 +46,18 @@ class Maze(inkex.EffectExtension):
         for i,j,door in L.verticalDoors():
             if door:
                 path = points_to_svgd([(lc*(j+1), lc*(i)), (lc*(j+1), lc*(i+1))])
-                mypath_attribs = { 'style': str(inkex.Style(style)), 'd': path }
+                mypath_attribs = { 'style': style, 'd': path }
                 squiggle = etree.SubElement(topgroup, inkex.addNS('path','svg'), mypath_attribs )
     
         for i,j,door in L.horizontalDoors():
             if door:
                 path = points_to_svgd([(lc*(j), lc*(i+1)), (lc*(j+1), lc*(i+1))])
-                mypath_attribs = { 'style': str(inkex.Style(style)), 'd': path }
+                mypath_attribs = { 'style': style, 'd': path }
                 squiggle = etree.SubElement(topgroup, inkex.addNS('path','svg'), mypath_attribs )
 
         
         path = points_to_svgd([(0,0),(0,lc*Y),(lc*X,lc*Y),(lc*X,0)], True)
-        mypath_attribs = { 'style': str(inkex.Style(style)), 'd': path }
+        mypath_attribs = { 'style': style, 'd': path }
         squiggle = etree.SubElement(topgroup, inkex.addNS('path','svg'), mypath_attribs )
 
  
@@ -3,7 +3,9 @@
 # this module is under licence MIT  @ Tiemen DUVILLARD 2020
 # for all questions, comments, bugs: duvillard.tiemen@gmail.com
 
-from random import choice, randrange
+from random import choice, getrandbits, randrange
+
+import numpy as np
 
 # Representation of maze :
 # A labyrinth is a set of 2 door panels.
@@ -33,201 +35,137 @@ from random import choice, randrange
 # 4 │ ∙ q ∙ r ∙ s ∙ t ∙ │                    ## 4 │ ∙   ∙ │ ∙   ∙   ∙ │
 #   └───┴───┴───┴───┴───┘                    ##   └───────┴───────────┘
 
+def rng():
+    """NumPy generator seeded from the random module, so random.seed() still drives the mazes"""
+    return np.random.default_rng(getrandbits(64))
+
+def grids(verti, horiz, x, y):
+    """Return the flat door tables as arrays of vertical and horizontal doors"""
+    verti = np.frombuffer(verti, dtype=np.uint8).reshape(y, x-1)
+    horiz = np.frombuffer(horiz, dtype=np.uint8).reshape(y-1, x)
+    return verti, horiz
+
 def kruskal(x, y):
-    global ID
-    ID = 0
-
-    class case:
-        """Little class for union-find"""
-        def __init__(self,x,y):
-            self.x = x
-            self.y = y
-            self.is_repr = True
-            self.repr = None
-            global ID
-            self.ID = ID
-            ID += 1
-
-        def represent(self):
-            if self.is_repr:
-                return self
-            else:
-                L = [self.repr]
-                while not L[0].is_repr:
-                    L[0] = L[0].repr
-                return L[0]
-
-        def __eq__(self,other):
-            return self.represent().ID == other.represent().ID
-
-        def union(self,other):
-            a = self.represent()
-            b = other.represent()
-            if not (a == b):
-                b.is_repr = False
-                b.repr = a
-
-    # set of doors
-    doors = []
-    # verticals doors result
-    verti = []
-    # horizontals doors result
-    horiz = []
-    # set of cases
-    cases = []
-    ## initialize vertical doors
-    for j in range(y):
-        l = []
-        for i in range(x-1):
-            l.append(1)
-            doors.append([i,j,'v'])
-        verti.append(l)
-    ## initialize horizontal doors
-    for j in range(y-1):
-        l = []
-        for i in range(x):
-            l.append(1)
-            doors.append([i,j,'h'])
-        horiz.append(l)
-
-    ## initialize cases
-    for i in range(y):
-        l = []
-        for j in range(x):
-            l.append(case(x,y))
-        cases.append(l)
+    # Doors are numbered in one flat table, the vertical doors row by row,
+    # then the horizontal ones. Case (i,j) is numbered j*x+i.
+    nv = y*(x-1)
+    doors = bytearray(b'\x01') * (nv + (y-1)*x)
+
+    # union-find with union by rank and path halving
+    parent = list(range(x*y))
+    rank = bytearray(x*y)
 
     cpt = x*y -1 # nb of openings in perfect maze
-    while cpt > 0:
-        # I choose a door
-        idoor = randrange(len(doors))
-        dx, dy, dd = doors[idoor]
-        cx1, cy1 = dx, dy
-        if dd == 'h' : cx2, cy2 = cx1, cy1+1
-        else :         cx2, cy2 = cx1+1, cy1
-
-        C1 = cases[cy1][cx1]
-        C2 = cases[cy2][cx2]
+    # I try the doors in random order
+    for door in rng().permutation(len(doors)).tolist():
+        if cpt == 0:
+            break
+        if door < nv:
+            j, i = divmod(door, x-1)
+            c1 = j*x + i
+            c2 = c1 + 1
+        else:
+            c1 = door - nv
+            c2 = c1 + x
+
+        while parent[c1] != c1:
+            parent[c1] = c1 = parent[parent[c1]]
+        while parent[c2] != c2:
+            parent[c2] = c2 = parent[parent[c2]]
         # if the 2 cases separate by my door are not in same set
-        if not C1 == C2:
-            C1.union(C2)
+        if c1 != c2:
+            if rank[c1] < rank[c2]:
+                c1, c2 = c2, c1
+            parent[c2] = c1
+            if rank[c1] == rank[c2]:
+                rank[c1] += 1
+            doors[door] = 0
             cpt -= 1
-            # i modify my result
-            if dd == "v": verti[dy][dx] = 0
-            else:         horiz[dy][dx] = 0
-        # i delete the door
-        del doors[idoor]
 
-    return verti,horiz
+    return grids(doors[:nv], doors[nv:], x, y)
 
 def recursive_backtrack(x, y):
-    # Initialisation of my variables
-    labyrinthe = []
-    for i in range(y): labyrinthe.append([0] * x)
-    horiz = []
-    for i in range(y-1): horiz.append([1] * x)
-    verti = []
-    for i in range(y): verti.append([1] * (x-1))
+    # Initialisation of my variables, case (X,Y) is numbered Y*x+X
+    labyrinthe = bytearray(x*y)
+    horiz = bytearray(b'\x01') * ((y-1)*x)
+    verti = bytearray(b'\x01') * (y*(x-1))
 
     # I choose a random start
-    X_pos = randrange(x)
-    Y_pos = randrange(y)
-    labyrinthe[Y_pos][X_pos] = 1
-    historique = [[X_pos,Y_pos]]
+    pos = randrange(x*y)
+    labyrinthe[pos] = 1
+    historique = [pos]
 
     # I explore a tree with deep parcours
     while len(historique) != 0:
-        X = historique[-1][0]
-        Y = historique[-1][1]
+        pos = historique[-1]
+        Y, X = divmod(pos, x)
 
         possibilite = []
-        if (Y-1 >= 0) and (labyrinthe[Y-1][X] == 0): possibilite.append(0)
-        if (X+1 < x)  and (labyrinthe[Y][X+1] == 0): possibilite.append(1)
-        if (Y+1 < y)  and (labyrinthe[Y+1][X] == 0): possibilite.append(2)
-        if (X-1 >= 0) and (labyrinthe[Y][X-1] == 0): possibilite.append(3)
+        if (Y-1 >= 0) and not labyrinthe[pos-x]: possibilite.append(0)
+        if (X+1 < x)  and not labyrinthe[pos+1]: possibilite.append(1)
+        if (Y+1 < y)  and not labyrinthe[pos+x]: possibilite.append(2)
+        if (X-1 >= 0) and not labyrinthe[pos-1]: possibilite.append(3)
 
         if len(possibilite) == 0:
             del historique[-1]
         else:
             d = choice(possibilite)
             if d == 0:
-                X1,Y1 = X, Y-1
-                horiz[Y-1][X] = 0
-            if d == 1:
-                X1,Y1 = X+1, Y
-                verti[Y][X] = 0
-            if d == 2:
-                X1,Y1 = X, Y+1
-                horiz[Y][X] = 0
-            if d == 3:
-                X1,Y1 = X-1, Y
-                verti[Y][X-1] = 0
-            labyrinthe[Y1][X1] = 1
-            historique.append([X1,Y1])
+                pos1 = pos-x
+                horiz[pos1] = 0
+            elif d == 1:
+                pos1 = pos+1
+                verti[Y*(x-1)+X] = 0
+            elif d == 2:
+                pos1 = pos+x
+                horiz[pos] = 0
+            else:
+                pos1 = pos-1
+                verti[Y*(x-1)+X-1] = 0
+            labyrinthe[pos1] = 1
+            historique.append(pos1)
 
-    return verti, horiz
+    return grids(verti, horiz, x, y)
 
 
 def recursive_chamber(x, y):
     # Initialisation of my variables
-    def recursive_chamber_recu(VERTI,HORIZ,xA,yA,xB,yB):
-        if (xB - xA <= 1):
-            return
-        elif (yB - yA <= 1):
-            return
-        else :
-            dx = xB-xA
-            dy = yB-yA
-            v = randrange(0,dx+dy)
-            if v < dx :
-                x = randrange(xA,xB-1)
-                y = randrange(yA,yB)
-                for i in range(yA,yB):
-                    if i != y:
-                        VERTI[i][x] = 1
-                recursive_chamber_recu(VERTI,HORIZ,xA,yA,x+1,yB)
-                recursive_chamber_recu(VERTI,HORIZ,x+1,yA,xB,yB)
-            else:
-                x = randrange(xA,xB)
-                y = randrange(yA,yB-1)
-                for i in range(xA,xB):
-                    if i != x:
-                        HORIZ[y][i] = 1
-                recursive_chamber_recu(VERTI,HORIZ,xA,yA,xB,y+1)
-                recursive_chamber_recu(VERTI,HORIZ,xA,y+1,xB,yB)
-
-
-    horiz = []
-    for i in range(y-1): horiz.append([0] * x)
-    verti = []
-    for i in range(y): verti.append([0] * (x-1))
-
-    # appel recursif
-    recursive_chamber_recu(verti,horiz,0,0,x,y)
+    horiz = np.zeros((y-1, x), dtype=np.uint8)
+    verti = np.zeros((y, x-1), dtype=np.uint8)
+
+    # chambers still to divide, in the order of the recursive version
+    chambers = [(0,0,x,y)]
+    while chambers:
+        xA,yA,xB,yB = chambers.pop()
+        if (xB - xA <= 1) or (yB - yA <= 1):
+            continue
+        dx = xB-xA
+        dy = yB-yA
+        v = randrange(0,dx+dy)
+        if v < dx :
+            cx = randrange(xA,xB-1)
+            cy = randrange(yA,yB)
+            verti[yA:yB,cx] = 1
+            verti[cy,cx] = 0
+            chambers.append((cx+1,yA,xB,yB))
+            chambers.append((xA,yA,cx+1,yB))
+        else:
+            cx = randrange(xA,xB)
+            cy = randrange(yA,yB-1)
+            horiz[cy,xA:xB] = 1
+            horiz[cy,cx] = 0
+            chambers.append((xA,cy+1,xB,yB))
+            chambers.append((xA,yA,xB,cy+1))
 
     return verti, horiz
 
 # a empty maze
 def empty(x, y):
-    verti = []
-    for i in range(y):
-        verti.append([0] * (x-1))
-
-    horiz = []
-    for i in range(y-1):
-        horiz.append([0] * x)
-    return verti, horiz
+    return np.zeros((y, x-1), dtype=np.uint8), np.zeros((y-1, x), dtype=np.uint8)
 
 # a full maze
 def full(x, y):
-    verti = []
-    for i in range(y):
-        verti.append([1] * (x-1))
-
-    horiz = []
-    for i in range(y-1):
-        horiz.append([1] * x)
-    return verti, horiz
+    return np.ones((y, x-1), dtype=np.uint8), np.ones((y-1, x), dtype=np.uint8)
 
 
 
@@ -282,22 +220,19 @@ class MazeLib:
 
     def nbDoors(self):
         """Return number of doors in my maze. If maze is perfect, it equals to (self.X-1)*(self.Y-1)"""
-        S = 0
-        for k in self.verti: S += sum(k)
-        for k in self.horiz: S += sum(k)
-        return S
+        return int(np.sum(self.verti)) + int(np.sum(self.horiz))
 
     def verticalDoors(self):
         """Iterate on vertical doors"""
-        for i in range(len(self.verti)):
-            for j in range(len(self.verti[i])):
-                yield i,j, bool(self.verti[i][j])
+        for i, row in enumerate(np.asarray(self.verti).tolist()):
+            for j, door in enumerate(row):
+                yield i,j, bool(door)
 
     def horizontalDoors(self):
         """Iterate on horizontal doors"""
-        for i in range(len(self.horiz)):
-            for j in range(len(self.horiz[i])):
-                yield i,j, bool(self.horiz[i][j])
+        for i, row in enumerate(np.asarray(self.horiz).tolist()):
+            for j, door in enumerate(row):
+                yield i,j, bool(door)
 
     def canMove(self, x, y, direction) :
         """return if i can move in a direction since (x,y) """
@@ -355,87 +290,63 @@ class MazeLib:
             RET.append(l)
         return RET
 
-    def solve(self, xa, ya, xb, yb):
-        """return a list of direction for link (xa,ya) -> (xb,yb). Null"""
+    def moves(self):
+        """return for each direction the step between case numbers and the flat list of cases where it is open"""
+        verti = np.asarray(self.verti, dtype=np.uint8).reshape(self.Y, self.X-1) == 0
+        horiz = np.asarray(self.horiz, dtype=np.uint8).reshape(self.Y-1, self.X) == 0
+        down  = np.zeros((self.Y, self.X), dtype=bool)
+        up    = np.zeros((self.Y, self.X), dtype=bool)
+        left  = np.zeros((self.Y, self.X), dtype=bool)
+        right = np.zeros((self.Y, self.X), dtype=bool)
+        down[:-1]    = horiz
+        up[1:]       = horiz
+        left[:,1:]   = verti
+        right[:,:-1] = verti
+        return [(self.X, down.ravel().tolist()), (-1, left.ravel().tolist()),
+                (-self.X, up.ravel().tolist()), (1, right.ravel().tolist())]
+
+    def explore(self, xa, ya):
+        """Breadth first search since (xa,ya), return the cases numbers (y*X+x) by order of distance and the parent of each case"""
+        moves = self.moves()
+        start = ya*self.X + xa
+        parent = [-1] * (self.X*self.Y)
+        parent[start] = start
+        order = [start]
+        for pos in order:
+            for step, opened in moves:
+                if opened[pos] and parent[pos+step] < 0:
+                    parent[pos+step] = pos
+                    order.append(pos+step)
+        return order, parent
+
+    def way(self, parent, start, end):
+        """return the list of directions from case number start to case number end, following the parents"""
         Sol = []
-        Pile = [(xa,ya)]
-        laby = []
-        for i in range(self.Y):
-            laby.append(['new'] * self.X)
-
-        while len(Pile) != 0  and Pile[-1] != (xb,yb):
-            pos = Pile[-1]
-            x,y = pos[0],pos[1]
-            if laby[y][x] == 'new':
-                possibilite = []
-                for d in ['down',"left","up","right"]:
-                    if self.canMove(pos[0],pos[1],d) :
-                        nx,ny = self.move(pos[0],pos[1],d)
-                        if laby[ny][nx] == 'new' :
-                            possibilite.append(d)
-            
-                laby[y][x] = possibilite
-            elif laby[y][x] == "old":
-                del Pile[-1]
-                if len(Sol) != 0:
-                    del Sol[-1]
-            elif type(laby[y][x]) == list:
-                if len(laby[y][x]) == 0:
-                    laby[y][x] = "old"
-                else:
-                    ichoix = -1#randrange(len(laby[y][x]))
-                    choix = laby[y][x][ichoix]
-                    Pile.append(self.move(x,y,choix))
-                    Sol.append(choix)
-                    del laby[y][x][ichoix]
-
+        while end != start:
+            step = end - parent[end]
+            end = parent[end]
+            if step == self.X:    Sol.append("down")
+            elif step == -self.X: Sol.append("up")
+            elif step == 1:       Sol.append("right")
+            else:                 Sol.append("left")
+        Sol.reverse()
         return Sol
 
-    def furthestBox(self, xa, ya):
-        """return the case furtest of the case (xa,ya)"""
-        Sol = []
-        dmax = len(Sol)
-        pmax = Sol.copy()
-        cmax = (xa,ya)
-
-        Pile = [(xa,ya)]
-        laby = []
-        for i in range(self.Y):
-            laby.append(['new'] * self.X)
-
-        while len(Pile) != 0:
-            pos = Pile[-1]
-            x,y = pos[0],pos[1]
-            if laby[y][x] == 'new':
-                possibilite = []
-                for d in ['down',"left","up","right"]:
-                    if self.canMove(pos[0],pos[1],d) :
-                        nx,ny = self.move(pos[0],pos[1],d)
-                        if laby[ny][nx] == 'new' :
-                            possibilite.append(d)
-            
-                laby[y][x] = possibilite
-            elif laby[y][x] == "old":
-                if len(Sol) > dmax:
-                    dmax = len(Sol)
-                    pmax = Sol.copy()
-                    cmax = (x,y)
-                del Pile[-1]
-                if len(Sol) != 0:
-                    del Sol[-1]
-            elif type(laby[y][x]) == list:
-                if len(laby[y][x]) == 0:
-                    laby[y][x] = "old"
-                else:
-                    ichoix = -1#randrange(len(laby[y][x]))
-                    choix = laby[y][x][ichoix]
-                    Pile.append(self.move(x,y,choix))
-                    Sol.append(choix)
-                    del laby[y][x][ichoix]
+    def solve(self, xa, ya, xb, yb):
+        """return a shortest list of direction for link (xa,ya) -> (xb,yb). Empty if there is no way"""
+        _, parent = self.explore(xa, ya)
+        if parent[yb*self.X + xb] < 0:
+            return []
+        return self.way(parent, ya*self.X + xa, yb*self.X + xb)
 
-        return pmax, cmax
+    def furthestBox(self, xa, ya):
+        """return the way to the case furtest of the case (xa,ya), and this case"""
+        order, parent = self.explore(xa, ya)
+        y, x = divmod(order[-1], self.X)
+        return self.way(parent, order[0], order[-1]), (x,y)
 
     def longestWay(self):
+        """return the ends of the longest way of a perfect maze, and the way between them"""
         Xa = randrange(self.X)
         Ya = randrange(self.Y)
         p,B = self.furthestBox(Xa,Ya)
@@ -447,7 +358,8 @@ class MazeLib:
 
     def save(self):
         """Return a string contain's all information. it can be save in file, print, etc.."""
-        s = "{};{};{};{};{};{};{}".format(self.X, self.Y, self.doors, self.algorithm, self.perfect, self.verti, self.horiz)
+        s = "{};{};{};{};{};{};{}".format(self.X, self.Y, self.doors, self.algorithm, self.perfect,
+                                          np.asarray(self.verti).tolist(), np.asarray(self.horiz).tolist())
         return s
 
     def load(self, st):
@@ -476,6 +388,9 @@ class MazeLib:
                 self.horiz[i][j] = self.horiz[i][j].replace(" ","")
                 self.horiz[i][j] = int(self.horiz[i][j])
 
+        self.verti = np.array(self.verti, dtype=np.uint8).reshape(self.Y, self.X-1)
+        self.horiz = np.array(self.horiz, dtype=np.uint8).reshape(self.Y-1, self.X)
+
     def toTxt(self, centre=False, coord=False, basic= False):
         """return a txt representation of maze in ASCII art"""
         if type(centre) == bool:
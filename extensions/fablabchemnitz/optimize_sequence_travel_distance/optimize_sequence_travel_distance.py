@@ -33,6 +33,7 @@
 
 import math
 import sys
+import time
 from lxml import etree
 import inkex
 import simpletransform
@@ -65,6 +66,94 @@ default=1,help="How compound paths are handled")
 
 """
 
+class EndPointGrid(object):
+    """
+    Spatial hash of path end points for the nearest neighbour ordering.
+    Each point is a tuple (x, y, index, key, reverse); popping a point also removes
+    all other points with the same key (the other end of the same path).
+    """
+
+    def __init__(self, points):
+        self.points_by_key = {}
+        for point in points:
+            self.points_by_key.setdefault(point[3], []).append(point)
+        self.build([point for points in self.points_by_key.values() for point in points])
+
+    def build(self, points):
+        self.count = len(points)
+        self.cells = {}
+        if not points:
+            return
+        xs = [point[0] for point in points]
+        ys = [point[1] for point in points]
+        self.min_x = min(xs)
+        self.min_y = min(ys)
+        extent = max(max(xs) - self.min_x, max(ys) - self.min_y)
+        # aim at roughly two points per cell, coincident points all go in one unit cell
+        self.cell = extent / math.sqrt(max(len(points) / 2.0, 1.0)) or 1.0
+        self.max_i = int((max(xs) - self.min_x) / self.cell)
+        self.max_j = int((max(ys) - self.min_y) / self.cell)
+        self.built_count = self.count
+        for point in points:
+            self.cells.setdefault(self.cell_of(point[0], point[1]), []).append(point)
+
+    def __len__(self):
+        return len(self.points_by_key)
+
+    def cell_of(self, x, y):
+        return int(math.floor((x - self.min_x) / self.cell)), int(math.floor((y - self.min_y) / self.cell))
+
+    def ring_cells(self, ci, cj, ring):
+        """
+        Cells of the grid on the border of the square of half size ring around cell ci, cj:
+        the top and bottom rows, then the left and right columns without their corners.
+        Cells outside of the grid are skipped, so a query far away from the points stays cheap.
+        """
+        if ring == 0:
+            if 0 <= ci <= self.max_i and 0 <= cj <= self.max_j:
+                yield ci, cj
+            return
+        for j in (cj - ring, cj + ring):
+            if 0 <= j <= self.max_j:
+                for i in range(max(ci - ring, 0), min(ci + ring, self.max_i) + 1):
+                    yield i, j
+        for i in (ci - ring, ci + ring):
+            if 0 <= i <= self.max_i:
+                for j in range(max(cj - ring + 1, 0), min(cj + ring - 1, self.max_j) + 1):
+                    yield i, j
+
+    def pop_nearest(self, x, y):
+        """
+        Remove the path with the end point closest to x, y and return (key, reverse).
+        Ties are resolved by the original element order.
+        """
+        ci, cj = self.cell_of(x, y)
+        # number of rings needed to cover the whole grid from the query cell
+        max_ring = max(ci, cj, self.max_i - ci, self.max_j - cj, -ci, -cj) + 1
+        best = None
+        # the rings closer than the grid are empty
+        ring = max(0, -ci, ci - self.max_i, -cj, cj - self.max_j)
+        while ring <= max_ring:
+            for cell in self.ring_cells(ci, cj, ring):
+                for point in self.cells.get(cell, ()):
+                    candidate = ((point[0] - x) ** 2 + (point[1] - y) ** 2, point[2], point[4], point)
+                    if best is None or candidate[:3] < best[:3]:
+                        best = candidate
+            # every point in the next ring is at least ring * cell away
+            if best is not None and best[0] <= (ring * self.cell) ** 2:
+                break
+            ring += 1
+
+        key = best[3][3]
+        for point in self.points_by_key.pop(key):
+            self.cells[self.cell_of(point[0], point[1])].remove(point)
+            self.count -= 1
+        # shrink the grid once most points are gone, so that searches do not scan many empty cells
+        if self.points_by_key and self.count * 4 < self.built_count:
+            self.build([point for points in self.points_by_key.values() for point in points])
+        return key, best[3][4]
+
+
 class OptimizeSequenceTravelDistance(inkex.EffectExtension):
     """
     Inkscape effect extension.
@@ -75,9 +164,15 @@ class OptimizeSequenceTravelDistance(inkex.EffectExtension):
         be sorted.
         
     """
+
+    IMPROVE_WINDOW = 50 # positions searched around each path by the improvement pass
     
     def add_arguments(self, pars):
         pars.add_argument( "--reordering",type=int, default=1, help="How groups are handled")
+        pars.add_argument( "--optimization", default="grid", help="Nearest neighbour search: grid (spatial grid) or greedy (scan all remaining elements)")
+        pars.add_argument( "--reverse_paths",type=inkex.Boolean, default=True, help="Allow reversing paths to start at their closer end (grid search only)")
+        pars.add_argument( "--improve_time",type=float, default=0.0, help="Time budget in seconds for the 2-opt/Or-opt improvement pass (grid search only, 0 to disable)")
+        pars.add_argument( "--report_travel",type=inkex.Boolean, default=True, help="Report the pen-up travel distance before and after optimization")
         pars.add_argument( "--preview_rendering",type=inkex.Boolean, default=False, help="Preview rendering") # Rendering is available for debug purposes. It only previews pen-up movements that are reordered and typically does not include all possible movement.
         self.auto_rotate = True
 
@@ -182,6 +277,14 @@ class OptimizeSequenceTravelDistance(inkex.EffectExtension):
 
         self.svg = self.parse_svg(self.svg, matCurrent)
 
+        if self.options.report_travel == True:
+            if self.air_total_default > 0:
+                reduction = 100.0 * (1.0 - self.air_total_sorted / self.air_total_default)
+            else:
+                reduction = 0.0
+            self.msg("Pen-up travel distance: {0:.3f} in before, {1:.3f} in after optimization ({2:.1f}% reduction)".format(
+                self.air_total_default, self.air_total_sorted, reduction))
+
 
     def parse_svg(self, input_node, mat_current=None, parent_vis='visible'):
         """
@@ -1105,24 +1208,102 @@ class OptimizeSequenceTravelDistance(inkex.EffectExtension):
 
 
     def ReorderNodeList(self, coord_dict, group_dict):
+        # Re-order the given set of SVG elements of one layer.
+        # The order is found by a "greedy" nearest neighbour search (either the original linear scan or a
+        # spatial grid), optionally followed by a 2-opt/Or-opt improvement pass. Afterwards the chosen
+        # elements are reversed where needed and the pen-up travel is accumulated for the final report.
+
+        x_start = self.x_last
+        y_start = self.y_last
+        self.air_total_default += self.TravelDistance(coord_dict,
+            [(key, False) for key in group_dict], x_start, y_start)
+
+        if self.options.optimization == "greedy":
+            sequence = self.GreedySequence(coord_dict, group_dict)
+        else:
+            sequence = self.GridSequence(coord_dict, group_dict)
+            if self.options.improve_time > 0:
+                sequence = self.ImproveSequence(coord_dict, group_dict, sequence, x_start, y_start)
+        self.air_total_sorted += self.TravelDistance(coord_dict, sequence, x_start, y_start)
+
+        ordered_layer_element_list = []
+        self.x_last = x_start
+        self.y_last = y_start
+        for key, reverse in sequence:
+            node = group_dict[key]
+            ordered_layer_element_list.append(node)
+
+            # If this element is non-plottable, then do not save the x,y coordinates
+            if not coord_dict[key][0]:
+                continue
+
+            plottable, entry_x, entry_y, exit_x, exit_y = coord_dict[key]
+            if reverse:
+                node.path = node.path.reverse()
+                entry_x, entry_y, exit_x, exit_y = exit_x, exit_y, entry_x, entry_y
+
+            # Also, draw line indicating that we've found a new point.
+            if self.options.preview_rendering == True: 
+                preview_path = []    # pen-up path data for preview 
+
+                preview_path.append("M{0:.3f} {1:.3f}".format(
+                    self.x_last, self.y_last))
+                preview_path.append("{0:.3f} {1:.3f}".format(
+                    entry_x, entry_y))
+                self.p_style.update({'stroke': self.color_index(self.layer_index)})  
+                path_attrs = {
+                    'style': str(inkex.Style(self.p_style)),
+                    'd': " ".join(preview_path)}
+                    
+                etree.SubElement( self.preview_layer,
+                    inkex.addNS( 'path', 'svg'), path_attrs, nsmap=inkex.NSS )
+
+            # To determine the pen position for the next element, save the last x,y coor of this element
+            self.x_last = exit_x
+            self.y_last = exit_y
+
+        # Return the optimized list of svg elements in the layer
+        return ordered_layer_element_list
+
+
+    def TravelDistance(self, coord_dict, sequence, x_start, y_start):
+        # Pen-up travel distance of a sequence of (node ID, reversed) pairs, starting at x_start, y_start
+        travel = 0.0
+        x_last = x_start
+        y_last = y_start
+        for key, reverse in sequence:
+            plottable, entry_x, entry_y, exit_x, exit_y = coord_dict[key]
+            if not plottable:
+                continue
+            if reverse:
+                entry_x, entry_y, exit_x, exit_y = exit_x, exit_y, entry_x, entry_y
+            travel += math.hypot(entry_x - x_last, entry_y - y_last)
+            x_last = exit_x
+            y_last = exit_y
+        return travel
+
+
+    def GreedySequence(self, coord_dict, group_dict):
         # Re-order the given set of SVG elements, using a simple "greedy" algorithm.
         # The first object will be the element closest to the origin
         # After this choice, the algorithm loops through all remaining elements looking for the element whose first x,y
         # coordinates are closest to the the previous choice's last x,y coordinates
-        # This process continues until all elements have been sorted into ordered_element_list and removed from group_dict    
+        # This process continues until all elements have been sorted into the sequence    
         
-        ordered_layer_element_list = []
+        sequence = []
+        remaining = dict(group_dict)
+        x_last = self.x_last
+        y_last = self.y_last
             
         # Continue until all elements have been re-ordered
-        while group_dict:
+        while remaining:
             
             nearest_dist = float('inf')
-            for key,node in group_dict.items():    
+            for key,node in remaining.items():    
                 # Is this node non-plottable?
-                # If so, exit loop and append element to ordered_layer_element_list
+                # If so, exit loop and append element to the sequence
                 if not coord_dict[key][0]:
                     # Object is not Plottable
-                    nearest = node 
                     nearest_id = key 
                     continue
                 
@@ -1130,10 +1311,7 @@ class OptimizeSequenceTravelDistance(inkex.EffectExtension):
                 entry_x = coord_dict[key][1] # x-coordinate of first point of the path
                 entry_y = coord_dict[key][2] # y-coordinate of first point of the path
 
-                exit_x = coord_dict[key][3] # x-coordinate of last point of the path
-                exit_y = coord_dict[key][4] # y-coordinate of last point of the path
-
-                object_dist = (entry_x-self.x_last)*(entry_x-self.x_last) + (entry_y-self.y_last) * (entry_y-self.y_last)
+                object_dist = (entry_x-x_last)*(entry_x-x_last) + (entry_y-y_last) * (entry_y-y_last)
                 # This is actually the distance squared; calculating it rather than the pythagorean distance
                 #  saves a square root calculation. Right now, we only care about _which distance is less_
                 #  not the exact value of it, so this is a harmless shortcut.
@@ -1141,49 +1319,142 @@ class OptimizeSequenceTravelDistance(inkex.EffectExtension):
                 # element's entry with our current element's distance 
                 if nearest_dist >= object_dist:
                     # We have found an element closer than the previous closest element 
-                    nearest = node
                     nearest_id = key 
                     nearest_dist = object_dist
-                    nearest_start_x = entry_x
-                    nearest_start_y = entry_y
 
             # Now that the closest object has been determined, it is time to add it to the 
             # optimized list of closest objects
-            ordered_layer_element_list.append(nearest)
+            sequence.append((nearest_id, False))
     
             # To determine the closest object in the next iteration of the loop, 
-            # we must save the last x,y coor of this element
-            # If this element is plottable, then save the x,y coordinates
-            # If this element is non-plottable, then do not save the x,y coordinates
+            # we must save the last x,y coor of this element (if it is plottable)
             if coord_dict[nearest_id][0]:
-            
-                # Also, draw line indicating that we've found a new point.
-                if self.options.preview_rendering == True: 
-                    preview_path = []    # pen-up path data for preview 
-
-                    preview_path.append("M{0:.3f} {1:.3f}".format(
-                        self.x_last, self.y_last))
-                    preview_path.append("{0:.3f} {1:.3f}".format(
-                        nearest_start_x, nearest_start_y))
-                    self.p_style.update({'stroke': self.color_index(self.layer_index)})  
-                    path_attrs = {
-                        'style': str(inkex.Style(self.p_style)),
-                        'd': " ".join(preview_path)}
-                        
-                    etree.SubElement( self.preview_layer,
-                        inkex.addNS( 'path', 'svg'), path_attrs, nsmap=inkex.NSS )
+                x_last = coord_dict[nearest_id][3]
+                y_last = coord_dict[nearest_id][4]
 
-                self.x_last = coord_dict[nearest_id][3]
-                self.y_last = coord_dict[nearest_id][4]
+            # Remove this element from remaining to indicate it has been optimized
+            del remaining[nearest_id]
+
+        return sequence
+
+
+    def GridSequence(self, coord_dict, group_dict):
+        # Greedy nearest neighbour ordering like GreedySequence, but the candidates are looked up in a
+        # spatial grid of path end points instead of scanning all remaining elements for each choice.
+        # If reversing is allowed, plain paths may also be entered at their last point.
+        # Non-plottable elements are kept at the beginning, in their original order.
+
+        sequence = []
+        points = []
+        for index, (key, node) in enumerate(group_dict.items()):
+            if not coord_dict[key][0]:
+                sequence.append((key, False))
+                continue
+            plottable, entry_x, entry_y, exit_x, exit_y = coord_dict[key]
+            points.append((entry_x, entry_y, index, key, False))
+            if self.options.reverse_paths and isinstance(node, inkex.PathElement) \
+                and (entry_x, entry_y) != (exit_x, exit_y):
+                points.append((exit_x, exit_y, index, key, True))
+
+        grid = EndPointGrid(points)
+        x_last = self.x_last
+        y_last = self.y_last
+        while grid:
+            key, reverse = grid.pop_nearest(x_last, y_last)
+            sequence.append((key, reverse))
+            if reverse:
+                x_last = coord_dict[key][1]
+                y_last = coord_dict[key][2]
+            else:
+                x_last = coord_dict[key][3]
+                y_last = coord_dict[key][4]
+        return sequence
+
+
+    def ImproveSequence(self, coord_dict, group_dict, sequence, x_start, y_start):
+        # Improve the pen-up travel of a (greedy) sequence with 2-opt moves (reversing a run of
+        # reversible paths) and Or-opt moves (relocating a run of up to three paths), both
+        # limited to a window of nearby positions. Stops when no move helps or the time budget is used up.
+
+        plottable = [(key, reverse) for key, reverse in sequence if coord_dict[key][0]]
+        fixed = [(key, reverse) for key, reverse in sequence if not coord_dict[key][0]]
+        n = len(plottable)
+        if n < 3:
+            return sequence
+
+        keys = [key for key, reverse in plottable]
+        flipped = [reverse for key, reverse in plottable]
+        reversible = [self.options.reverse_paths and isinstance(group_dict[key], inkex.PathElement) for key in keys]
+        window = self.IMPROVE_WINDOW
+        deadline = time.time() + self.options.improve_time
+
+        def entry(i):
+            if i < 0:
+                return x_start, y_start
+            c = coord_dict[keys[i]]
+            return (c[3], c[4]) if flipped[i] else (c[1], c[2])
+
+        def exit(i):
+            if i < 0:
+                return x_start, y_start
+            c = coord_dict[keys[i]]
+            return (c[1], c[2]) if flipped[i] else (c[3], c[4])
+
+        def dist(a, b):
+            return math.hypot(a[0] - b[0], a[1] - b[1])
+
+        def link(i, j):
+            # pen-up travel from the end of position i to the start of position j (no travel after the last path)
+            if j >= n:
+                return 0.0
+            return dist(exit(i), entry(j))
+
+        improved = True
+        while improved and time.time() < deadline:
+            improved = False
+            for i in range(n):
+                if time.time() >= deadline:
+                    break
+
+                # 2-opt: reverse the run i..j and flip the direction of each path in it
+                for j in range(i + 1, min(n, i + window)):
+                    if not reversible[i] or not reversible[j]:
+                        break
+                    before = link(i - 1, i) + link(j, j + 1)
+                    after = dist(exit(i - 1), exit(j)) + (dist(entry(i), entry(j + 1)) if j + 1 < n else 0.0)
+                    if after < before - 1e-9:
+                        keys[i:j + 1] = keys[i:j + 1][::-1]
+                        reversible[i:j + 1] = reversible[i:j + 1][::-1]
+                        flipped[i:j + 1] = [not f for f in flipped[i:j + 1][::-1]]
+                        improved = True
+
+                # Or-opt: move the run i..i+length-1 between positions k and k+1
+                for length in (1, 2, 3):
+                    last = i + length - 1
+                    if last >= n:
+                        break
+                    removed = link(i - 1, i) + link(last, last + 1) - link(i - 1, last + 1)
+                    best_k = None
+                    best_gain = 1e-9
+                    for k in range(max(-1, i - window), min(n, last + window)):
+                        if i - 1 <= k <= last:
+                            continue
+                        inserted = dist(exit(k), entry(i)) + link(last, k + 1) - link(k, k + 1)
+                        if removed - inserted > best_gain:
+                            best_gain = removed - inserted
+                            best_k = k
+                    if best_k is not None:
+                        k = best_k if best_k < i else best_k - length
+                        for values in (keys, flipped, reversible):
+                            run = values[i:last + 1]
+                            del values[i:last + 1]
+                            values[k + 1:k + 1] = run
+                        improved = True
+                        break
+
+        return fixed + list(zip(keys, flipped))
 
-            # Remove this element from group_dict to indicate it has been optimized
-            del group_dict[nearest_id]
-    
-        # Once all elements have been removed from the group_dictionary
-        # Return the optimized list of svg elements in the layer
-        return ordered_layer_element_list
 
-    
     def color_index(self, index):
         index = index % 9
         
@@ -0,0 +1,199 @@
+import os
+import re
+
+import numpy as np
+
+# Binary STL: 80 bytes header, uint32 number of facets, then 50 bytes per facet
+STL_HEADER_SIZE = 84
+STL_FACET_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2'),
+])
+
+# Number of bytes looked at to tell binary from ASCII files
+STL_SNIFF_SIZE = 1024
+
+# Number of facets formatted at once when writing ASCII STL
+ASCII_CHUNK_SIZE = 10000
+
+ASCII_VERTEX = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+
+def is_binary_stl(path):
+    """Checks if a .stl file is binary
+
+    A file is binary when it has exactly the size announced by its facet
+    count. Otherwise its content decides: ASCII files start with 'solid',
+    contain a 'facet' keyword early on and only use ASCII characters, while
+    some binary exporters also write 'solid' at the beginning of the header
+    but have raw floats after it.
+    :param path: path to the file
+    """
+    size = os.path.getsize(path)
+    if size < STL_HEADER_SIZE:
+        return False
+    with open(path, 'rb') as f:
+        start = f.read(STL_SNIFF_SIZE)
+    count = int(np.frombuffer(start, dtype='<u4', count=1, offset=80)[0])
+    if size == STL_HEADER_SIZE + count * STL_FACET_DTYPE.itemsize:
+        return True
+    if not start.lstrip().startswith(b'solid') or b'facet' not in start:
+        return True
+    return any(byte > 127 or (byte < 32 and byte not in b'\t\n\r\f\v') for byte in start)
+
+
+class ArrayMesh:
+    """Triangle mesh stored in NumPy arrays
+
+    :param vertices: float array of shape (n, 3) with the vertex coordinates
+    :param faces: int array of shape (m, 3) with the vertex indices of each face
+    :param name: name of the model, used as solid name in STL files
+    """
+    def __init__(self, vertices, faces, name = 'model'):
+        self.vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        self.faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        self.name = name
+
+    @classmethod
+    def from_triangles(cls, triangles, name = 'model'):
+        """Creates a mesh from a triangle soup
+
+        :param triangles: array of shape (m, 3, 3), each face with its own vertices
+        :param name: name of the model
+        """
+        triangles = np.asarray(triangles).reshape(-1, 3)
+        return cls(triangles, np.arange(len(triangles)).reshape(-1, 3), name)
+
+    @classmethod
+    def from_model(cls, model):
+        """Creates a mesh from a model loaded by one of the parsers
+
+        :param model: a ModelParser with its vertices and parts
+        """
+        vertices = np.array([(v.x, v.y, v.z) for v in model.vertices], dtype=np.float64)
+        faces = np.array([
+            (face.a.vertex, face.b.vertex, face.c.vertex)
+            for part in model.parts for face in part.faces
+        ], dtype=np.int64)
+        return cls(vertices, faces, mesh_name(model.path))
+
+    @classmethod
+    def read_stl(cls, path, up_conversion = None):
+        """Reads a binary or ASCII STL file
+
+        Binary files are memory-mapped, ASCII files are scanned with a regular
+        expression for their vertex lines. A ValueError is raised when no
+        facet could be read.
+        :param path: path to the file
+        :param up_conversion: couple of characters, can be y z or z y
+        """
+        if is_binary_stl(path):
+            with open(path, 'rb') as f:
+                count = int(np.frombuffer(f.read(STL_HEADER_SIZE), dtype='<u4', count=1, offset=80)[0])
+            # ignore trailing padding, and do not trust a facet count larger than the file
+            count = min(count, (os.path.getsize(path) - STL_HEADER_SIZE) // STL_FACET_DTYPE.itemsize)
+            if count > 0:
+                facets = np.memmap(path, dtype=STL_FACET_DTYPE, mode='r', offset=STL_HEADER_SIZE, shape=(count,))
+                triangles = np.array(facets['vertices'], dtype=np.float64)
+            else:
+                triangles = np.zeros((0, 3, 3))
+        else:
+            with open(path, 'rb') as f:
+                triangles = np.array(ASCII_VERTEX.findall(f.read()), dtype=np.float64)
+        if len(triangles) == 0:
+            raise ValueError('No facets could be read from "' + path + '"')
+        mesh = cls.from_triangles(triangles, mesh_name(path))
+        mesh.convert_up(up_conversion)
+        return mesh
+
+    def convert_up(self, up_conversion):
+        """Converts the up vector like ModelParser.add_vertex
+
+        :param up_conversion: couple of characters, can be y z or z y
+        """
+        if up_conversion is None:
+            return
+        if up_conversion[0] == 'y' and up_conversion[1] == 'z':
+            self.vertices = self.vertices[:, [1, 2, 0]]
+        elif up_conversion[0] == 'z' and up_conversion[1] == 'y':
+            self.vertices = self.vertices[:, [2, 0, 1]]
+
+    def mirror(self, axis):
+        """Mirrors the mesh about the plane normal to an axis
+
+        The faces are reversed so that they keep facing outwards.
+        :param axis: index of the axis, 0 for x, 1 for y and 2 for z
+        """
+        self.vertices = self.vertices.copy()
+        self.vertices[:, axis] *= -1
+        self.faces = self.faces[:, ::-1]
+
+    def scale(self, factor):
+        """Scales the mesh by a factor
+
+        :param factor: the scale factor
+        """
+        self.vertices = self.vertices * factor
+
+    def triangles(self):
+        """Returns the coordinates of the faces as an array of shape (m, 3, 3)
+        """
+        return self.vertices[self.faces]
+
+    def face_normals(self):
+        """Computes the unit normal of each face
+
+        Degenerate faces get a zero normal.
+        """
+        triangles = self.triangles()
+        cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        norm = np.linalg.norm(cross, axis=1, keepdims=True)
+        return np.divide(cross, norm, out=np.zeros_like(cross), where=norm > 0)
+
+    def binary_stl(self):
+        """Returns the mesh encoded as binary STL
+        """
+        facets = np.zeros(len(self.faces), dtype=STL_FACET_DTYPE)
+        facets['normal'] = self.face_normals()
+        facets['vertices'] = self.triangles()
+        header = np.zeros(STL_HEADER_SIZE, dtype=np.uint8)
+        title = self.name.encode('ascii', 'replace')[:80]
+        header[:len(title)] = np.frombuffer(title, dtype=np.uint8)
+        header[80:] = np.frombuffer(np.uint32(len(facets)).tobytes(), dtype=np.uint8)
+        return header.tobytes() + facets.tobytes()
+
+    def write_binary_stl(self, path):
+        """Writes the mesh as binary STL
+
+        :param path: path to the output file
+        """
+        with open(path, 'wb') as f:
+            f.write(self.binary_stl())
+
+    def write_ascii_stl(self, stream):
+        """Writes the mesh as ASCII STL, chunk by chunk
+
+        :param stream: text stream to write to
+        """
+        facet = (
+            "facet normal {} {} {}\n"
+            "\touter loop\n"
+            "\t\tvertex {} {} {}\n"
+            "\t\tvertex {} {} {}\n"
+            "\t\tvertex {} {} {}\n"
+            "\tendloop\n"
+            "endfacet\n"
+        )
+        stream.write('solid {}\n'.format(self.name))
+        for start in range(0, len(self.faces), ASCII_CHUNK_SIZE):
+            faces = ArrayMesh(self.vertices, self.faces[start:start + ASCII_CHUNK_SIZE])
+            rows = np.hstack((faces.face_normals(), faces.triangles().reshape(-1, 9))).tolist()
+            stream.write(''.join(facet.format(*row) for row in rows))
+        stream.write('endsolid {}'.format(self.name))
+
+
+def mesh_name(path):
+    """Returns the name of a model from its path, like the STL exporter does
+    """
+    return os.path.basename(path[:-4]) if path else 'model'
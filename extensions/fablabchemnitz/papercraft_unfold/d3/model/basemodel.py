@@ -227,8 +227,8 @@ class ModelParser:
         A normal will be the normal of the face
         """
         # Build array of faces
-        faces = sum(map(lambda x: x.faces, self.parts), [])
-        self.normals = [Normal()] * len(faces)
+        faces = self.faces()
+        self.normals = [None] * len(faces)
 
         for (index, face) in enumerate(faces):
 
@@ -242,6 +242,11 @@ class ModelParser:
             face.b.normal = index
             face.c.normal = index
 
+    def faces(self):
+        """Returns the faces of all the parts of the model in a single list
+        """
+        return [face for part in self.parts for face in part.faces]
+
     def get_material_index(self, material):
         """Finds the index of the given material
 
@@ -257,7 +262,7 @@ class TextModelParser(ModelParser):
         """
         self.path = path
         with open(path) as f:
-            for line in f.readlines():
+            for line in f:
                 line = line.rstrip()
                 if line != '':
                     self.parse_line(line)
@@ -0,0 +1,226 @@
+import itertools
+from collections import deque
+
+import numpy as np
+
+from .array_mesh import ArrayMesh
+
+NEIGHBOUR_CELLS = list(itertools.product((-1, 0, 1), repeat=3))
+
+
+def weld_vertices(mesh, tolerance = 0.0):
+    """Merges the vertices that are closer than a tolerance
+
+    Identical vertices are merged first. With a positive tolerance, the
+    remaining vertices lying on unconnected edges, that is edges used by a
+    single face, are hashed into a grid of cells of the size of the
+    tolerance, and each of them is merged into the first kept vertex found
+    closer than the tolerance in its own cell or in one of the 26 cells
+    around. Like admesh --nearby, this only joins the open edges and leaves
+    the already connected parts of the mesh alone.
+    :param mesh: the ArrayMesh to weld
+    :param tolerance: distance below which two vertices are merged
+    """
+    vertices, inverse = np.unique(mesh.vertices, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    if tolerance > 0.0 and len(vertices) > 1:
+        faces = inverse[mesh.faces]
+        starts = faces.reshape(-1)
+        ends = faces[:, [1, 2, 0]].reshape(-1)
+        keys, counts = np.unique(np.minimum(starts, ends) * len(vertices) + np.maximum(starts, ends), return_counts=True)
+        unconnected = keys[counts == 1]
+        candidates = np.unique(np.concatenate((unconnected // len(vertices), unconnected % len(vertices))))
+
+        cells = np.floor(vertices[candidates] / tolerance).astype(np.int64)
+        grid = {}
+        target = np.arange(len(vertices))
+        tolerance_squared = tolerance * tolerance
+        points = vertices.tolist()
+        for index, cell in zip(candidates.tolist(), map(tuple, cells.tolist())):
+            x, y, z = points[index]
+            kept = None
+            for offset in NEIGHBOUR_CELLS:
+                key = (cell[0] + offset[0], cell[1] + offset[1], cell[2] + offset[2])
+                for other in grid.get(key, ()):
+                    ox, oy, oz = points[other]
+                    if (ox - x) ** 2 + (oy - y) ** 2 + (oz - z) ** 2 < tolerance_squared:
+                        kept = other
+                        break
+                if kept is not None:
+                    break
+            if kept is None:
+                grid.setdefault(cell, []).append(index)
+            else:
+                target[index] = kept
+        inverse = target[inverse]
+
+    return remove_unused_vertices(ArrayMesh(vertices, inverse[mesh.faces], mesh.name))
+
+
+def remove_degenerate_faces(mesh):
+    """Removes the faces that use a vertex twice or have no area
+
+    :param mesh: the ArrayMesh to clean
+    """
+    faces = mesh.faces
+    valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    triangles = mesh.triangles()
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    valid &= np.any(cross != 0, axis=1)
+    return ArrayMesh(mesh.vertices, faces[valid], mesh.name)
+
+
+def remove_unused_vertices(mesh):
+    """Removes the vertices that are not used by any face and renumbers the faces
+
+    :param mesh: the ArrayMesh to compact
+    """
+    used, faces = np.unique(mesh.faces, return_inverse=True)
+    return ArrayMesh(mesh.vertices[used], faces.reshape(-1, 3), mesh.name)
+
+
+def face_adjacency(mesh):
+    """Finds the pairs of faces sharing an edge
+
+    Returns the two arrays of face indices of each pair, and a boolean array
+    telling if the shared edge goes the same way in both faces, which means
+    that one of them is reversed compared to the other.
+    :param mesh: the ArrayMesh to analyse
+    """
+    faces = mesh.faces
+    starts = faces.reshape(-1)
+    ends = faces[:, [1, 2, 0]].reshape(-1)
+    owners = np.repeat(np.arange(len(faces)), 3)
+    keys = np.minimum(starts, ends) * len(mesh.vertices) + np.maximum(starts, ends)
+
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    # consecutive occurrences of the same edge are neighbours
+    shared = np.nonzero(keys[1:] == keys[:-1])[0]
+    first = order[shared]
+    second = order[shared + 1]
+    same_direction = starts[first] == starts[second]
+    return owners[first], owners[second], same_direction
+
+
+def connected_components(mesh, adjacency = None):
+    """Labels each face with the index of its connected component
+
+    Components are numbered in the order of their first face.
+    :param mesh: the ArrayMesh to analyse
+    :param adjacency: result of face_adjacency if already computed
+    """
+    first, second, _ = adjacency if adjacency is not None else face_adjacency(mesh)
+    labels = np.arange(len(mesh.faces))
+    while True:
+        lowest = np.minimum(labels[first], labels[second])
+        previous = labels.copy()
+        np.minimum.at(labels, first, lowest)
+        np.minimum.at(labels, second, lowest)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+    return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+
+def filter_components(mesh, min_faces = 2):
+    """Removes the connected components having less than a number of faces
+
+    With the default value, the faces without any neighbour are removed.
+    :param mesh: the ArrayMesh to filter
+    :param min_faces: minimum number of faces of a kept component
+    """
+    labels = connected_components(mesh)
+    sizes = np.bincount(labels)
+    return remove_unused_vertices(ArrayMesh(mesh.vertices, mesh.faces[sizes[labels] >= min_faces], mesh.name))
+
+
+def unify_normals(mesh):
+    """Orients the faces of each connected component consistently
+
+    Faces are visited across their shared edges and reversed where the edge
+    goes the same way in both faces. Each component is then turned so that
+    it encloses a positive volume, that is with normals facing outwards for
+    closed surfaces.
+    :param mesh: the ArrayMesh to orient
+    """
+    adjacency = face_adjacency(mesh)
+    first, second, same_direction = adjacency
+    labels = connected_components(mesh, adjacency)
+
+    # neighbours of each face, in compressed sparse row form
+    sources = np.concatenate((first, second))
+    targets = np.concatenate((second, first))
+    flips = np.concatenate((same_direction, same_direction))
+    order = np.argsort(sources, kind='stable')
+    targets = targets[order].tolist()
+    flips = flips[order].tolist()
+    offsets = np.searchsorted(sources[order], np.arange(len(mesh.faces) + 1)).tolist()
+
+    reversed_faces = np.zeros(len(mesh.faces), dtype=bool)
+    visited = np.zeros(len(mesh.faces), dtype=bool)
+    for seed in range(len(mesh.faces)):
+        if visited[seed]:
+            continue
+        visited[seed] = True
+        queue = deque([seed])
+        while queue:
+            face = queue.popleft()
+            for neighbour, flip in zip(targets[offsets[face]:offsets[face + 1]], flips[offsets[face]:offsets[face + 1]]):
+                if not visited[neighbour]:
+                    visited[neighbour] = True
+                    reversed_faces[neighbour] = reversed_faces[face] != flip
+                    queue.append(neighbour)
+
+    faces = np.where(reversed_faces[:, None], mesh.faces[:, ::-1], mesh.faces)
+    oriented = ArrayMesh(mesh.vertices, faces, mesh.name)
+
+    triangles = oriented.triangles()
+    volumes = np.einsum('ij,ij->i', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2]))
+    inside_out = np.bincount(labels, weights=volumes) < 0
+    oriented.faces = np.where(inside_out[labels][:, None], faces[:, ::-1], faces)
+    return oriented
+
+
+def nearby_tolerances(mesh, tolerance = 0.0, iterations = 1, increment = 0.0):
+    """Returns the tolerances of the nearby welding passes, like admesh --nearby
+
+    As in admesh, a null tolerance defaults to the length of the shortest
+    edge, which never collapses an edge since only vertices strictly closer
+    than the tolerance are merged, and a null increment to a ten thousandth of the bounding diameter.
+    :param mesh: the ArrayMesh to weld
+    :param tolerance: tolerance of the first pass
+    :param iterations: number of passes
+    :param increment: tolerance added after each pass
+    """
+    if len(mesh.faces) == 0:
+        return []
+    if tolerance <= 0.0:
+        triangles = mesh.triangles()
+        edges = np.linalg.norm(triangles[:, [1, 2, 0]] - triangles, axis=2)
+        tolerance = float(edges.min())
+    if increment <= 0.0:
+        increment = float(np.linalg.norm(mesh.vertices.max(axis=0) - mesh.vertices.min(axis=0))) / 10000.0
+    return [tolerance + i * increment for i in range(iterations)]
+
+
+def clean_mesh(mesh, tolerances = (0.0,), remove_unconnected = True, normal_directions = True, reverse_all = False):
+    """Runs the cleanup steps on a mesh, in the order used by admesh
+
+    :param mesh: the ArrayMesh to clean
+    :param tolerances: tolerances of the successive welding passes
+    :param remove_unconnected: remove the faces without neighbours
+    :param normal_directions: orient the faces consistently
+    :param reverse_all: reverse all the faces at the end
+    """
+    for tolerance in tolerances:
+        mesh = weld_vertices(mesh, tolerance)
+    mesh = remove_degenerate_faces(mesh)
+    if remove_unconnected:
+        mesh = filter_components(mesh)
+    if normal_directions:
+        mesh = unify_normals(mesh)
+    if reverse_all:
+        mesh = ArrayMesh(mesh.vertices, mesh.faces[:, ::-1], mesh.name)
+    return remove_unused_vertices(mesh)
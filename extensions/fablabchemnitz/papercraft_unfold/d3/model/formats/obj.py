@@ -138,7 +138,7 @@ class MTLParser:
 
     def parse_file(self, path):
         with open(path) as f:
-            for line in f.readlines():
+            for line in f:
                 line = line.rstrip()
                 self.parse_line(line)
 
@@ -182,7 +182,7 @@ class OBJExporter(Exporter):
 
             string += "\n"
 
-        faces = sum(map(lambda x: x.faces, self.model.parts), [])
+        faces = self.model.faces()
 
         for face in faces:
             if face.material is not None and face.material.name != current_material:
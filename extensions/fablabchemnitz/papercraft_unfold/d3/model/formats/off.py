@@ -52,14 +52,14 @@ class OFFExporter(Exporter):
     def __str__(self):
         """Exports the model
         """
-        faces = sum(map(lambda x: x.faces, self.model.parts), [])
-        string = "OFF\n{} {} {}".format(len(self.model.vertices), len(faces), 0) + '\n'
+        faces = self.model.faces()
+        lines = ["OFF\n{} {} {}".format(len(self.model.vertices), len(faces), 0)]
 
         for vertex in self.model.vertices:
-            string += ' '.join([str(vertex.x), str(vertex.y), str(vertex.z)]) + '\n'
+            lines.append(' '.join([str(vertex.x), str(vertex.y), str(vertex.z)]))
 
         for face in faces:
-            string += '3 ' + ' '.join([str(face.a.vertex), str(face.b.vertex), str(face.c.vertex)]) + '\n'
+            lines.append('3 ' + ' '.join([str(face.a.vertex), str(face.b.vertex), str(face.c.vertex)]))
 
-        return string
+        return '\n'.join(lines) + '\n'
 
@@ -1,6 +1,7 @@
 from ..basemodel import TextModelParser, Exporter, Vertex, FaceVertex, Face
 from ..mesh import MeshPart
 
+import io
 import os.path
 
 def is_stl(filename):
@@ -84,33 +85,44 @@ class STLExporter(Exporter):
         :param model: Model to export
         """
         super().__init__(model)
-        super().__init__(model)
 
     def __str__(self):
         """Exports the model
         """
-        string = 'solid {}\n'.format(os.path.basename(self.model.path[:-4]))
+        stream = io.StringIO()
+        self.write(stream)
+        return stream.getvalue()
 
-        self.model.generate_face_normals()
+    def write(self, stream):
+        """Exports the model to a stream, one facet at a time
+
+        :param stream: text stream to write to
+        """
+        name = os.path.basename(self.model.path[:-4])
+        stream.write('solid {}\n'.format(name))
 
-        faces = sum(map(lambda x: x.faces, self.model.parts), [])
+        self.model.generate_face_normals()
 
-        for face in faces:
+        for face in self.model.faces():
 
             n  = self.model.normals[face.a.normal]
             v1 = self.model.vertices[face.a.vertex]
             v2 = self.model.vertices[face.b.vertex]
             v3 = self.model.vertices[face.c.vertex]
 
-            string += "facet normal {} {} {}\n".format(n.x, n.y, n.z)
-
-            string += "\touter loop\n"
-            string += "\t\tvertex {} {} {}\n".format(v1.x, v1.y, v1.z)
-            string += "\t\tvertex {} {} {}\n".format(v2.x, v2.y, v2.z)
-            string += "\t\tvertex {} {} {}\n".format(v3.x, v3.y, v3.z)
-
-            string += "\tendloop\n"
-            string += "endfacet\n"
-
-        string += 'endsolid {}'.format(os.path.basename(self.model.path[:-4]))
-        return string
+            stream.write(
+                "facet normal {} {} {}\n"
+                "\touter loop\n"
+                "\t\tvertex {} {} {}\n"
+                "\t\tvertex {} {} {}\n"
+                "\t\tvertex {} {} {}\n"
+                "\tendloop\n"
+                "endfacet\n".format(
+                    n.x, n.y, n.z,
+                    v1.x, v1.y, v1.z,
+                    v2.x, v2.y, v2.z,
+                    v3.x, v3.y, v3.z,
+                )
+            )
+
+        stream.write('endsolid {}'.format(name))
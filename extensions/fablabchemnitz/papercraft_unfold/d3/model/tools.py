@@ -4,6 +4,8 @@ from importlib import import_module
 from . import formats
 from .formats import *
 from .basemodel import ModelParser, Exporter
+from .array_mesh import ArrayMesh
+from .formats.stl import is_stl
 
 from types import ModuleType
 
@@ -97,3 +99,26 @@ def convert(input, output, up_conversion = None):
     exporter = export_model(model, output)
     return str(exporter)
 
+
+def load_array_mesh(input, up_conversion = None):
+    """Loads a model as an ArrayMesh
+
+    STL input is read directly into arrays (binary or ASCII), the other
+    formats are loaded by their parser first.
+    :param input: path of the input model
+    :param up_conversion: convert the up vector
+    """
+    if is_stl(input):
+        return ArrayMesh.read_stl(input, up_conversion)
+    return ArrayMesh.from_model(load_model(input, up_conversion))
+
+def convert_to_stl(input, output, up_conversion = None):
+    """Converts a model to a binary STL file
+
+    :param input: path of the input model
+    :param output: path to the binary STL to write
+    :param up_conversion: convert the up vector
+    """
+    mesh = load_array_mesh(input, up_conversion)
+    mesh.write_binary_stl(output)
+    return mesh
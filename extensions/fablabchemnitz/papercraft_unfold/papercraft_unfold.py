@@ -3,7 +3,6 @@ import sys
 import os
 import inkex
 import tempfile
-import shutil
 
 import subprocess
 from subprocess import Popen, PIPE
@@ -12,6 +11,7 @@ from lxml import etree
 #specific imports for model-converter-python - d3 library to convert obj/off/ply to stl (https://github.com/nabeel3133/file-converter-.obj-to-.ply)
 import functools as fc
 import d3.model.tools as mt
+import d3.model.cleanup as mc
 from d3.model.basemodel import Vector
 
 """
@@ -85,6 +85,7 @@ class PapercraftUnfold(inkex.EffectExtension):
         pars.add_argument("--extraborder", type=float, default=0.0)
         pars.add_argument("--extraborder_units")              
         pars.add_argument("--show_fstl", type=inkex.Boolean, default=True, help="Show converted (and fixed) STL in fstl Viewer")
+        pars.add_argument("--mesh_fixer", default="admesh", help="Fix the mesh with ADMesh or with the built-in cleanup")
         pars.add_argument("--exact", type=inkex.Boolean, default=True, help="Only check for perfectly matched edges")
         pars.add_argument("--nearby", type=inkex.Boolean, default=True, help="Find and connect nearby facets. Correct bad facets")
         pars.add_argument("--tolerance", type=float, default=0.0, help="Initial tolerance to use for nearby check")
@@ -100,21 +101,9 @@ class PapercraftUnfold(inkex.EffectExtension):
         pars.add_argument("--xz_mirror", type=inkex.Boolean, default=True)
         pars.add_argument("--scale", type=float, default=1.0)
                                  
-    def effect(self):
-        inputfile = self.options.inputfile
-        if not os.path.exists(inputfile):
-            inkex.utils.debug("The input file does not exist. Please select a proper file and try again.")
-            exit(1)      
-        converted_inputfile = os.path.join(tempfile.gettempdir(), os.path.splitext(os.path.basename(inputfile))[0] + ".stl")
-        if os.path.exists(converted_inputfile):
-              os.remove(converted_inputfile) #remove previously generated conversion file
-        up_conversion = None
-        
-        try:
-            with open(converted_inputfile, 'w') as f:
-                f.write(mt.convert(inputfile, converted_inputfile, up_conversion))
-        except UnicodeDecodeError as e: #conversion failed. Maybe it was a binary STL. Skipping and regular copy
-            shutil.copy2(inputfile, converted_inputfile)
+    def unfold_admesh(self, inputfile, converted_inputfile, converted_flattenfile, unfold_exec, up_conversion):
+        # Binary and ASCII STL are read straight into arrays, OBJ/OFF/PLY go through their parser. Output is always binary STL
+        mt.convert_to_stl(inputfile, converted_inputfile, up_conversion)
 
 
         # Run ADMesh mesh fixer to overwrite the STL with fixed output and binary file format for osresearch/papercraft
@@ -145,25 +134,75 @@ class PapercraftUnfold(inkex.EffectExtension):
         if p.returncode != 0: 
            inkex.utils.debug("admesh failed: %d %s %s" % (p.returncode, stdout, stderr))
            exit(1)
-         
-        # Run papercraft flattening   
-        converted_flattenfile = os.path.join(tempfile.gettempdir(), os.path.splitext(os.path.basename(inputfile))[0] + ".svg")
-        if os.path.exists(converted_flattenfile):
-              os.remove(converted_flattenfile) #remove previously generated conversion file
+
+        # Run papercraft flattening
+        papercraft_cmd = unfold_exec + " < \"" + converted_inputfile + "\" > \"" + converted_flattenfile + "\""
+        p = Popen(papercraft_cmd, shell=True, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = p.communicate()
+        p.wait()
+        if p.returncode != 0: 
+            inkex.utils.debug("osresearch/papercraft unfold failed: %d %s %s" % (p.returncode, stdout, stderr))
+
+    def unfold_builtin(self, inputfile, converted_inputfile, converted_flattenfile, unfold_exec, up_conversion):
+        # Fix the mesh in memory and pipe the binary STL straight into osresearch/papercraft
+        mesh = mt.load_array_mesh(inputfile, up_conversion)
+        if self.options.xy_mirror == True: mesh.mirror(2)
+        if self.options.yz_mirror == True: mesh.mirror(0)
+        if self.options.xz_mirror == True: mesh.mirror(1)
+        if self.options.scale != 1.0: mesh.scale(self.options.scale)
+        tolerances = [0.0]
+        if self.options.nearby == True:
+            tolerances += mc.nearby_tolerances(mesh, self.options.tolerance, self.options.iterations, self.options.increment)
+        mesh = mc.clean_mesh(mesh, tolerances,
+            remove_unconnected=self.options.remove_unconnected,
+            normal_directions=self.options.normal_directions,
+            reverse_all=self.options.reverse_all)
+        if len(mesh.faces) == 0:
+            inkex.utils.debug("The mesh has no faces left after cleanup. Cannot continue")
+            exit(1)
+        stl = mesh.binary_stl()
+        if self.options.show_fstl == True:
+            with open(converted_inputfile, 'wb') as f:
+                f.write(stl)
+
+        with open(converted_flattenfile, 'wb') as f:
+            p = Popen([unfold_exec], stdin=PIPE, stdout=f, stderr=PIPE)
+            stdout, stderr = p.communicate(stl)
+        if p.returncode != 0:
+            inkex.utils.debug("osresearch/papercraft unfold failed: %d %s" % (p.returncode, stderr))
+
+    def effect(self):
+        inputfile = self.options.inputfile
+        if not os.path.exists(inputfile):
+            inkex.utils.debug("The input file does not exist. Please select a proper file and try again.")
+            exit(1)      
+        converted_inputfile = os.path.join(tempfile.gettempdir(), os.path.splitext(os.path.basename(inputfile))[0] + ".stl")
+        if os.path.exists(converted_inputfile):
+              os.remove(converted_inputfile) #remove previously generated conversion file
+        up_conversion = None
+        
         if self.options.generatelabels:
             unfold_exec = "unfold_labels"
         else:
             unfold_exec = "unfold_nolabels"
         if os.name=="nt":
-            papercraft_cmd = "unfold\\" + unfold_exec + ".exe" + " < \"" + converted_inputfile + "\" > \"" + converted_flattenfile + "\""
+            unfold_exec = "unfold\\" + unfold_exec + ".exe"
         else:
-            papercraft_cmd = "./unfold/" + unfold_exec + " < \"" + converted_inputfile + "\" > \"" + converted_flattenfile + "\"" 
-        p = Popen(papercraft_cmd, shell=True, stdout=PIPE, stderr=PIPE)
-        stdout, stderr = p.communicate()
-        p.wait()
-        if p.returncode != 0: 
-            inkex.utils.debug("osresearch/papercraft unfold failed: %d %s %s" % (p.returncode, stdout, stderr))
-            
+            unfold_exec = "./unfold/" + unfold_exec
+
+        converted_flattenfile = os.path.join(tempfile.gettempdir(), os.path.splitext(os.path.basename(inputfile))[0] + ".svg")
+        if os.path.exists(converted_flattenfile):
+              os.remove(converted_flattenfile) #remove previously generated conversion file
+
+        try:
+            if self.options.mesh_fixer == "builtin":
+                self.unfold_builtin(inputfile, converted_inputfile, converted_flattenfile, unfold_exec, up_conversion)
+            else:
+                self.unfold_admesh(inputfile, converted_inputfile, converted_flattenfile, unfold_exec, up_conversion)
+        except ValueError as e:
+            inkex.utils.debug(str(e) + ". Cannot continue")
+            exit(1)
+
         # Open converted output in fstl       
         if self.options.show_fstl == True:
             if os.name=="nt":
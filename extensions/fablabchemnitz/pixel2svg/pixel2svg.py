@@ -33,6 +33,7 @@ import base64
 from io import StringIO, BytesIO
 import urllib.request as urllib
 import inkex
+import numpy
 from PIL import Image
 from lxml import etree
 
@@ -58,6 +59,7 @@ class Pixel2SVG(inkex.EffectExtension):
         pars.add_argument("--offset_image", type=inkex.Boolean, default=True, help="Offset traced image")
         pars.add_argument("--delete_image", type=inkex.Boolean, default=False, help="Delete bitmap image")
         pars.add_argument("--maxsize", type=int, default="256", help="Max. image size (width or height)")
+        pars.add_argument("--output_mode", default="rects", help="One rect per pixel or one path per color")
         pars.add_argument("--verbose", type=inkex.Boolean, default=False)
         pars.add_argument("--color_mode", default="all", help="Which colors to trace.")
         pars.add_argument("--color", default="FFFFFF", help="Special color")
@@ -87,16 +89,11 @@ class Pixel2SVG(inkex.EffectExtension):
         if (os.path.isfile(path)):
             return path
 
-    def drawFilledRect(self, parent, svgpx):
+    def fillStyle(self, rgb, alpha):
         """
-        Draw rect based on ((x, y), (width,height), ((r,g,b),a)), add to parent
+        Build the style string for a fill of (r,g,b) or (name, ) and alpha
         """
         style = {}
-        pos = svgpx[0]
-        dim = svgpx[1]
-        rgb = svgpx[2][0]
-        alpha = svgpx[2][1]
-
         style['stroke'] = 'none'
 
         if len(rgb) == 3:
@@ -113,16 +110,105 @@ class Pixel2SVG(inkex.EffectExtension):
             # only write 'fill-opacity' for non-default value
             style['fill-opacity'] = '%s' % round(alpha/255.0, 8)
 
+        return str(inkex.Style(style))
+
+    def drawFilledRect(self, parent, svgpx):
+        """
+        Draw rect based on ((x, y), (width,height), ((r,g,b),a)), add to parent
+        """
+        pos = svgpx[0]
+        dim = svgpx[1]
+        rgb = svgpx[2][0]
+        alpha = svgpx[2][1]
+
         rect_attribs = {'x': str(pos[0]),
                         'y': str(pos[1]),
                         'width': str(dim[0]),
                         'height': str(dim[1]),
-                        'style': str(inkex.Style(style)), }
+                        'style': self.fillStyle(rgb, alpha), }
 
         rect = etree.SubElement(parent, inkex.addNS('rect', 'svg'), rect_attribs)
 
         return rect
 
+    def tracedPixels(self, pixels, trace_color):
+        """
+        Return the mask of the pixels to trace: not transparent and
+        matching the color options
+        """
+        traced = pixels[:, :, 3] > 0
+        if (self.options.color_mode != "all"):
+            if len(trace_color) == 3:
+                matches = numpy.all(pixels[:, :, :3] == trace_color, axis=2)
+            else:
+                matches = numpy.zeros(traced.shape, dtype=bool)
+            if (self.options.color_mode == "other"):
+                traced &= ~matches
+            elif (self.options.color_mode == "this"):
+                traced &= matches
+        return traced
+
+    def mergedRects(self, colors, traced):
+        """
+        Merge the traced pixels into rectangles of identical color.
+        Horizontal runs are found per row, then identical runs of
+        consecutive rows are stacked into one rectangle.
+        Returns arrays x, y, width, height, color (in pixels)
+        """
+        height, width = traced.shape
+        # a run starts at each column where the color or the mask changes
+        starts = numpy.ones((height, width), dtype=bool)
+        starts[:, 1:] = (colors[:, 1:] != colors[:, :-1]) | (traced[:, 1:] != traced[:, :-1])
+        start_index = numpy.flatnonzero(starts)
+        end_index = numpy.append(start_index[1:], height * width)
+        # runs never continue across rows since every row starts a new run
+        keep = traced.reshape(-1)[start_index]
+        start_index = start_index[keep]
+        end_index = end_index[keep]
+        run_y = start_index // width
+        run_x = start_index % width
+        run_w = end_index - start_index
+        run_color = colors.reshape(-1)[start_index]
+
+        # stack identical runs of consecutive rows
+        order = numpy.lexsort((run_y, run_color, run_w, run_x))
+        run_x, run_y, run_w, run_color = run_x[order], run_y[order], run_w[order], run_color[order]
+        new_rect = numpy.ones(len(order), dtype=bool)
+        new_rect[1:] = ((run_x[1:] != run_x[:-1]) | (run_w[1:] != run_w[:-1]) |
+                        (run_color[1:] != run_color[:-1]) | (run_y[1:] != run_y[:-1] + 1))
+        first = numpy.flatnonzero(new_rect)
+        rect_h = numpy.diff(numpy.append(first, len(order)))
+
+        # back to reading order
+        rects = numpy.lexsort((run_x[first], run_y[first]))
+        first = first[rects]
+        return run_x[first], run_y[first], run_w[first], rect_h[rects], run_color[first]
+
+    def drawMergedRects(self, parent, pixels, traced):
+        """
+        Draw one path per color, made of the rectangles of merged pixels
+        """
+        rgba = pixels.astype(numpy.uint32)
+        if not self.options.transparency:
+            rgba[:, :, 3] = 255
+        colors = (rgba[:, :, 0] << 24) | (rgba[:, :, 1] << 16) | (rgba[:, :, 2] << 8) | rgba[:, :, 3]
+
+        x, y, w, h, color = self.mergedRects(colors, traced)
+        size = self.options.squaresize
+        overlap = int(self.options.overlap)
+        paths = {}
+        for rect in zip((x * size).tolist(), (y * size).tolist(),
+                        (w * size + overlap).tolist(), (h * size + overlap).tolist(),
+                        color.tolist()):
+            paths.setdefault(rect[4], []).append('M %s,%s h %s v %s h %s z' %
+                                                 (rect[0], rect[1], rect[2], rect[3], -rect[2]))
+
+        for color, rects in paths.items():
+            rgb = ((color >> 24) & 0xFF, (color >> 16) & 0xFF, (color >> 8) & 0xFF)
+            etree.SubElement(parent, inkex.addNS('path', 'svg'),
+                             {'d': ' '.join(rects),
+                              'style': self.fillStyle(rgb, color & 0xFF)})
+
     def vectorizeImage(self, node):
         """
         Parse RGBA values of linked bitmap image, create a group and
@@ -163,15 +249,17 @@ class Pixel2SVG(inkex.EffectExtension):
             image = image.convert("RGBA")
             (width, height) = image.size
 
-            if width <= pixel2svg_max and height <= pixel2svg_max:
+            # merged output stays small, the limit only applies to one rect per pixel
+            if self.options.output_mode == "merge" or (width <= pixel2svg_max and height <= pixel2svg_max):
 
                 # color trace modes
                 trace_color = []
                 if self.options.color:
                     trace_color = hex_to_int_color(self.options.color)
 
-                # get RGBA data
-                rgba_values = list(image.getdata())
+                # get RGBA data, shape (height, width, 4)
+                pixels = numpy.asarray(image)
+                traced = self.tracedPixels(pixels, trace_color)
 
                 # create group
                 nodeParent = node.getparent()
@@ -199,47 +287,28 @@ class Pixel2SVG(inkex.EffectExtension):
                                   (pixel2svg_bbox_fill, pixel2svg_bbox_alpha))
                 self.drawFilledRect(pixel2svg_group, pixel2svg_bbox)
 
-                # reverse list (performance), pop last one instead of first
-                rgba_values.reverse()
-                # loop through pixels (per row)
-                rowcount = 0
-                while rowcount < height:
-                    colcount = 0
-                    while colcount < width:
-                        rgba_tuple = rgba_values.pop()
-                        # Omit transparent pixels
-                        if rgba_tuple[3] > 0:
-                            # color options
-                            do_trace = True
-                            if (self.options.color_mode != "all"):
-                                if (trace_color == rgba_tuple[:3]):
-                                    # colors match
-                                    if (self.options.color_mode == "other"):
-                                        do_trace = False
-                                else:
-                                    # colors don't match
-                                    if (self.options.color_mode == "this"):
-                                        do_trace = False
-                            if do_trace:
-                                # position
-                                svgpx_x = colcount * self.options.squaresize
-                                svgpx_y = rowcount * self.options.squaresize
-                                # dimension + overlap
-                                svgpx_size = self.options.squaresize + self.options.overlap
-                                # get color, ignore alpha
-                                svgpx_rgb = rgba_tuple[:3]
-                                svgpx_a = 255
-                                # transparency
-                                if self.options.transparency:
-                                    svgpx_a = rgba_tuple[3]
-                                svgpx = ((svgpx_x, svgpx_y),
-                                         (svgpx_size, svgpx_size),
-                                         (svgpx_rgb, svgpx_a)
-                                         )
-                                # draw square in group
-                                self.drawFilledRect(pixel2svg_group, svgpx)
-                        colcount = colcount + 1
-                    rowcount = rowcount + 1
+                if self.options.output_mode == "merge":
+                    self.drawMergedRects(pixel2svg_group, pixels, traced)
+                else:
+                    # dimension + overlap
+                    svgpx_size = self.options.squaresize + self.options.overlap
+                    rows, cols = numpy.nonzero(traced)
+                    for rowcount, colcount, rgba_tuple in zip(rows.tolist(), cols.tolist(), pixels[rows, cols].tolist()):
+                        # position
+                        svgpx_x = colcount * self.options.squaresize
+                        svgpx_y = rowcount * self.options.squaresize
+                        # get color, ignore alpha
+                        svgpx_rgb = rgba_tuple[:3]
+                        svgpx_a = 255
+                        # transparency
+                        if self.options.transparency:
+                            svgpx_a = rgba_tuple[3]
+                        svgpx = ((svgpx_x, svgpx_y),
+                                 (svgpx_size, svgpx_size),
+                                 (svgpx_rgb, svgpx_a)
+                                 )
+                        # draw square in group
+                        self.drawFilledRect(pixel2svg_group, svgpx)
 
                 # all done
                 if DEBUG:
@@ -1,2 +1,4 @@
 from .cubic_bezier import CubicBezier
 from .geometric_object import GeometricObject, CompoundGeometricObject, AABBox
+from .bvh import BoundingVolumeHierarchy
+from .bezier_array import CubicBezierArray
@@ -0,0 +1,289 @@
+"""
+Array-backed cubic bezier segments and batched ray intersection
+
+The control points of N segments are stored in a (N, 4, 2) array, so one ray
+or a bundle of rays can be intersected with all segments at once instead of
+solving one cubic per (ray, segment) pair with scalar arithmetic.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, NamedTuple, Optional
+
+import numpy
+
+from ..ray import Ray
+from ..shade import ShadeRec
+from ..vector import UnitVector
+
+# tolerance used to detect vanishing coefficients, same as is_almost_zero
+ZERO_TOL = 1e-8
+# padding of the segment bounding boxes, same as CubicBezier.aabbox
+BOX_PADDING = 1e-6
+# maximal number of (ray, segment) pairs processed at once
+MAX_PAIRS = 1 << 18
+
+
+class BezierHits(NamedTuple):
+    """
+    Nearest intersection of each ray of a bundle. For rays without hit,
+    travel is inf, index is -1 and the other values are nan.
+    """
+
+    travel: numpy.ndarray  # (M,)
+    index: numpy.ndarray  # (M,) index of the segment hit
+    s: numpy.ndarray  # (M,) curvilinear coordinate on the segment
+    point: numpy.ndarray  # (M, 2)
+    normal: numpy.ndarray  # (M, 2) unit normal facing the ray origin
+
+    def shade(self, k: int, ray: Ray) -> ShadeRec:
+        """Returns a shade for the hit of the k-th ray of the bundle"""
+
+        shade = ShadeRec()
+        if self.index[k] >= 0:
+            shade.travel_dist = float(self.travel[k])
+            shade.local_hit_point = ray.origin + shade.travel_dist * ray.direction
+            shade.normal = UnitVector(*map(float, self.normal[k]))
+        return shade
+
+
+class CubicBezierArray:
+    """Collection of cubic bezier segments stored as a (N, 4, 2) array"""
+
+    def __init__(self, points: numpy.ndarray):
+        self.points = numpy.asarray(points, dtype=float).reshape(-1, 4, 2)
+        p0, p1, p2, p3 = (self.points[:, k, :] for k in range(4))
+        # polynomial coefficients of X(s) = c0 + c1 s + c2 s^2 + c3 s^3
+        self.c0 = p0
+        self.c1 = -3 * (p0 - p1)
+        self.c2 = 3 * (p0 - 2 * p1 + p2)
+        self.c3 = -p0 + 3 * p1 - 3 * p2 + p3
+        self.box_min = self.points.min(axis=1) - BOX_PADDING
+        self.box_max = self.points.max(axis=1) + BOX_PADDING
+
+    @classmethod
+    def from_beziers(cls, beziers: Iterable) -> CubicBezierArray:
+        points = [
+            [(p.x, p.y) for p in (bezier.p0, bezier.p1, bezier.p2, bezier.p3)]
+            for bezier in beziers
+        ]
+        return cls(numpy.array(points, dtype=float).reshape(-1, 4, 2))
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def eval(self, index: numpy.ndarray, s: numpy.ndarray) -> numpy.ndarray:
+        s = s[..., None]
+        return (
+            self.c0[index]
+            + self.c1[index] * s
+            + self.c2[index] * s ** 2
+            + self.c3[index] * s ** 3
+        )
+
+    def tangent(self, index: numpy.ndarray, s: numpy.ndarray) -> numpy.ndarray:
+        """Unit tangents of the segments index at coordinates s, see CubicBezier.tangent"""
+
+        s = s[..., None]
+        c1, c2, c3 = self.c1[index], self.c2[index], self.c3[index]
+        diff_1 = c1 + 2 * c2 * s + 3 * c3 * s ** 2
+        diff_2 = 2 * c2 + 6 * c3 * s
+        diff_3 = 6 * c3 * numpy.ones_like(s)
+        # fall back to higher derivatives where the lower ones vanish
+        norm_1 = numpy.linalg.norm(diff_1, axis=-1, keepdims=True)
+        norm_2 = numpy.linalg.norm(diff_2, axis=-1, keepdims=True)
+        diff = numpy.where(
+            norm_1 > ZERO_TOL, diff_1, numpy.where(norm_2 > ZERO_TOL, diff_2, diff_3)
+        )
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            return diff / numpy.linalg.norm(diff, axis=-1, keepdims=True)
+
+    def normal(self, index: numpy.ndarray, s: numpy.ndarray) -> numpy.ndarray:
+        tangent = self.tangent(index, s)
+        return numpy.stack((-tangent[..., 1], tangent[..., 0]), axis=-1)
+
+    def box_hits(self, origins: numpy.ndarray, directions: numpy.ndarray) -> numpy.ndarray:
+        """(M, N) mask of the segment bounding boxes hit by each ray, see AABBox.hit"""
+
+        o = origins[:, None, :]
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            a = 1 / directions[:, None, :]
+            t_min = (numpy.where(a >= 0, self.box_min, self.box_max) - o) * a
+            t_max = (numpy.where(a >= 0, self.box_max, self.box_min) - o) * a
+        t0 = numpy.max(t_min, axis=-1)
+        t1 = numpy.min(t_max, axis=-1)
+        return (t0 < t1) & (t1 > Ray.min_travel)
+
+    def _roots(self, origins: numpy.ndarray, directions: numpy.ndarray):
+        """
+        Returns the (M, N, 3) curvilinear coordinates s and travel
+        distances t of the intersections of each ray with each segment.
+        Invalid intersections are nan.
+        """
+
+        normals = numpy.stack((-directions[:, 1], directions[:, 0]), axis=-1)
+        normals = normals / numpy.linalg.norm(normals, axis=-1, keepdims=True)
+
+        def project(c):
+            return normals @ c.T  # (M, N)
+
+        a0 = normals @ self.c0.T - numpy.sum(normals * origins, axis=-1)[:, None]
+        roots = cubic_real_roots_array(
+            a0, project(self.c1), project(self.c2), project(self.c3)
+        )
+        mask = self.box_hits(origins, directions)
+        roots = numpy.where(mask[..., None], roots, numpy.nan)
+
+        index = numpy.broadcast_to(numpy.arange(len(self))[None, :, None], roots.shape)
+        points = self.eval(index, roots)  # (M, N, 3, 2)
+        travel = numpy.sum(
+            (points - origins[:, None, None, :]) * directions[:, None, None, :], axis=-1
+        )
+        with numpy.errstate(invalid="ignore"):
+            valid = (roots >= 0) & (roots <= 1) & (travel > Ray.min_travel)
+        return numpy.where(valid, roots, numpy.nan), numpy.where(valid, travel, numpy.nan)
+
+    def intersect(self, origins, directions) -> BezierHits:
+        """
+        Intersects a bundle of M rays, given as (M, 2) origins and directions,
+        with all segments and returns the nearest hit of each ray.
+        """
+
+        origins = numpy.asarray(origins, dtype=float).reshape(-1, 2)
+        directions = numpy.asarray(directions, dtype=float).reshape(-1, 2)
+        num_rays = len(origins)
+        travel = numpy.full(num_rays, numpy.inf)
+        index = numpy.full(num_rays, -1)
+        s = numpy.full(num_rays, numpy.nan)
+        if len(self) == 0 or num_rays == 0:
+            nan2 = numpy.full((num_rays, 2), numpy.nan)
+            return BezierHits(travel, index, s, nan2, nan2.copy())
+
+        chunk = max(1, MAX_PAIRS // len(self))
+        for start in range(0, num_rays, chunk):
+            stop = min(start + chunk, num_rays)
+            roots, travels = self._roots(origins[start:stop], directions[start:stop])
+            flat_travel = numpy.where(
+                numpy.isnan(travels), numpy.inf, travels
+            ).reshape(stop - start, -1)
+            # argmin returns the first minimum, i.e. the first segment like a linear scan
+            best = numpy.argmin(flat_travel, axis=1)
+            rows = numpy.arange(stop - start)
+            travel[start:stop] = flat_travel[rows, best]
+            hit = numpy.isfinite(travel[start:stop])
+            index[start:stop] = numpy.where(hit, best // 3, -1)
+            s[start:stop] = numpy.where(hit, roots.reshape(stop - start, -1)[rows, best], numpy.nan)
+
+        hit = index >= 0
+        point = origins + numpy.where(hit, travel, numpy.nan)[:, None] * directions
+        normal = numpy.full((num_rays, 2), numpy.nan)
+        if numpy.any(hit):
+            normal[hit] = self.normal(index[hit], s[hit])
+            # orient the normals towards the origin of the rays
+            flip = numpy.sum(normal[hit] * (point[hit] - origins[hit]), axis=-1) > 0
+            normal[numpy.flatnonzero(hit)[flip]] *= -1
+        return BezierHits(travel, index, s, point, normal)
+
+    def num_hits(self, ray: Ray) -> int:
+        """Returns the number of intersections of a ray with all segments"""
+
+        origins = numpy.array([[ray.origin.x, ray.origin.y]], dtype=float)
+        directions = numpy.array([[ray.direction.x, ray.direction.y]], dtype=float)
+        roots, __ = self._roots(origins, directions)
+        return int(numpy.count_nonzero(~numpy.isnan(roots)))
+
+    def first_hit(self, ray: Ray) -> ShadeRec:
+        """
+        Returns a shade with the information for the first intersection of a
+        ray with one of the segments
+        """
+
+        hits = self.intersect(
+            [[ray.origin.x, ray.origin.y]], [[ray.direction.x, ray.direction.y]]
+        )
+        return hits.shade(0, ray)
+
+
+def collect_beziers(geometry) -> Optional[list]:
+    """
+    Returns the bezier segments composing a geometry, in the order they are
+    tested by its hit method, or None if it contains other kinds of objects
+    """
+
+    from .cubic_bezier import CubicBezier
+    from .geometric_object import CompoundGeometricObject
+
+    if isinstance(geometry, CubicBezier):
+        return [geometry]
+    if isinstance(geometry, CompoundGeometricObject):
+        beziers = []
+        for sub in geometry:
+            sub_beziers = collect_beziers(sub)
+            if sub_beziers is None:
+                return None
+            beziers.extend(sub_beziers)
+        return beziers
+    return None
+
+
+def cubic_real_roots_array(d, c, b, a) -> numpy.ndarray:
+    """
+    Vectorized version of cubic_real_roots for arrays of coefficients of the
+    polynomials a X^3 + b X^2 + c X + d. Returns an array with an additional
+    last axis of size 3 holding the real roots, padded with nan.
+    """
+
+    d, c, b, a = numpy.broadcast_arrays(*map(numpy.asarray, (d, c, b, a)))
+    roots = numpy.full(d.shape + (3,), numpy.nan)
+
+    def zero(x):
+        return numpy.abs(x) <= ZERO_TOL
+
+    with numpy.errstate(all="ignore"):
+        # true cubic equations
+        cubic = ~zero(a)
+        p = (3 * a * c - b ** 2) / 3 / a ** 2
+        q = (2 * b ** 3 - 9 * a * b * c + 27 * a ** 2 * d) / 27 / a ** 3
+        shift = -b / 3 / a
+        discr = -(4 * p ** 3 + 27 * q ** 2)
+
+        case = cubic & zero(p)
+        roots[case, 0] = numpy.cbrt(-q[case]) + shift[case]
+
+        rest = cubic & ~zero(p)
+        case = rest & zero(discr) & zero(q)
+        roots[case, 0] = shift[case]
+        case = rest & zero(discr) & ~zero(q)
+        roots[case, 0] = 3 * q[case] / p[case] + shift[case]
+        roots[case, 1] = -3 * q[case] / 2 / p[case] + shift[case]
+
+        case = rest & ~zero(discr) & (discr < 0)
+        sq = numpy.sqrt(-discr[case] / 108)
+        roots[case, 0] = (
+            numpy.cbrt(-q[case] / 2 + sq) + numpy.cbrt(-q[case] / 2 - sq) + shift[case]
+        )
+
+        case = rest & ~zero(discr) & (discr > 0)
+        pc, qc = p[case], q[case]
+        phi = 1 / 3 * numpy.arccos(3 * qc / 2 / pc * numpy.sqrt(-3 / pc))
+        for k in range(3):
+            roots[case, k] = (
+                2 * numpy.sqrt(-pc / 3) * numpy.cos(phi - 2 * numpy.pi * k / 3)
+                + shift[case]
+            )
+
+        # quadratic equations b X^2 + c X + d
+        quadratic = ~cubic & ~zero(b)
+        qdiscr = c ** 2 - 4 * b * d
+        case = quadratic & (qdiscr > 0)
+        sq = numpy.sqrt(qdiscr[case])
+        roots[case, 0] = (-c[case] + sq) / 2 / b[case]
+        roots[case, 1] = (-c[case] - sq) / 2 / b[case]
+        case = quadratic & ~(qdiscr > 0) & zero(qdiscr)
+        roots[case, 0] = -c[case] / 2 / b[case]
+
+        # linear equations c X + d
+        case = ~cubic & zero(b) & ~zero(c)
+        roots[case, 0] = -d[case] / c[case]
+
+    return roots
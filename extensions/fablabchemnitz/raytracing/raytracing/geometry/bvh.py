@@ -0,0 +1,167 @@
+"""
+Bounding volume hierarchy to accelerate the search of the first object hit
+by a ray among many objects
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Callable, Generic, Optional, Sequence, Tuple, TypeVar
+
+from .geometric_object import AABBox, GeometricObject
+from ..ray import Ray
+from ..shade import ShadeRec
+
+T = TypeVar("T")
+
+Box = Tuple[float, float, float, float]  # (x_min, y_min, x_max, y_max)
+
+
+@dataclass
+class BVHNode:
+    box: Box
+    left: Optional[BVHNode] = None
+    right: Optional[BVHNode] = None
+    # indices of the items of a leaf, in their original order
+    items: tuple[int, ...] = ()
+
+
+class BoundingVolumeHierarchy(Generic[T]):
+    """
+    Binary tree of axis aligned bounding boxes built once from the boxes of
+    a sequence of items.
+
+    The first hit of a ray is found by visiting the nodes ordered by the
+    distance at which the ray enters their box, and the nodes that the ray
+    enters beyond the closest hit found so far are skipped. Hits at the same
+    distance are resolved in favour of the item coming first in the sequence,
+    so the result is the same as with :func:`find_first_hit`.
+    """
+
+    max_leaf_size = 4
+
+    def __init__(
+        self,
+        items: Sequence[T],
+        geometry: Callable[[T], GeometricObject] = lambda item: item,
+    ):
+        self.items = tuple(items)
+        self.geometries = tuple(geometry(item) for item in self.items)
+        boxes = [_as_tuple(geo.aabbox) for geo in self.geometries]
+        if boxes:
+            self.root = self._build(list(range(len(boxes))), boxes)
+        else:
+            self.root = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _build(self, indices: list[int], boxes: list[Box]) -> BVHNode:
+        box = (
+            min(boxes[i][0] for i in indices),
+            min(boxes[i][1] for i in indices),
+            max(boxes[i][2] for i in indices),
+            max(boxes[i][3] for i in indices),
+        )
+        if len(indices) <= self.max_leaf_size:
+            return BVHNode(box, items=tuple(sorted(indices)))
+
+        # median split of the box centers along the longest axis
+        axis = 0 if box[2] - box[0] >= box[3] - box[1] else 1
+        indices.sort(key=lambda i: boxes[i][axis] + boxes[i][axis + 2])
+        middle = len(indices) // 2
+        return BVHNode(
+            box,
+            left=self._build(indices[:middle], boxes),
+            right=self._build(indices[middle:], boxes),
+        )
+
+    def first_hit(self, ray: Ray) -> tuple[ShadeRec, Optional[T]]:
+        """
+        Returns the shade of the first collision of the ray with one of the
+        items and the item hit, or an empty shade and None if nothing is hit.
+        """
+
+        result = ShadeRec()
+        result_index = None
+        if self.root is None:
+            return result, None
+
+        origin = (ray.origin.x, ray.origin.y)
+        direction = (ray.direction.x, ray.direction.y)
+        root_entry = _box_entry(self.root.box, origin, direction)
+        if root_entry is None:
+            return result, None
+
+        stack = [(root_entry, self.root)]
+        while stack:
+            entry, node = stack.pop()
+            if entry > result.travel_dist:
+                continue
+            if node.left is None:
+                for index in node.items:
+                    shade = self.geometries[index].hit(ray)
+                    if Ray.min_travel < shade.travel_dist and (
+                        shade.travel_dist < result.travel_dist
+                        or (
+                            shade.travel_dist == result.travel_dist
+                            and result_index is not None
+                            and index < result_index
+                        )
+                    ):
+                        result = shade
+                        result_index = index
+                continue
+
+            children = []
+            for child in (node.left, node.right):
+                child_entry = _box_entry(child.box, origin, direction)
+                if child_entry is not None and child_entry <= result.travel_dist:
+                    children.append((child_entry, child))
+            # the nearest child is visited first
+            children.sort(key=lambda c: c[0], reverse=True)
+            stack.extend(children)
+
+        if result_index is None:
+            return result, None
+        return result, self.items[result_index]
+
+
+def _as_tuple(box: AABBox) -> Box:
+    return (box.lower_left.x, box.lower_left.y, box.upper_right.x, box.upper_right.y)
+
+
+def _box_entry(
+    box: Box, origin: tuple[float, float], direction: tuple[float, float]
+) -> Optional[float]:
+    """
+    Returns the distance at which the ray enters the box (0 if its origin is
+    inside) or None if the box is missed.
+
+    The test is conservative compared to :meth:`AABBox.hit`: a box is never
+    reported as missed if AABBox.hit would report a hit.
+    """
+
+    t_min = -math.inf
+    t_max = math.inf
+    for axis in (0, 1):
+        o = origin[axis]
+        d = direction[axis]
+        low = box[axis]
+        high = box[axis + 2]
+        if d == 0:
+            if o < low or o > high:
+                return None
+        else:
+            # same arithmetic as AABBox.hit to get identical rounding
+            a = 1 / d
+            t0 = (low - o) * a
+            t1 = (high - o) * a
+            if t0 > t1:
+                t0, t1 = t1, t0
+            t_min = max(t_min, t0)
+            t_max = min(t_max, t1)
+    if t_min > t_max or t_max <= Ray.min_travel:
+        return None
+    return max(t_min, 0.0)
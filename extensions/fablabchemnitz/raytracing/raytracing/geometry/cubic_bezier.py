@@ -10,6 +10,7 @@ from functools import cached_property
 
 import numpy
 
+from .bezier_array import CubicBezierArray
 from .geometric_object import AABBox, GeometricObject, GeometryError
 from ..ray import Ray
 from ..shade import ShadeRec
@@ -117,24 +118,17 @@ class CubicBezier:
         else:
             return 0
 
+    @cached_property
+    def as_array(self) -> CubicBezierArray:
+        return CubicBezierArray.from_beziers((self,))
+
     def hit(self, ray: Ray) -> ShadeRec:
         """
         Returns a shade with the information for the first intersection
         of a beam with the bezier segment
         """
 
-        shade = ShadeRec()  # default no hit
-        if self.aabbox.hit(ray):
-            intersect_params = self.intersection_beam(ray)
-            travel_dist = [t for (__, t) in intersect_params]
-            if len(travel_dist) > 0:  # otherwise error with np.argmin
-                shade.normal = True
-                first_hit = numpy.argmin(travel_dist)
-                shade.travel_dist = travel_dist[first_hit]
-                shade.local_hit_point = ray.origin + shade.travel_dist * ray.direction
-                shade.normal = self.normal(intersect_params[first_hit][0])
-                shade.set_normal_same_side(ray.origin)
-        return shade
+        return self.as_array.first_hit(ray)
 
     def is_inside(self, ray: Ray) -> bool:
         raise GeometryError(f"Can't define an inside for {self}.")
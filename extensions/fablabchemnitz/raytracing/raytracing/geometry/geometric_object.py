@@ -9,6 +9,7 @@ import numpy
 from ..ray import Ray
 from ..shade import ShadeRec
 from ..vector import Vector
+from .bezier_array import CubicBezierArray
 
 class GeometricObject(Protocol):
     """Protocol for a geometric object (line, rectangle, circle, ...)"""
@@ -64,6 +65,21 @@ class CompoundGeometricObject(GeometricObject, Generic[T]):
         sub_boxes = (sub.aabbox for sub in self.sub_objects)
         return AABBox.englobing(sub_boxes)
 
+    @functools.cached_property
+    def bezier_array(self):
+        """All sub objects in a single array if they are bezier segments, else None"""
+        from .cubic_bezier import CubicBezier
+
+        if self.sub_objects and all(isinstance(sub, CubicBezier) for sub in self):
+            return CubicBezierArray.from_beziers(self.sub_objects)
+        return None
+
+    @functools.cached_property
+    def bvh(self):
+        from .bvh import BoundingVolumeHierarchy
+
+        return BoundingVolumeHierarchy(self.sub_objects)
+
     def hit(self, ray: Ray) -> ShadeRec:
         """
         Returns a shade with the information for the first intersection
@@ -72,7 +88,10 @@ class CompoundGeometricObject(GeometricObject, Generic[T]):
 
         result = ShadeRec()
         if self.aabbox.hit(ray):
-            result = find_first_hit(ray, self.sub_objects)
+            if self.bezier_array is not None:
+                result = self.bezier_array.first_hit(ray)
+            else:
+                result, __ = self.bvh.first_hit(ray)
             result.hit_geometry = self
         return result
 
@@ -83,6 +102,8 @@ class CompoundGeometricObject(GeometricObject, Generic[T]):
 
     def num_hits(self, ray: Ray) -> int:
         if self.aabbox.hit(ray):
+            if self.bezier_array is not None:
+                return self.bezier_array.num_hits(ray)
             return sum([obj.num_hits(ray) for obj in self.sub_objects])
         else:
             return 0
@@ -8,7 +8,8 @@ import warnings
 from dataclasses import dataclass, field
 from typing import Optional, List, NamedTuple, Iterable, Tuple
 
-from .geometry import GeometricObject
+from .geometry import GeometricObject, BoundingVolumeHierarchy, CubicBezierArray
+from .geometry.bezier_array import collect_beziers
 from .material import OpticMaterial, BeamDump
 from .ray import Ray
 from .shade import ShadeRec
@@ -24,12 +25,31 @@ class World:
     """Stores a scene and computes the interaction with a ray"""
 
     objects: Optional[list[OpticalObject]] = field(default_factory=list)
-    # default recursion depth can be changed, but should not exceed
-    # system recursion limit.
+    # limits of the beam propagation: number of successive rays of a beam,
+    # total number of rays traced for a seed and intensity of a beam
     max_recursion_depth: Optional[int] = 500
+    max_rays: Optional[int] = 100000
+    min_intensity: float = 0.0
+    # intersect each generation of rays as one batch when possible
+    batch_intersection: bool = True
+    # acceleration structure for first_hit, rebuilt when objects are added
+    _bvh: Optional[BoundingVolumeHierarchy] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _segments: Optional[tuple] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def add(self, obj: OpticalObject):
         self.objects.append(obj)
+        self._bvh = None
+        self._segments = None
+
+    @property
+    def bvh(self) -> BoundingVolumeHierarchy:
+        if self._bvh is None or len(self._bvh) != self.num_objects:
+            self._bvh = BoundingVolumeHierarchy(self.objects, lambda obj: obj.geometry)
+        return self._bvh
 
     def __iter__(self) -> Iterable[OpticalObject]:
         return iter(self.objects)
@@ -46,48 +66,149 @@ class World:
         :return: A shade for the collision geometric information and the
         material of the object hit.
         """
-        result = ShadeRec()
-        material = BeamDump()
-        for obj in self:
-            shade = obj.geometry.hit(ray)
-            if Ray.min_travel < shade.travel_dist < result.travel_dist:
-                result = shade
-                material = obj.material
-        return result, material
-
-    def propagate_beams(self, seed):
-        return self._propagate_beams([[seed]], 0)
-
-    def _propagate_beams(self, beams: List[List[Ray]], depth) -> List[List[Ray]]:
-        """Computes the propagation of beams in the system
-
-        :return: List of all the beam paths generated by these seeds.
+        result, obj = self.bvh.first_hit(ray)
+        if obj is None:
+            return result, BeamDump()
+        return result, obj.material
+
+    def first_hit_batch(self, rays: List[Ray]) -> List[Tuple[ShadeRec, OpticMaterial]]:
+        """
+        Returns the first collision of each ray of a bundle, see first_hit.
+
+        If all objects are made of bezier segments, all rays are intersected
+        with all segments at once with the batched intersection kernel.
+        """
+        segments = self.bezier_segments
+        if not self.batch_intersection or segments is None or len(rays) < 2:
+            return [self.first_hit(ray) for ray in rays]
+
+        bezier_array, owners = segments
+        hits = bezier_array.intersect(
+            [(ray.origin.x, ray.origin.y) for ray in rays],
+            [(ray.direction.x, ray.direction.y) for ray in rays],
+        )
+        results = list()
+        for k, ray in enumerate(rays):
+            shade = hits.shade(k, ray)
+            if hits.index[k] < 0:
+                results.append((shade, BeamDump()))
+            else:
+                obj = self.objects[owners[hits.index[k]]]
+                shade.hit_geometry = obj.geometry
+                results.append((shade, obj.material))
+        return results
+
+    @property
+    def bezier_segments(self) -> Optional[Tuple[CubicBezierArray, List[int]]]:
+        """
+        All bezier segments of the scene in a single array together with the
+        index of the object owning each segment, or None if some object is
+        not made of bezier segments
+        """
+        if self._segments is None or self._segments[0] != self.num_objects:
+            beziers = list()
+            owners = list()
+            for index, obj in enumerate(self.objects):
+                obj_beziers = collect_beziers(obj.geometry)
+                if obj_beziers is None:
+                    self._segments = (self.num_objects, None)
+                    return None
+                beziers.extend(obj_beziers)
+                owners.extend([index] * len(obj_beziers))
+            array = CubicBezierArray.from_beziers(beziers)
+            self._segments = (self.num_objects, (array, owners))
+        return self._segments[1]
+
+    def propagate_beams(self, seed: Ray) -> List[List[Ray]]:
+        """Computes the propagation of a beam seed in the system
+
+        The rays are traced generation by generation: all rays generated by
+        the previous collisions are intersected with the scene as one batch.
+        Each ray only keeps a pointer to the ray it was generated from, the
+        beam paths are assembled once the propagation is finished.
+
+        A beam stops when it leaves the scene or hits a beam dump, when its
+        depth reaches max_recursion_depth, when its intensity (halved by a
+        beam splitter) drops below min_intensity or when max_rays rays have
+        been traced.
+
+        :return: List of all the beam paths generated by this seed.
             It is stored as
             [path0[Ray0, Ray1, ...], path1[...], ...].
             Each path is a list of successive rays having each traveled a
             given distance.
-        :raise: warning if recursion depth hits a limit.
+        :raise: warning if the depth or number of rays hits a limit.
         """
 
-        if depth >= self.max_recursion_depth:
-            err_msg = (
+        generation = [BeamNode(seed)]
+        leaves = list()
+        num_rays = 1
+        depth_exceeded = False
+        rays_exceeded = False
+        while generation:
+            hits = self.first_hit_batch([node.ray for node in generation])
+            next_generation = list()
+            for node, (shade, material) in zip(generation, hits):
+                ray = node.ray
+                new_seeds = material.generated_beams(ray, shade)
+                node.ray = Ray(ray.origin, ray.direction, shade.travel_dist)
+                if len(new_seeds) == 0:
+                    leaves.append(node)
+                    continue
+                intensity = node.intensity / len(new_seeds)
+                for rank, new_seed in enumerate(new_seeds):
+                    child = BeamNode(new_seed, node, rank, node.depth + 1, intensity)
+                    if child.depth >= self.max_recursion_depth:
+                        # the seed is kept but not propagated
+                        depth_exceeded = True
+                        leaves.append(child)
+                    elif self.max_rays is not None and num_rays >= self.max_rays:
+                        rays_exceeded = True
+                        leaves.append(child)
+                    elif intensity < self.min_intensity:
+                        leaves.append(child)
+                    else:
+                        num_rays += 1
+                        next_generation.append(child)
+            generation = next_generation
+
+        if depth_exceeded:
+            warnings.warn(
                 f"Maximal recursion depth exceeded ({self.max_recursion_depth})."
                 "It is  likely that not all beams have been rendered."
             )
-            warnings.warn(err_msg)
-            return beams
-        else:
-            new_beams = list()
-            for index, beam in enumerate(beams):
-                ray = beam[-1]
-                if ray.travel <= 0:
-                    shade, material = self.first_hit(ray)
-                    new_seeds = material.generated_beams(ray, shade)
-                    beams[index][-1] = Ray(ray.origin, ray.direction, shade.travel_dist)
-                    if len(new_seeds) == 0:
-                        new_beams.append(beams[index])
-                    for seed in new_seeds:
-                        generated_beams = self._propagate_beams([[seed]], depth + 1)
-                        for new_beam in generated_beams:
-                            new_beams.append(beams[index] + new_beam)
-            return new_beams
+        if rays_exceeded:
+            warnings.warn(
+                f"Maximal number of rays exceeded ({self.max_rays})."
+                "It is  likely that not all beams have been rendered."
+            )
+
+        # depth-first order of the paths, like a recursive propagation
+        paths = sorted((leaf.path() for leaf in leaves), key=lambda path: path[0])
+        return [rays for __, rays in paths]
+
+
+@dataclass
+class BeamNode:
+    """
+    Ray of a beam path, linked to the ray it was generated from. The paths
+    of a seed form a tree which is stored with parent pointers only.
+    """
+
+    ray: Ray
+    parent: Optional[BeamNode] = None
+    # position among the rays generated by the parent
+    rank: int = 0
+    depth: int = 0
+    intensity: float = 1.0
+
+    def path(self) -> Tuple[List[int], List[Ray]]:
+        """Returns the ranks and the rays from the seed to this ray"""
+        ranks = list()
+        rays = list()
+        node = self
+        while node is not None:
+            ranks.append(node.rank)
+            rays.append(node.ray)
+            node = node.parent
+        return ranks[::-1], rays[::-1]
@@ -35,7 +35,153 @@ class removeDuplicateLines(inkex.EffectExtension):
         pars.add_argument("--minUse", type=inkex.Boolean, default=False)
         pars.add_argument("--selfPath", type=inkex.Boolean, default=False)
         pars.add_argument("--interp", type=inkex.Boolean, default=False)
+        pars.add_argument("--engine", default="grid")
         
+    def matchSegmentsPairwise(self, coords, tolerance):
+        """Compare every segment against all segments of all other subpaths (O(segments²)).
+        Returns a list of (cPath to remove from, segment to remove, cPath of match, segment of match, reversed)"""
+        matches=[]
+        #for each segment find if difference of any x or y is less than tolerance - if so - calculate 2d-distance and find if all 4 less than tolerance
+        #repeat with reversed segment
+        #if match found set match coordinates to -1000 to mark this to be removed and being ignored later on
+        i=0
+        while i <= len(coords)-1:#each path or subpath
+            j=0
+            while j<=len(coords[i][:,0])-1:#each segment j of path i
+                k=0
+                while k<=len(coords)-1:#search all other subpaths
+                    evalPath=True
+                    if k == i and self.options.selfPath == False:#do not test path against itself
+                        evalPath=False
+                    if evalPath:
+                        segmentCoords=np.array(coords[i][j,:])
+                        if segmentCoords[0] != -1000 and segmentCoords[1] != -1000:
+                            searchCoords=np.array(coords[k])
+                            if k==i:
+                                searchCoords[j,:]=-2000#avoid comparing segment with itself
+                            subtr=np.abs(searchCoords-segmentCoords)
+                            maxval=subtr.max(1)
+                            lessTol=np.argwhere(maxval<tolerance)        
+                            matchThis=False
+                            matchThisRev=False
+                            finalK=0
+                            lesstolc=0
+                            if len(lessTol) > 0:#proceed to calculate 2d distance where both x and y distance is less than tolerance
+                                c=0
+                                while c < len(lessTol):
+                                    dists=np.zeros(4)
+                                    dists[0]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][0],2),np.power(subtr[lessTol[c,0]][1],2)))
+                                    dists[1]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][2],2),np.power(subtr[lessTol[c,0]][3],2)))
+                                    dists[2]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][4],2),np.power(subtr[lessTol[c,0]][5],2)))
+                                    dists[3]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][6],2),np.power(subtr[lessTol[c,0]][7],2)))
+                                    if dists.max() < tolerance:
+                                        matchThis=True
+                                        finalK=k
+                                        lesstolc=lessTol[c]
+                                    c+=1
+                            if matchThis == False:#try reversed
+                                segmentCoordsRev=[segmentCoords[6], segmentCoords[7],segmentCoords[4],segmentCoords[5],segmentCoords[2],segmentCoords[3],segmentCoords[0],segmentCoords[1]]
+                                subtr=np.abs(searchCoords-segmentCoordsRev)
+                                maxval=subtr.max(1)
+                                lessTol=np.argwhere(maxval<tolerance)   
+                                if len(lessTol) > 0:#proceed to calculate 2d distance where both x and y distance is less than tolerance
+                                    c=0
+                                    while c < len(lessTol):
+                                        dists=np.zeros(4)
+                                        dists[0]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][0],2),np.power(subtr[lessTol[c,0]][1],2)))
+                                        dists[1]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][2],2),np.power(subtr[lessTol[c,0]][3],2)))
+                                        dists[2]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][4],2),np.power(subtr[lessTol[c,0]][5],2)))
+                                        dists[3]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][6],2),np.power(subtr[lessTol[c,0]][7],2)))
+                                        if dists.max() < tolerance:
+                                            matchThis=True
+                                            matchThisRev=True
+                                            finalK=k
+                                            lesstolc=lessTol[c]
+                                        c+=1
+                            
+                            if matchThis:
+                                coords[finalK][lesstolc,:]=-1000
+                                matches.append((finalK, lesstolc, i, j, matchThisRev))
+                                        
+                    k+=1
+                j+=1
+            i+=1
+        return matches
+
+    def matchSegmentsGrid(self, coords, tolerance):
+        """Find the same matches as matchSegmentsPairwise, but only compare segments whose start node lies in
+        a neighbouring cell of a tolerance sized grid hash. Candidate pairs are built and checked for all segments
+        at once, afterwards they are resolved in the order of the pairwise search."""
+        matches=[]
+        lengths=np.array([len(item) for item in coords], dtype=np.int64)
+        nSeg=int(lengths.sum()) if len(lengths) > 0 else 0
+        if tolerance <= 0 or nSeg == 0:#nothing can be closer than 0
+            return matches
+        segs=np.concatenate(coords)
+        owner=np.repeat(np.arange(len(coords)), lengths)#cPath of each segment
+        local=np.arange(nSeg)-np.repeat(np.cumsum(lengths)-lengths, lengths)#segment number within its cPath
+
+        #grid hash of start and end nodes. A cell is never smaller than tolerance, so matching nodes are in neighbouring cells.
+        #Cells are enlarged for huge drawings with a tiny tolerance to keep the integer keys in range
+        ends=segs[:,[0,1,6,7]].reshape(-1,2)
+        origin=ends.min(0)
+        cell=max(tolerance, (ends.max(0)-origin).max()/2**20)
+        startCell=np.floor((segs[:,0:2]-origin)/cell).astype(np.int64)+1
+        endCell=np.floor((segs[:,6:8]-origin)/cell).astype(np.int64)+1
+        ny=max(startCell[:,1].max(), endCell[:,1].max())+2
+        startKey=startCell[:,0]*ny+startCell[:,1]
+        order=np.argsort(startKey, kind='stable')
+        sortedKeys=startKey[order]
+
+        pairsA=[]
+        pairsB=[]
+        pairsRev=[]
+        revCols=[6,7,4,5,2,3,0,1]
+        for rev, anchor in ((False, startCell), (True, endCell)):#forward key: start node, reversed key: end node
+            for dx in (-1,0,1):
+                for dy in (-1,0,1):
+                    query=(anchor[:,0]+dx)*ny+anchor[:,1]+dy
+                    lo=np.searchsorted(sortedKeys, query, 'left')
+                    counts=np.searchsorted(sortedKeys, query, 'right')-lo
+                    total=int(counts.sum())
+                    if total == 0:
+                        continue
+                    a=np.repeat(np.arange(nSeg), counts)
+                    b=order[np.repeat(lo, counts)+np.arange(total)-np.repeat(np.cumsum(counts)-counts, counts)]
+                    keep=a != b
+                    if not self.options.selfPath:
+                        keep&=owner[a] != owner[b]
+                    a=a[keep]
+                    b=b[keep]
+                    segA=segs[a][:,revCols] if rev else segs[a]
+                    dists=np.sqrt(((segs[b]-segA).reshape(-1,4,2)**2).sum(2))
+                    hit=dists.max(1) < tolerance
+                    pairsA.append(a[hit])
+                    pairsB.append(b[hit])
+                    pairsRev.append(np.full(int(hit.sum()), rev))
+        if len(pairsA) == 0:
+            return matches
+        a=np.concatenate(pairsA)
+        b=np.concatenate(pairsB)
+        rev=np.concatenate(pairsRev)
+
+        #resolve like the pairwise search: segments in order, other subpaths in order, forward before reversed, last index wins
+        idx=np.lexsort((-b, rev, owner[b], a))
+        removed=np.zeros(nSeg, dtype=bool)
+        group=None
+        for ai, bi, ri in zip(a[idx].tolist(), b[idx].tolist(), rev[idx].tolist()):
+            if removed[ai]:
+                continue
+            k=owner[bi]
+            if group == (ai, k):
+                continue#already found a match in this subpath
+            if removed[bi]:
+                continue
+            removed[bi]=True
+            group=(ai, k)
+            matches.append((int(k), int(local[bi]), int(owner[ai]), int(local[ai]), ri))
+        return matches
+
     """Remove duplicate lines"""
     def effect(self):       
         tolerance=float(self.options.tolerance)
@@ -117,80 +263,21 @@ class removeDuplicateLines(inkex.EffectExtension):
         origCoords=[]
         for item in coords: origCoords.append(np.copy(item))#make a real copy (not a reference that changes with the original
         #search for overlapping or close segments
-        #for each segment find if difference of any x or y is less than tolerance - if so - calculate 2d-distance and find if all 4 less than tolerance
-        #repeat with reversed segment
-        #if match found set match coordinates to -1000 to mark this to be removed and being ignored later on
-        i=0
-        while i <= len(coords)-1:#each path or subpath
-            j=0
-            while j<=len(coords[i][:,0])-1:#each segment j of path i
-                k=0
-                while k<=len(coords)-1:#search all other subpaths
-                    evalPath=True
-                    if k == i and self.options.selfPath == False:#do not test path against itself
-                        evalPath=False
-                    if evalPath:
-                        segmentCoords=np.array(coords[i][j,:])
-                        if segmentCoords[0] != -1000 and segmentCoords[1] != -1000:
-                            searchCoords=np.array(coords[k])
-                            if k==i:
-                                searchCoords[j,:]=-2000#avoid comparing segment with itself
-                            subtr=np.abs(searchCoords-segmentCoords)
-                            maxval=subtr.max(1)
-                            lessTol=np.argwhere(maxval<tolerance)        
-                            matchThis=False
-                            matchThisRev=False
-                            finalK=0
-                            lesstolc=0
-                            if len(lessTol) > 0:#proceed to calculate 2d distance where both x and y distance is less than tolerance
-                                c=0
-                                while c < len(lessTol):
-                                    dists=np.zeros(4)
-                                    dists[0]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][0],2),np.power(subtr[lessTol[c,0]][1],2)))
-                                    dists[1]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][2],2),np.power(subtr[lessTol[c,0]][3],2)))
-                                    dists[2]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][4],2),np.power(subtr[lessTol[c,0]][5],2)))
-                                    dists[3]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][6],2),np.power(subtr[lessTol[c,0]][7],2)))
-                                    if dists.max() < tolerance:
-                                        matchThis=True
-                                        finalK=k
-                                        lesstolc=lessTol[c]
-                                    c+=1
-                            if matchThis == False:#try reversed
-                                segmentCoordsRev=[segmentCoords[6], segmentCoords[7],segmentCoords[4],segmentCoords[5],segmentCoords[2],segmentCoords[3],segmentCoords[0],segmentCoords[1]]
-                                subtr=np.abs(searchCoords-segmentCoordsRev)
-                                maxval=subtr.max(1)
-                                lessTol=np.argwhere(maxval<tolerance)   
-                                if len(lessTol) > 0:#proceed to calculate 2d distance where both x and y distance is less than tolerance
-                                    c=0
-                                    while c < len(lessTol):
-                                        dists=np.zeros(4)
-                                        dists[0]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][0],2),np.power(subtr[lessTol[c,0]][1],2)))
-                                        dists[1]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][2],2),np.power(subtr[lessTol[c,0]][3],2)))
-                                        dists[2]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][4],2),np.power(subtr[lessTol[c,0]][5],2)))
-                                        dists[3]=np.sqrt(np.add(np.power(subtr[lessTol[c,0]][6],2),np.power(subtr[lessTol[c,0]][7],2)))
-                                        if dists.max() < tolerance:
-                                            matchThis=True
-                                            matchThisRev=True
-                                            finalK=k
-                                            lesstolc=lessTol[c]
-                                        c+=1
-                            
-                            if matchThis:
-                                coords[finalK][lesstolc,:]=-1000
-                                removeSegmentPath.append(pathNo[finalK])
-                                removeSegmentSubPath.append(subPathNo[finalK])
-                                removeSegment_cPath.append(cPathNo[finalK])
-                                removeSegment.append(lesstolc)
-                                matchSegmentPath.append(pathNo[i])
-                                matchSegmentSubPath.append(subPathNo[i])
-                                matchSegment_cPath.append(cPathNo[i])
-                                matchSegment.append(j)
-                                matchSegmentRev.append(matchThisRev)        
-                                        
-                    k+=1
-                j+=1
-            i+=1
-                
+        if self.options.engine == "grid":
+            matches=self.matchSegmentsGrid(coords,tolerance)
+        else:
+            matches=self.matchSegmentsPairwise(coords,tolerance)
+        for finalK, lesstolc, i, j, matchThisRev in matches:
+            removeSegmentPath.append(pathNo[finalK])
+            removeSegmentSubPath.append(subPathNo[finalK])
+            removeSegment_cPath.append(cPathNo[finalK])
+            removeSegment.append(lesstolc)
+            matchSegmentPath.append(pathNo[i])
+            matchSegmentSubPath.append(subPathNo[i])
+            matchSegment_cPath.append(cPathNo[i])
+            matchSegment.append(j)
+            matchSegmentRev.append(matchThisRev)
+
         #(interpolate remaining and) remove segments with a match
         if len(removeSegmentPath) > 0:          
             removeSegmentPath=np.array(removeSegmentPath)
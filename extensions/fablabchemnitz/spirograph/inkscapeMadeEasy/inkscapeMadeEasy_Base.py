@@ -34,6 +34,51 @@ from lxml import etree
 import inkex
 
 
+class idRegistry(object):
+    """ Registry of the IDs of a document, used to generate unique IDs.
+
+    The set of IDs of the document is read once. For each prefix and suffix format, the registry keeps the next number to
+    try, so generating many IDs with the same prefix does not probe all the numbers already in use again.
+
+    .. note:: The numbers below the next one are known to be in use, since IDs are never released. Therefore the IDs are the
+              same as probing from 1 every time.
+    """
+
+    def __init__(self, document, ids):
+        self.document = document
+        self.ids = ids
+        self.nextNumber = {}
+
+    def add(self, new_id):
+        """ Register an ID created without the registry.
+
+        :param new_id: the ID
+        :type new_id: string
+        """
+        self.ids.add(new_id)
+
+    def uniqueId(self, prefix_id, suffixFormat='-%05d'):
+        """ Generate an unique ID by concatenating a prefix with a numeric suffix.
+
+        :param prefix_id: prefix of the ID
+        :param suffixFormat: format of the numeric suffix. Default: ``-%05d``
+        :type prefix_id: string
+        :type suffixFormat: string
+        :returns: the unique ID
+        :rtype: string
+        """
+        key = (prefix_id, suffixFormat)
+        numberID = self.nextNumber.get(key, 1)
+        new_id = prefix_id + suffixFormat % numberID
+        while new_id in self.ids:
+            numberID += 1
+            new_id = prefix_id + suffixFormat % numberID
+        self.ids.add(new_id)
+        self.nextNumber[key] = numberID + 1
+
+        return new_id
+
+
 class inkscapeMadeEasy(inkex.Effect):
 
     def __init__(self):
@@ -318,7 +363,7 @@ class inkscapeMadeEasy(inkex.Effect):
 
         This function is used to generate a valid unique ID by concatenating a given prefix with a numeric suffix. The overall format is ``prefix-%05d``.
 
-        This function makes sure the ID is unique by checking in ``doc_ids`` member. This function is specially useful for creating an unique ID for markers and other elements in defs.
+        This function makes sure the ID is unique by checking in the ID registry of the document (see :meth:`getIdRegistry`). This function is specially useful for creating an unique ID for markers and other elements in defs.
 
         :param prefix_id: prefix of the ID
         :type prefix_id: string
@@ -336,14 +381,23 @@ class inkscapeMadeEasy(inkex.Effect):
 
 
         """
-        numberID = 1
-        new_id = prefix_id + '-%05d' % numberID
-        while new_id in self.get_ids():
-            numberID += 1
-            new_id = prefix_id + '-%05d' % numberID
-        self.svg.get_ids().add(new_id)
+        return self.getIdRegistry().uniqueId(prefix_id)
 
-        return new_id
+    # ---------------------------------------------
+    def getIdRegistry(self):
+        """ Return the ID registry of the current document.
+
+        The registry is created the first time it is needed for a document, and is shared by all the drawing helpers.
+
+        :returns: the ID registry
+        :rtype: idRegistry object
+        """
+        registry = getattr(self, '_idRegistry', None)
+        if registry is None or registry.document is not self.document:
+            registry = idRegistry(self.document, self.svg.get_ids())
+            self._idRegistry = registry
+
+        return registry
 
     # ---------------------------------------------
     def getDefinitions(self):
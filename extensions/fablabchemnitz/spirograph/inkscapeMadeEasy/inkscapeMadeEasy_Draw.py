@@ -531,13 +531,7 @@ class marker():
             return nameID
 
         if RenameMode == 2:
-            numberID = 1
-            new_id = nameID + '_n%05d' % numberID
-            while new_id in ExtensionBaseObj.svg.get_ids():
-                numberID += 1
-                new_id = nameID + '_n%05d' % numberID
-            ExtensionBaseObj.svg.get_ids().add(nameID)
-            nameID = new_id
+            nameID = ExtensionBaseObj.getIdRegistry().uniqueId(nameID, '_n%05d')
 
         if RenameMode == 1 and ExtensionBaseObj.findMarker(nameID):
             defs = ExtensionBaseObj.getDefinitions()
@@ -566,6 +560,7 @@ class marker():
         etree.SubElement(newMarker, 'path', marker_lineline_attribs)
 
         ExtensionBaseObj.svg.get_ids().add(nameID)
+        ExtensionBaseObj.getIdRegistry().add(nameID)
 
         return nameID
 
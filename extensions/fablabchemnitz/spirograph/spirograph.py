@@ -2,8 +2,13 @@
 
 import math
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 import numpy as np
 import scipy.signal as scipySignal
+from lxml import etree
+import inkex
 
 import inkscapeMadeEasy.inkscapeMadeEasy_Base as inkBase
 import inkscapeMadeEasy.inkscapeMadeEasy_Draw as inkDraw
@@ -30,6 +35,8 @@ class Spirograph(inkBase.inkscapeMadeEasy):
         self.arg_parser.add_argument("--drawBaseCircles", type=self.bool, dest="drawBaseCircles", default=False)
         self.arg_parser.add_argument("--animate", type=self.bool, dest="animate", default=False)
         self.arg_parser.add_argument("--directory", type=str, dest="directory", default='./')
+        self.arg_parser.add_argument("--animationMode", type=str, dest="animationMode", default='frames')
+        self.arg_parser.add_argument("--animationDuration", type=float, dest="animationDuration", default=10.0)
 
     def effect(self):
         so = self.options
@@ -155,30 +162,20 @@ class Spirograph(inkBase.inkscapeMadeEasy):
             arc3 = inkDraw.arc.centerAngStartAngEnd(wheelGroup, centerPoint=CentersFinal[0], radius=r * 0.6, angStart=280, angEnd=320,
                                                     offset=position, lineStyle=self.lineStyleArrow)
 
-            self.exportSVG(animGroup, os.path.join(so.directory,'outSVG_%1.5d.svg' % 0))
+            # the wheel transform of each frame is a translation of its center and the total rotation around its first center
+            if typeCurve == 'hypo':
+                angles = (thetasFinal - thetasFinal[0]) * (R - r) / r * 180 / np.pi
+            else:
+                angles = - (thetasFinal - thetasFinal[0]) * (R + r) / r * 180 / np.pi
+            shifts = CentersFinal - CentersFinal[0]
+            center = [position[0] + CentersFinal[0][0], position[1] + CentersFinal[0][1]]
+            curves = [[PointsFinal, self.lineStyleCurve], [PointsFinal2, self.lineStyleCurve2], [PointsFinal3, self.lineStyleCurve3]]
 
-            for i in range(1, len(thetasFinal)):
+            if so.animationMode == 'smil':
+                self.exportAnimation(animGroup, wheelGroup, curves, position, shifts, angles, center, os.path.join(so.directory, 'outSVG_anim.svg'))
+            else:
+                self.exportFrames(animGroup, wheelGroup, curves, position, shifts, angles, center, so.directory)
 
-                self.moveElement(wheelGroup, [CentersFinal[i][0] - CentersFinal[i - 1][0], CentersFinal[i][1] - CentersFinal[i - 1][1]])
-                if typeCurve == 'hypo':
-                    self.rotateElement(wheelGroup, [position[0] + CentersFinal[i][0], position[1] + CentersFinal[i][1]],
-                                       (thetasFinal[i] - thetasFinal[i - 1]) * (R - r) / r * 180 / np.pi)
-                else:
-                    self.rotateElement(wheelGroup, [position[0] + CentersFinal[i][0], position[1] + CentersFinal[i][1]],
-                                       - (thetasFinal[i] - thetasFinal[i - 1]) * (R + r) / r * 180 / np.pi)
-
-                curve1 = inkDraw.line.absCoords(parent=animGroup, coordsList=PointsFinal[:i + 1], offset=position, lineStyle=self.lineStyleCurve,
-                                               closePath=False)
-                curve2 = inkDraw.line.absCoords(parent=animGroup, coordsList=PointsFinal2[:i + 1], offset=position, lineStyle=self.lineStyleCurve2,
-                                                closePath=False)
-                curve3 = inkDraw.line.absCoords(parent=animGroup, coordsList=PointsFinal3[:i + 1], offset=position, lineStyle=self.lineStyleCurve3,
-                                                closePath=False)
-
-                self.exportSVG(animGroup, os.path.join(so.directory , 'outSVG_%1.5d.svg' % i))
-
-                self.removeElement(curve1)
-                self.removeElement(curve2)
-                self.removeElement(curve3)
             self.removeElement(animGroup)
         else:
             if so.drawBaseCircles:
@@ -199,6 +196,83 @@ class Spirograph(inkBase.inkscapeMadeEasy):
 
         return
 
+    def exportFrames(self, animGroup, wheelGroup, curves, position, shifts, angles, center, directory):
+        """ Export one SVG file per theta sample.
+
+        The file around the wheel and the curves is serialized once. Each frame then only serializes the wheel with its
+        transform, and the coordinates of the curves grow by one point per frame. The files are written by a pool of threads.
+        """
+        # static parts, with a placeholder where the wheel and the curves go
+        document = etree.fromstring(self.blankSVG.encode('ascii'))
+        document.append(deepcopy(self.getDefinitions()))
+        frameGroup = deepcopy(animGroup)
+        index = animGroup.index(wheelGroup)
+        frameGroup.remove(frameGroup[index])
+        frameGroup.insert(index, etree.Comment('frame'))
+        document.append(frameGroup)
+        head, tail = etree.tostring(document).split(b'<!--frame-->')
+
+        # markup of each curve around its coordinates, and coordinates of each point as drawn by inkDraw.line.absCoords
+        curveMarkup = []
+        for points, lineStyle in curves:
+            curve = inkDraw.line.absCoords(parent=animGroup, coordsList=points[:1], offset=position, lineStyle=lineStyle, closePath=False)
+            curve.set('d', 'M FRAMECOORDS')
+            curveHead, curveTail = etree.tostring(curve, with_tail=False).split(b'FRAMECOORDS')
+            coords = [(' %s,%s' % (x, y)).encode('ascii') for x, y in (points + position).tolist()]
+            curveMarkup.append([curveHead, bytearray(coords[0]), coords, curveTail])
+            self.removeElement(curve)
+
+        workers = os.cpu_count() or 1
+        inFlight = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i in range(len(angles)):
+                wheelGroup.set('transform', 'translate(%f %f) rotate(%f %f %f)' % (shifts[i][0], shifts[i][1], -angles[i], center[0], center[1]))
+                frame = [head, etree.tostring(wheelGroup, with_tail=False)]
+                if i > 0:
+                    for curveHead, coordsDrawn, coords, curveTail in curveMarkup:
+                        coordsDrawn += coords[i]
+                        frame += [curveHead, bytes(coordsDrawn), curveTail]
+                frame.append(tail)
+
+                # limit the number of frames waiting to be written
+                if len(inFlight) > 2 * workers:
+                    inFlight.popleft().result()
+                inFlight.append(pool.submit(self.writeFrame, os.path.join(directory, 'outSVG_%1.5d.svg' % i), b''.join(frame)))
+            for future in inFlight:
+                future.result()
+
+    @staticmethod
+    def writeFrame(fileOut, data):
+        with open(fileOut, 'wb') as f:
+            f.write(data)
+
+    def exportAnimation(self, animGroup, wheelGroup, curves, position, shifts, angles, center, fileOut):
+        """ Export a single SVG file animated with SMIL.
+
+        The wheel follows its center and rotates with animateTransform. Each curve is drawn completely, hidden by a dash
+        as long as the curve whose offset is animated with the length drawn at each theta sample.
+        """
+        duration = '%fs' % self.options.animationDuration
+        keyTimes = ';'.join(['%f' % t for t in np.linspace(0.0, 1.0, len(angles))])
+        animAttribs = {'dur': duration, 'keyTimes': keyTimes, 'fill': 'freeze'}
+
+        moverGroup = self.createGroup(animGroup, 'Wheel')
+        moverGroup.append(wheelGroup)
+        etree.SubElement(moverGroup, inkex.addNS('animateTransform', 'svg'), dict(animAttribs, attributeName='transform', type='translate',
+                         values=';'.join(['%f %f' % (dx, dy) for dx, dy in shifts.tolist()])))
+        etree.SubElement(wheelGroup, inkex.addNS('animateTransform', 'svg'), dict(animAttribs, attributeName='transform', type='rotate',
+                         values=';'.join(['%f %f %f' % (-angle, center[0], center[1]) for angle in angles.tolist()])))
+
+        for points, lineStyle in curves:
+            lengths = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))))
+            dashedStyle = dict(lineStyle)
+            dashedStyle['stroke-dasharray'] = '%f %f' % (lengths[-1], lengths[-1])
+            curve = inkDraw.line.absCoords(parent=animGroup, coordsList=points, offset=position, lineStyle=dashedStyle, closePath=False)
+            etree.SubElement(curve, inkex.addNS('animate', 'svg'), dict(animAttribs, attributeName='stroke-dashoffset',
+                             values=';'.join(['%f' % length for length in (lengths[-1] - lengths).tolist()])))
+
+        self.exportSVG(animGroup, fileOut)
+
     # typeCurve: 'hypo', 'epi'
     def calcCurve__trochoid(self, typeCurve, R, r, d, thetas):
         j = complex(0, 1)